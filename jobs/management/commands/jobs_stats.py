@@ -0,0 +1,17 @@
+"""Print job queue metrics"""
+
+# Python
+import json
+
+# Django
+from django.core.management.base import BaseCommand
+
+# Metrics
+from jobs.metrics import queue_metrics
+
+
+class Command(BaseCommand):
+    help = 'Print queue depth, lag and job latency as JSON'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(queue_metrics(), indent=2, sort_keys=True))
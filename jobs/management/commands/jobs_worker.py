@@ -0,0 +1,54 @@
+"""Run background jobs"""
+
+# Python
+import multiprocessing
+
+# Django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# Worker
+from jobs.worker import Worker, POLL_INTERVAL
+
+
+def work(options):
+    worker = Worker(
+        queues=options['queue'],
+        concurrency=options['concurrency'] if options['pool'] == 'thread' else 1,
+        poll_interval=options['poll_interval']
+    )
+    return worker.run(max_jobs=options['max_jobs'], burst=options['burst'])
+
+
+class Command(BaseCommand):
+    help = 'Run jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='append', help='Queue to work on (repeatable), default: default')
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL)
+        parser.add_argument('--max-jobs', type=int, default=None, help='Stop after this many jobs')
+        parser.add_argument('--burst', action='store_true', help='Stop when the queues are empty')
+
+    def handle(self, *args, **options):
+        options['queue'] = options['queue'] or ['default']
+        if options['pool'] == 'thread' or options['concurrency'] == 1:
+            done = work(options)
+            self.stdout.write('Ran {} jobs'.format(done))
+            return
+
+        # Each process opens its own database connections
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=work, args=(options,))
+            for _ in range(options['concurrency'])
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,58 @@
+"""Job queue metrics"""
+
+# Python
+from collections import defaultdict
+from datetime import timedelta
+
+# Django
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min
+from django.utils import timezone
+
+# Models
+from jobs.models import Job
+
+LATENCY_WINDOW = timedelta(minutes=5)
+
+
+def _seconds(delta):
+    return round(delta.total_seconds(), 3)
+
+
+def _duration(end, start):
+    return ExpressionWrapper(F(end) - F(start), output_field=DurationField())
+
+
+def queue_metrics():
+    """Depth per queue and status, age of the oldest ready job, and recent latency.
+
+    ``wait`` is how long finished jobs waited for a worker after becoming
+    ready, ``run`` how long they ran; both over the last five minutes.
+    """
+    now = timezone.now()
+    queues = defaultdict(lambda: {status: 0 for status, _ in Job.STATUS_CHOICES})
+    for row in Job.objects.order_by().values('queue', 'status').annotate(total=Count('id')):
+        queues[row['queue']][row['status']] = row['total']
+
+    ready = Job.objects.filter(status=Job.PENDING, run_at__lte=now).order_by().values('queue').annotate(
+        total=Count('id'), oldest=Min('run_at')
+    )
+    for row in ready:
+        queues[row['queue']]['ready'] = row['total']
+        queues[row['queue']]['lag_seconds'] = _seconds(now - row['oldest'])
+    for queue in queues.values():
+        queue.setdefault('ready', 0)
+        queue.setdefault('lag_seconds', 0)
+
+    # Averaged in the database (job_status_finished_at_idx), not row by row
+    finished = Job.objects.filter(status=Job.DONE, finished_at__gte=now - LATENCY_WINDOW).aggregate(
+        jobs=Count('id'),
+        wait=Avg(_duration('started_at', 'run_at')),
+        run=Avg(_duration('finished_at', 'started_at')),
+    )
+    latency = {
+        'jobs': finished['jobs'],
+        'wait_seconds': _seconds(finished['wait'] or timedelta()),
+        'run_seconds': _seconds(finished['run'] or timedelta()),
+    }
+
+    return {'queues': dict(queues), 'latency': latency}
@@ -0,0 +1,48 @@
+"""Jobs models"""
+
+# Django
+from django.db import models
+from django.utils import timezone
+
+# Utils
+from utils.models import TweetmeBaseModel
+
+
+class Job(TweetmeBaseModel):
+    """Deferred call of a ``@job`` function, see jobs.queue"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200, help_text='Dotted path of the job function')
+    queue = models.CharField(max_length=50, default='default')
+    payload = models.TextField(default='{}', help_text='JSON encoded args and kwargs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+
+    run_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed while the job runs; stale locks are reclaimed, see jobs.worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+
+    class Meta(TweetmeBaseModel.Meta):
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at'], name='job_queue_status_run_at_idx'),
+            models.Index(fields=['status', 'finished_at'], name='job_status_finished_at_idx'),
+        ]
+
+    def __str__(self):
+        return '{} #{} ({})'.format(self.name, self.id, self.status)
@@ -0,0 +1,65 @@
+"""Job queue
+
+Functions decorated with ``@job`` can be deferred with ``.delay(...)``::
+
+    @job(max_attempts=3)
+    def fan_out_tweet(tweet_id):
+        ...
+
+    fan_out_tweet.delay(tweet.id)
+
+``delay`` inserts a ``Job`` row in the current transaction, so the job is
+only visible to workers once the write that produced it commits, and
+disappears with it on rollback. Arguments must be JSON serializable.
+Workers (``manage.py jobs_worker``) run the jobs and retry failures with
+exponential backoff.
+
+With ``settings.JOBS_ALWAYS_EAGER`` jobs run inline instead, for tests
+and development without a worker.
+"""
+
+# Python
+import functools
+import json
+
+# Django
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Models
+from jobs.models import Job
+
+DEFAULT_MAX_ATTEMPTS = getattr(settings, 'JOBS_MAX_ATTEMPTS', 5)
+
+
+def job(queue='default', max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register a function as a job"""
+    def decorator(func):
+        func.job_name = '{}.{}'.format(func.__module__, func.__name__)
+        func.job_queue = queue
+        func.job_max_attempts = max_attempts
+        func.delay = functools.partial(enqueue, func)
+        return func
+    return decorator
+
+
+def enqueue(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` in a worker once the current transaction commits"""
+    if getattr(settings, 'JOBS_ALWAYS_EAGER', False):
+        func(*args, **kwargs)
+        return None
+    return Job.objects.create(
+        name=func.job_name,
+        queue=func.job_queue,
+        max_attempts=func.job_max_attempts,
+        payload=json.dumps({'args': args, 'kwargs': kwargs})
+    )
+
+
+def load(job):
+    """Return the function and arguments of a ``Job``"""
+    func = import_string(job.name)
+    if not hasattr(func, 'job_name'):
+        raise ImportError('{} is not a job'.format(job.name))
+    payload = json.loads(job.payload)
+    return func, payload.get('args', []), payload.get('kwargs', {})
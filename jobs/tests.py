@@ -0,0 +1,119 @@
+"""Jobs tests"""
+
+# Python
+from datetime import timedelta
+
+# Django
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+# Models
+from jobs.models import Job
+
+# Jobs
+from jobs.metrics import queue_metrics
+from jobs.queue import job
+from jobs.worker import Heartbeat, Worker, claim, reap
+
+CALLS = []
+
+
+@job()
+def record(value, twice=False):
+    CALLS.append(value)
+    if twice:
+        CALLS.append(value)
+
+
+@job(max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+@override_settings(JOBS_ALWAYS_EAGER=False)
+class JobQueueTestCase(TestCase):
+    """Jobs are stored, claimed once, run and retried"""
+
+    def setUp(self):
+        CALLS.clear()
+        self.worker = Worker(name='test')
+
+    def test_run(self):
+        record.delay(1, twice=True)
+        record.delay(2)
+        self.assertEqual(CALLS, [])
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 2)
+
+        self.assertEqual(self.worker.run(burst=True), 2)
+        self.assertEqual(CALLS, [1, 1, 2])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 2)
+
+    @override_settings(JOBS_ALWAYS_EAGER=True)
+    def test_eager(self):
+        self.assertIsNone(record.delay(3))
+        self.assertEqual(CALLS, [3])
+        self.assertFalse(Job.objects.exists())
+
+    def test_claim_once(self):
+        record.delay(1)
+        self.assertEqual(len(claim('a', ['default'], 10)), 1)
+        self.assertEqual(claim('b', ['default'], 10), [])
+
+        # A dead worker's lock expires
+        Job.objects.update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        jobs = claim('b', ['default'], 10)
+        self.assertEqual([(job.locked_by, job.attempts) for job in jobs], [('b', 2)])
+
+    def test_heartbeat(self):
+        record.delay(1)
+        job, = claim('a', ['default'], 10)
+        Job.objects.update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        # Still running: the heartbeat keeps other workers away
+        Heartbeat(job).beat()
+        self.assertEqual(claim('b', ['default'], 10), [])
+
+    def test_stale_attempts_exhausted(self):
+        explode.delay()
+        Job.objects.update(
+            status=Job.RUNNING, attempts=2, locked_by='a', heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+        # A job killing its worker is not run again
+        self.assertEqual(claim('b', ['default'], 10), [])
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            self.assertEqual(reap(['default']), 1)
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_retry(self):
+        explode.delay()
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            self.worker.run_once()
+        failed = Job.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (Job.PENDING, 1))
+        self.assertGreater(failed.run_at, timezone.now())
+        self.assertIn('boom', failed.last_error)
+
+        # Not ready until the backoff elapses
+        self.assertEqual(self.worker.run_once(), 0)
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            self.worker.run_once()
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_metrics(self):
+        record.delay(1)
+        record.delay(2)
+        Job.objects.filter(id=Job.objects.first().id).update(run_at=timezone.now() - timedelta(seconds=30))
+        metrics = queue_metrics()
+        self.assertEqual(metrics['queues']['default']['pending'], 2)
+        self.assertEqual(metrics['queues']['default']['ready'], 2)
+        self.assertGreaterEqual(metrics['queues']['default']['lag_seconds'], 30)
+
+        self.worker.run(burst=True)
+        # statuses, ready jobs, latency: whatever the number of jobs
+        with self.assertNumQueries(3):
+            metrics = queue_metrics()
+        self.assertEqual(metrics['queues']['default']['done'], 2)
+        self.assertEqual(metrics['latency']['jobs'], 2)
+        self.assertGreaterEqual(metrics['latency']['wait_seconds'], 15)
+        self.assertLess(metrics['latency']['wait_seconds'], 16)
+        self.assertGreaterEqual(metrics['latency']['run_seconds'], 0)
@@ -0,0 +1,201 @@
+"""Job worker
+
+Claims ready jobs from the ``Job`` table and runs them. On PostgreSQL
+jobs are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``; elsewhere
+each job is claimed with a compare-and-set ``UPDATE``. Running jobs
+refresh their ``heartbeat_at`` every third of ``JOBS_LOCK_TIMEOUT``;
+jobs whose worker died stop beating and are claimed again once their
+heartbeat is older than that, unless they used all their attempts (a job
+killing its worker would loop forever), then they are marked failed.
+Failed jobs are retried with exponential backoff until ``max_attempts``.
+"""
+
+# Python
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+# Django
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+# Models
+from jobs.models import Job
+
+# Queue
+from jobs.queue import load
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = getattr(settings, 'JOBS_POLL_INTERVAL', 1.0)
+LOCK_TIMEOUT = getattr(settings, 'JOBS_LOCK_TIMEOUT', 300)
+RETRY_BACKOFF = getattr(settings, 'JOBS_RETRY_BACKOFF', 5)
+RETRY_BACKOFF_MAX = getattr(settings, 'JOBS_RETRY_BACKOFF_MAX', 3600)
+RESULT_TTL = getattr(settings, 'JOBS_RESULT_TTL', 24 * 60 * 60)
+HEARTBEAT_INTERVAL = LOCK_TIMEOUT / 3
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that failed ``attempts`` times"""
+    delay = min(RETRY_BACKOFF * 2 ** (attempts - 1), RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def stale_jobs(queues, now):
+    """Running jobs whose worker stopped beating"""
+    stale = now - timedelta(seconds=LOCK_TIMEOUT)
+    return Job.objects.filter(queue__in=queues, status=Job.RUNNING, heartbeat_at__lt=stale)
+
+
+def ready_jobs(queues, now):
+    stale = now - timedelta(seconds=LOCK_TIMEOUT)
+    return Job.objects.filter(queue__in=queues).filter(
+        Q(status=Job.PENDING, run_at__lte=now)
+        | Q(status=Job.RUNNING, heartbeat_at__lt=stale, attempts__lt=F('max_attempts'))
+    )
+
+
+def reap(queues):
+    """Fail the stale jobs that used all their attempts; returns how many"""
+    now = timezone.now()
+    exhausted = stale_jobs(queues, now).filter(attempts__gte=F('max_attempts'))
+    for job in exhausted.only('id', 'name', 'attempts'):
+        logger.error('Job %s failed for good: its worker was lost after %s attempts', job, job.attempts)
+    return exhausted.update(
+        status=Job.FAILED, finished_at=now, locked_by='', last_error='Worker lost while running the job'
+    )
+
+
+def claim(worker_id, queues, limit):
+    """Lock up to ``limit`` ready jobs for ``worker_id``"""
+    now = timezone.now()
+    ready = ready_jobs(queues, now).order_by('run_at', 'id')
+    claimed = dict(
+        status=Job.RUNNING, locked_by=worker_id, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+    )
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(ready.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=ids).update(**claimed)
+    else:
+        ids = [
+            job_id for job_id in ready.values_list('id', flat=True)[:limit]
+            if ready_jobs(queues, now).filter(id=job_id).update(**claimed)
+        ]
+    return list(Job.objects.filter(id__in=ids, locked_by=worker_id).order_by('run_at', 'id'))
+
+
+class Heartbeat:
+    """Refresh ``heartbeat_at`` of a running job from a thread while it runs"""
+
+    def __init__(self, job, interval=HEARTBEAT_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def beat(self):
+        Job.objects.filter(id=self.job.id, locked_by=self.job.locked_by, status=Job.RUNNING).update(
+            heartbeat_at=timezone.now()
+        )
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                self.beat()
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def execute(job):
+    """Run a claimed job and record the outcome"""
+    owned = Job.objects.filter(id=job.id, locked_by=job.locked_by, status=Job.RUNNING)
+    try:
+        func, args, kwargs = load(job)
+        with Heartbeat(job):
+            func(*args, **kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            logger.error('Job %s failed for good after %s attempts\n%s', job, job.attempts, error)
+            owned.update(status=Job.FAILED, finished_at=now, last_error=error, locked_by='')
+        else:
+            logger.warning('Job %s failed (attempt %s), retrying\n%s', job, job.attempts, error)
+            owned.update(
+                status=Job.PENDING,
+                run_at=now + timedelta(seconds=backoff(job.attempts)),
+                last_error=error,
+                locked_by=''
+            )
+        return False
+    owned.update(status=Job.DONE, finished_at=timezone.now(), locked_by='')
+    return True
+
+
+class Worker:
+    """Polls ``queues`` and runs up to ``concurrency`` jobs at a time in threads"""
+
+    def __init__(self, queues=('default',), concurrency=1, poll_interval=POLL_INTERVAL, name=None):
+        self.queues = list(queues)
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = name or '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.executor = ThreadPoolExecutor(concurrency) if concurrency > 1 else None
+
+    def _execute(self, job):
+        try:
+            return execute(job)
+        finally:
+            if self.executor is not None:
+                close_old_connections()
+
+    def run_once(self):
+        """Run one batch of ready jobs; returns how many were run"""
+        jobs = claim(self.name, self.queues, self.concurrency)
+        if self.executor is None:
+            for job in jobs:
+                self._execute(job)
+        else:
+            list(self.executor.map(self._execute, jobs))
+        return len(jobs)
+
+    def purge(self):
+        """Delete finished jobs older than ``JOBS_RESULT_TTL``"""
+        expired = timezone.now() - timedelta(seconds=RESULT_TTL)
+        return Job.objects.filter(status=Job.DONE, finished_at__lt=expired).delete()[0]
+
+    def run(self, max_jobs=None, burst=False):
+        """Work until stopped, ``max_jobs`` have run, or, in ``burst`` mode, the queues are empty"""
+        done = 0
+        last_purge = 0
+        while max_jobs is None or done < max_jobs:
+            if time.monotonic() - last_purge > 60:
+                self.purge()
+                reap(self.queues)
+                last_purge = time.monotonic()
+            count = self.run_once()
+            done += count
+            close_old_connections()
+            if not count:
+                if burst:
+                    break
+                time.sleep(self.poll_interval)
+        return done
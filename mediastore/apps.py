@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class MediastoreConfig(AppConfig):
+    name = 'mediastore'
+    verbose_name = 'mediastore'
+
+    def ready(self):
+        from mediastore import refs
+        refs.connect()
@@ -0,0 +1,40 @@
+"""Unreferenced blob collection"""
+
+# Python
+from datetime import timedelta
+
+# Django
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+# Models
+from mediastore.models import Blob
+
+# Storage
+from mediastore.storage import get_blob_storage
+
+MEDIA_GC_GRACE = getattr(settings, 'MEDIA_GC_GRACE', 24 * 60 * 60)
+
+
+def collect_blobs(grace=MEDIA_GC_GRACE, dry_run=False):
+    """Delete blobs unreferenced for ``grace`` seconds; returns the deleted names.
+
+    Each blob row is locked while its file is removed, and ``save`` touches
+    the row before reusing a blob, so a blob being uploaded again is kept.
+    """
+    storage = get_blob_storage()
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    orphans = Blob.objects.filter(refcount=0, modified__lt=cutoff)
+
+    deleted = []
+    for blob_id in list(orphans.values_list('id', flat=True)):
+        with transaction.atomic():
+            blob = orphans.select_for_update().filter(id=blob_id).first()
+            if blob is None:
+                continue
+            if not dry_run:
+                storage.remove(blob.name)
+                blob.delete()
+            deleted.append(blob.name)
+    return deleted
@@ -0,0 +1,22 @@
+"""Delete unreferenced media blobs"""
+
+# Django
+from django.core.management.base import BaseCommand
+
+# Collection
+from mediastore.collect import MEDIA_GC_GRACE, collect_blobs
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed blobs no row has referenced for --grace seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=MEDIA_GC_GRACE)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        deleted = collect_blobs(options['grace'], options['dry_run'])
+        for name in deleted:
+            self.stdout.write(name)
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS('{} {} blobs'.format(verb, len(deleted))))
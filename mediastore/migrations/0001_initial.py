@@ -0,0 +1,34 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='Date time on which the objec was created', verbose_name='created_at')),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(help_text='Storage path, derived from the digest', max_length=100, unique=True)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-created', '-modified'],
+                'get_latest_by': ('created',),
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(fields=['refcount', 'modified'], name='blob_refcount_modified_idx'),
+        ),
+    ]
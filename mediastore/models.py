@@ -0,0 +1,24 @@
+"""Mediastore models"""
+
+# Django
+from django.db import models
+
+# Utils
+from utils.models import TweetmeBaseModel
+
+
+class Blob(TweetmeBaseModel):
+    """File stored once under its digest, see mediastore.storage"""
+
+    name = models.CharField(max_length=100, unique=True, help_text='Storage path, derived from the digest')
+    size = models.PositiveIntegerField(default=0)
+    # Rows whose file fields (or renditions) point to this blob, see mediastore.refs
+    refcount = models.PositiveIntegerField(default=0)
+
+    class Meta(TweetmeBaseModel.Meta):
+        indexes = [
+            models.Index(fields=['refcount', 'modified'], name='blob_refcount_modified_idx'),
+        ]
+
+    def __str__(self):
+        return '{} ({} refs)'.format(self.name, self.refcount)
@@ -0,0 +1,148 @@
+"""Blob reference counting
+
+Every model file field stored in ``ContentAddressedStorage`` is tracked,
+together with its ``<field>_renditions`` JSON column (see utils.images).
+The names a row points to are recorded when it is loaded; on save the
+blobs it stopped pointing to are released and the new ones acquired, on
+delete all of them are released, in the transaction of the write.
+
+``QuerySet.update()`` and ``bulk_create`` bypass the signals: tracked
+fields must be written with ``save()``, or the references of bulk
+inserted rows acquired with ``acquire_rows``.
+"""
+
+# Python
+from collections import Counter
+
+# Django
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, FileField
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.utils import timezone
+
+# Models
+from mediastore.models import Blob
+
+# Storage
+from mediastore.storage import ContentAddressedStorage
+
+# Images
+from utils.images import load_renditions
+
+SNAPSHOT_ATTR = '_blob_refs'
+
+# {model: [(attname, is_renditions)]}
+tracked_fields = {}
+
+
+def _update(names, delta):
+    by_count = {}
+    for name, count in names.items():
+        by_count.setdefault(count, []).append(name)
+    for count, group in by_count.items():
+        Blob.objects.filter(name__in=group).update(
+            refcount=Greatest(F('refcount') + delta * count, 0),
+            modified=timezone.now()
+        )
+
+
+def acquire(names):
+    """Add one reference per occurrence in ``names`` (a ``Counter``)"""
+    _update(names, 1)
+
+
+def release(names):
+    """Drop one reference per occurrence in ``names`` (a ``Counter``)"""
+    _update(names, -1)
+
+
+def acquire_rows(instances):
+    """Acquire the references of rows inserted without ``save()``"""
+    names = Counter()
+    for instance in instances:
+        if type(instance) in tracked_fields:
+            names.update(references(instance, _values(instance)))
+    acquire(names)
+
+
+def _values(instance):
+    """Current names of the tracked fields (``FieldFile`` objects change name when saved)"""
+    return {
+        attname: getattr(instance.__dict__.get(attname), 'name', instance.__dict__.get(attname))
+        for attname, _ in tracked_fields[type(instance)]
+    }
+
+
+def references(instance, values):
+    """Blob names referenced by ``values`` (raw tracked field values)"""
+    names = Counter()
+    for attname, is_renditions in tracked_fields[type(instance)]:
+        value = values.get(attname)
+        if not value:
+            continue
+        if is_renditions:
+            names.update(rendition['path'] for rendition in load_renditions(value))
+        else:
+            names[value] += 1
+    return names
+
+
+def snapshot(sender, instance, **kwargs):
+    """Record the names a row points to when it is loaded"""
+    deferred = instance.get_deferred_fields()
+    if not any(attname in deferred for attname, _ in tracked_fields[sender]):
+        setattr(instance, SNAPSHOT_ATTR, _values(instance))
+
+
+def load_snapshot(sender, instance, update_fields=None, **kwargs):
+    """Read the stored names of a row loaded with the tracked fields deferred"""
+    if instance._state.adding or hasattr(instance, SNAPSHOT_ATTR):
+        return
+    tracked = [attname for attname, _ in tracked_fields[sender]]
+    if update_fields is not None and not set(update_fields) & set(tracked):
+        return
+    values = sender._base_manager.filter(pk=instance.pk).values(*tracked).first()
+    setattr(instance, SNAPSHOT_ATTR, values or {})
+
+
+def update_references(sender, instance, created, update_fields=None, **kwargs):
+    tracked = [attname for attname, _ in tracked_fields[sender]]
+    if update_fields is not None and not set(update_fields) & set(tracked):
+        return
+
+    old = Counter()
+    if not created:
+        old = references(instance, getattr(instance, SNAPSHOT_ATTR, None) or {})
+
+    current = _values(instance)
+    new = references(instance, current)
+    acquire(new - old)
+    release(old - new)
+    setattr(instance, SNAPSHOT_ATTR, current)
+
+
+def release_references(sender, instance, **kwargs):
+    release(references(instance, getattr(instance, SNAPSHOT_ATTR, None) or _values(instance)))
+
+
+def connect():
+    """Track the file fields stored in ``ContentAddressedStorage``"""
+    for model in apps.get_models():
+        fields = []
+        for field in model._meta.concrete_fields:
+            if not isinstance(field, FileField) or not isinstance(field.storage, ContentAddressedStorage):
+                continue
+            fields.append((field.attname, False))
+            try:
+                renditions = model._meta.get_field('{}_renditions'.format(field.name))
+            except FieldDoesNotExist:
+                continue
+            fields.append((renditions.attname, True))
+        if fields:
+            tracked_fields[model] = fields
+            post_init.connect(snapshot, sender=model, weak=False)
+            pre_save.connect(load_snapshot, sender=model, weak=False)
+            post_save.connect(update_references, sender=model, weak=False)
+            post_delete.connect(release_references, sender=model, weak=False)
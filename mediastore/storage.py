@@ -0,0 +1,107 @@
+"""Content-addressed storage
+
+``ContentAddressedStorage`` hashes every file it saves and stores it once
+under ``blobs/<ab>/<cd>/<sha256><ext>``, whatever the name it was given:
+saving content that is already stored writes nothing and returns the
+existing name. Each blob has a ``Blob`` row whose ``refcount`` is kept by
+``mediastore.refs``; ``delete`` does nothing, unreferenced blobs are
+removed by ``manage.py collect_media`` after ``MEDIA_GC_GRACE`` seconds.
+
+Blob names never change content, so they are served as immutable.
+"""
+
+# Python
+import hashlib
+import os
+import re
+import tempfile
+
+# Django
+from django.core.files import File, locks
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils import timezone
+
+# Models
+from mediastore.models import Blob
+
+BLOB_PREFIX = 'blobs/'
+BLOB_RE = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.[0-9a-z]+)?$')
+
+
+def blob_digest(name):
+    """Digest of a blob name, ``None`` for other files"""
+    match = BLOB_RE.match(name)
+    return match.group('digest') if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Deduplicating file system storage"""
+
+    def digest(self, content):
+        """Return ``(sha256 hex digest, size)`` of ``content``"""
+        sha = hashlib.sha256()
+        size = 0
+        for chunk in content.chunks():
+            sha.update(chunk)
+            size += len(chunk)
+        return sha.hexdigest(), size
+
+    def blob_name(self, digest, name):
+        ext = os.path.splitext(name or '')[1].lower()
+        if not re.match(r'^\.[0-9a-z]{1,10}$', ext):
+            ext = ''
+        return '{}{}/{}/{}{}'.format(BLOB_PREFIX, digest[:2], digest[2:4], digest, ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest, size = self.digest(content)
+        name = self.blob_name(digest, name)
+        # Touching the row first keeps collect_media from removing the file
+        # between the existence check and the new reference
+        touched = Blob.objects.filter(name=name).update(modified=timezone.now())
+        if not touched or not self.exists(name):
+            self._save(name, content)
+        if not touched:
+            Blob.objects.get_or_create(name=name, defaults={'size': size})
+        return name
+
+    def _save(self, name, content):
+        """Write to a temporary file and move it in place, so readers never see partial blobs"""
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                locks.lock(tmp, locks.LOCK_EX)
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            # Same name means same bytes, so replacing a concurrent write is harmless
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
+
+    def delete(self, name):
+        """Blobs are shared: they are only removed by ``collect_media``"""
+        if blob_digest(name) is None:
+            super(ContentAddressedStorage, self).delete(name)
+
+    def remove(self, name):
+        super(ContentAddressedStorage, self).delete(name)
+
+
+def get_blob_storage():
+    """The content-addressed storage of the project"""
+    if isinstance(default_storage, ContentAddressedStorage):
+        return default_storage
+    return ContentAddressedStorage()
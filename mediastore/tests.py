@@ -0,0 +1,88 @@
+"""Mediastore tests"""
+
+# Python
+import json
+import shutil
+import tempfile
+from collections import Counter
+from unittest import mock
+
+# Django
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+# Models
+from mediastore.models import Blob
+from tweets.models import Tweet
+
+# Collection
+from mediastore.collect import collect_blobs
+
+# Utils
+from tweets.tests import create_user, api_client, image_upload
+
+
+class MediaStoreTestCase(TestCase):
+    """Uploads are stored once and reference counted"""
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root, JOBS_ALWAYS_EAGER=True)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.alice = create_user('alice')
+
+    def test_dedup(self):
+        first = Tweet.objects.create(user=self.alice, image=ContentFile(b'gif', name='a.gif'))
+        second = Tweet.objects.create(user=self.alice, image=ContentFile(b'gif', name='b.gif'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('blobs/'))
+        self.assertEqual(Blob.objects.get(name=first.image.name).refcount, 2)
+
+        second.image = ContentFile(b'other', name='c.gif')
+        second.save()
+        self.assertEqual(Blob.objects.get(name=first.image.name).refcount, 1)
+
+        Tweet.objects.get(id=first.id).delete()
+        blob = Blob.objects.get(name=first.image.name)
+        self.assertEqual(blob.refcount, 0)
+
+        self.assertEqual(collect_blobs(grace=60), [])
+        self.assertEqual(collect_blobs(grace=0), [blob.name])
+        self.assertFalse(default_storage.exists(blob.name))
+        self.assertTrue(default_storage.exists(second.image.name))
+
+    def test_renditions_referenced(self):
+        client = api_client(self.alice)
+        upload = {'content': 'foto', 'image': image_upload(size=(400, 300))}
+        tweet = Tweet.objects.get(id=client.post('/api/tweets/', upload, format='multipart').data['id'])
+        names = Counter([tweet.image.name] + [rendition['path'] for rendition in json.loads(tweet.image_renditions)])
+        # the medium JPEG is the unscaled original, stored once
+        self.assertEqual(names.most_common(1)[0][1], 2)
+        self.assertEqual(dict(Blob.objects.filter(name__in=names).values_list('name', 'refcount')), dict(names))
+
+        tweet.delete()
+        self.assertEqual(set(Blob.objects.filter(name__in=names).values_list('refcount', flat=True)), {0})
+
+    def test_serve(self):
+        tweet = Tweet.objects.create(user=self.alice, image=ContentFile(b'GIF89a', name='a.gif'))
+        url = tweet.image.url
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'GIF89a')
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        with mock.patch('mediastore.views.MEDIA_SENDFILE', 'x-accel'):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + tweet.image.name)
+        self.assertEqual(response.content, b'')
+
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
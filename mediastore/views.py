@@ -0,0 +1,69 @@
+"""Media serving
+
+Blobs never change, so they are served with a year long ``immutable``
+``Cache-Control`` and their digest as ``ETag``; other files under
+``MEDIA_ROOT`` get ``MEDIA_CACHE_SECONDS``. With ``MEDIA_SENDFILE`` set
+Django only answers the headers and the web server sends the file:
+
+- ``'x-accel'``: nginx ``X-Accel-Redirect`` to ``MEDIA_ACCEL_PREFIX`` + name,
+  which must map to ``MEDIA_ROOT`` in an ``internal`` location.
+- ``'x-sendfile'``: Apache / lighttpd ``X-Sendfile`` with the full path.
+"""
+
+# Python
+import mimetypes
+import os
+
+# Django
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+
+# Storage
+from mediastore.storage import blob_digest, get_blob_storage
+
+MEDIA_SENDFILE = getattr(settings, 'MEDIA_SENDFILE', None)
+MEDIA_ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+MEDIA_CACHE_SECONDS = getattr(settings, 'MEDIA_CACHE_SECONDS', 60 * 60)
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def serve(request, path):
+    """Serve a file of ``MEDIA_ROOT``"""
+    storage = get_blob_storage()
+    try:
+        full_path = storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    digest = blob_digest(path)
+    etag = '"{}"'.format(digest) if digest else None
+    if etag and etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+    else:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or 'application/octet-stream'
+        if MEDIA_SENDFILE == 'x-accel':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX + path
+        elif MEDIA_SENDFILE == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = full_path
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+            response['Content-Length'] = os.path.getsize(full_path)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(os.path.getmtime(full_path))
+        response['X-Content-Type-Options'] = 'nosniff'
+
+    if etag:
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=MEDIA_CACHE_SECONDS)
+    return response
@@ -33,6 +33,48 @@ LOGIN_URL = '/login'
 MAX_TWEET_LENGTH = 240
 TWEET_ACTION_OPTIONS = ['like', 'unlike', 'retweet']
 
+# Home timelines (fan-out on write)
+TIMELINE_STORE = 'tweets.timelines.DatabaseTimelineStore'
+TIMELINE_MAX_LENGTH = 800
+
+# Full-text search of tweet content, see tweets.search
+# (None picks the backend of the database engine)
+TWEET_SEARCH_BACKEND = None
+
+# Trending hashtags and terms, see tweets.trending
+TRENDING_WINDOW_MINUTES = 60
+TRENDING_BUCKET_SECONDS = 60
+TRENDING_TICK = 30
+# Tweets committed this long after their id was generated may be missed
+TRENDING_OVERLAP_SECONDS = 120
+
+# Tweets older than this are moved to the archive tables by
+# `manage.py archive_tweets`, see tweets.archive
+TWEET_ARCHIVE_DAYS = 365
+
+# Tweet and comment ids are time-ordered 64-bit ids, see utils.ids. Every
+# process leases its own worker id: an advisory lock on PostgreSQL, else a
+# lock file in this directory (None: the temporary directory)
+SNOWFLAKE_LOCK_DIR = None
+
+# Background jobs, see jobs.queue. Run workers with `manage.py jobs_worker`;
+# with JOBS_ALWAYS_EAGER jobs run inline (required by InMemoryTimelineStore)
+JOBS_ALWAYS_EAGER = DEBUG
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 5
+JOBS_LOCK_TIMEOUT = 300
+
+# Uploaded images, see utils.images. Uploads are decoded in a pool of
+# IMAGE_PROCESS_WORKERS processes (0 decodes in the request thread) and
+# resized so the longest side fits each rendition size
+IMAGE_RENDITIONS = (('small', 320), ('medium', 640), ('large', 1280))
+IMAGE_FORMATS = ('webp', 'jpeg')
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+IMAGE_PROCESS_WORKERS = 2
+
+# Render hot list endpoints with compiled serializers, see utils.serializers
+FAST_SERIALIZATION = False
+
 
 # Application definition
 
@@ -50,14 +92,18 @@ INSTALLED_APPS = [
     # Internal
     'users',
     'tweets',
+    'jobs',
+    'mediastore',
 ]
 
 MIDDLEWARE = [
+    'utils.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'utils.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -67,6 +113,20 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'tweetme2.urls'
 
+# Request timings, see utils.instrumentation. Requests over a budget are
+# logged; histograms are served at /metrics to the addresses (or networks)
+# of METRICS_ALLOWED_IPS and to scrapers sending METRICS_TOKEN as a bearer
+# token, everyone else is refused
+SERVER_TIMING = DEBUG
+PERFORMANCE_QUERY_BUDGET = 50
+PERFORMANCE_LATENCY_BUDGET = 0.5
+METRICS_TOKEN = None
+METRICS_ALLOWED_IPS = []
+# Every worker process writes its histograms and counters here and
+# /metrics serves their sum; empty it when the server starts
+METRICS_DIR = os.path.join(BASE_DIR, 'cache', 'metrics')
+METRICS_FLUSH_SECONDS = 5
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -96,10 +156,58 @@ DATABASES = {
         'USER':  'postgres',
         'PASSWORD': '',
         'HOST': 'localhost',
-        'PORT': '5432'
+        'PORT': '5432',
+        # Keep connections open across requests instead of connecting on
+        # every request; each worker thread holds its own connection
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Read replicas, see utils.routers. Add each replica to DATABASES and list
+# its alias in DATABASE_REPLICAS, e.g. locally a second alias of the same
+# database with 'TEST': {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['utils.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+# Sticky flags live in this cache, shared by every worker process
+DATABASE_STICKY_CACHE = 'invalidation'
+DATABASE_STICKY_SECONDS = 5
+DATABASE_HEALTH_CHECK_INTERVAL = 10
+DATABASE_REPLICA_MAX_LAG = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# Invalidations must reach every worker process: the cache has to be
+# shared by all of them (see utils.checks). File based is shared by the
+# workers of one host; use memcached or redis with several hosts.
+# Version tokens and invalidation markers must not be evicted by the
+# entries they guard: they get their own alias, large enough not to cull
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default'),
+    },
+    'invalidation': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'invalidation'),
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
+# Anonymous tweet list/detail responses, see tweets.cache
+TWEET_RESPONSE_CACHE = 'default'
+TWEET_RESPONSE_CACHE_TIMEOUT = 60
+TWEET_VERSION_CACHE = 'invalidation'
+
+# Tweet-by-id object cache, see tweets.cache.TweetCache
+TWEET_OBJECT_CACHE = 'default'
+TWEET_OBJECT_CACHE_TIMEOUT = 300
+
+# Serialized author blocks by user id, see users.cache.AuthorCache
+AUTHOR_CACHE = 'default'
+AUTHOR_CACHE_TIMEOUT = 600
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -151,6 +259,15 @@ STATICFILES_FINDERS = [
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Uploads are stored once per content, see mediastore.storage. Blobs no
+# row references are deleted by `manage.py collect_media` after
+# MEDIA_GC_GRACE seconds. MEDIA_SENDFILE ('x-accel' or 'x-sendfile') hands
+# the file transfer to the web server, see mediastore.views
+DEFAULT_FILE_STORAGE = 'mediastore.storage.ContentAddressedStorage'
+MEDIA_GC_GRACE = 24 * 60 * 60
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
 
 CORS_ORIGIN_ALLOW_ALL = True
 
@@ -163,6 +280,9 @@ AUTH_USER_MODEL = 'users.User'
 
 
 # Django rest framework
+# List 'utils.renderers.FastJSONRenderer' first in DEFAULT_RENDERER_CLASSES
+# to render JSON with orjson (same output as JSONRenderer but for floats,
+# see its docstring)
 REST_FRAMEWORK = {
     """'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -172,13 +292,21 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 4
 }
 
 
+# Read-only requests resolve the user from the cache (or, trusting the
+# token claims, from an "active" marker), see users.authentication.
+# Requires shared caches, deactivations must reach every worker; a user
+# deactivated without a save is rejected within the timeout
+AUTH_MARKER_CACHE = 'invalidation'
+AUTH_USER_CACHE_TIMEOUT = 60
+AUTH_TRUST_TOKEN_CLAIMS = False
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=14),
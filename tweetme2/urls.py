@@ -1,11 +1,18 @@
 
 from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, re_path, include
+
+# Media
+from mediastore.views import serve as serve_media
+
+# Utils
+from utils.metrics import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics),
     path('api/', include(('tweets.urls', 'tweets'), namespace='tweets')),
-    path('api/', include(('users.urls', 'users'), namespace='users'))
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path('api/', include(('users.urls', 'users'), namespace='users')),
+    re_path(r'^{}(?P<path>.+)$'.format(settings.MEDIA_URL.lstrip('/')), serve_media),
+]
\ No newline at end of file
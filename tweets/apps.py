@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TweetsConfig(AppConfig):
     name = 'tweets'
+
+    def ready(self):
+        from tweets import signals
+        post_migrate.connect(signals.install_search_index, sender=self)
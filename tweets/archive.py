@@ -0,0 +1,117 @@
+"""Cold tweet archive
+
+Tweets older than ``TWEET_ARCHIVE_DAYS`` are moved, with their comments
+and likes, to the ``Archived*`` tables by ``manage.py archive_tweets``,
+so the hot tables and their indexes only cover recent history. Derived
+rows (timeline entries, hashtags, mentions) are dropped with them.
+Tweets still retweeted by a live tweet stay until the retweet is
+archived too.
+
+Archived tweets keep their id: ``get_archived`` loads them as unsaved
+``Tweet`` instances for the lookups by id (retrieve, batch), their
+comments can still be listed and their owner can delete them
+(``delete_archived``). They are read-only otherwise: likes, retweets and
+new comments answer 404, and they are left out of lists, search and the
+tweets of a user.
+"""
+
+# Python
+from datetime import timedelta
+
+# Django
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+# Models
+from tweets.models import (
+    ArchivedComment, ArchivedTweet, ArchivedTweetLike, Comment, Tweet, TweetLike
+)
+
+# Cache
+from tweets.cache import tweet_cache
+
+# Counters
+from tweets.counters import incr_tweet_counter, incr_user_counter
+
+# Media
+from mediastore.refs import acquire_rows
+
+TWEET_ARCHIVE_DAYS = getattr(settings, 'TWEET_ARCHIVE_DAYS', 365)
+
+TWEET_COLUMNS = [field.attname for field in Tweet._meta.concrete_fields]
+COMMENT_COLUMNS = ['id', 'tweet_id', 'user_id', 'content', 'created', 'modified']
+LIKE_COLUMNS = ['user_id', 'tweet_id', 'created']
+
+
+def default_cutoff():
+    return timezone.now() - timedelta(days=TWEET_ARCHIVE_DAYS)
+
+
+def archivable(cutoff):
+    """Tweets created before ``cutoff`` that no live tweet retweets"""
+    return Tweet.objects.filter(created__lt=cutoff).annotate(
+        retweeted=Exists(Tweet.objects.filter(parent=OuterRef('pk')))
+    ).filter(retweeted=False)
+
+
+def archive_batch(cutoff, batch_size=500):
+    """Archive up to ``batch_size`` tweets; returns how many were moved"""
+    with transaction.atomic():
+        ids = list(archivable(cutoff).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+
+        tweets = [ArchivedTweet(**row) for row in Tweet.objects.filter(id__in=ids).values(*TWEET_COLUMNS)]
+        ArchivedTweet.objects.bulk_create(tweets)
+        acquire_rows(tweets)
+        ArchivedComment.objects.bulk_create([
+            ArchivedComment(**row)
+            for row in Comment.objects.filter(tweet_id__in=ids).values(*COMMENT_COLUMNS)
+        ])
+        ArchivedTweetLike.objects.bulk_create([
+            ArchivedTweetLike(**row)
+            for row in TweetLike.objects.filter(tweet_id__in=ids).values(*LIKE_COLUMNS)
+        ])
+        Tweet.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def get_archived(tweet_ids):
+    """Return ``{id: tweet}`` of the archived ``tweet_ids``, with parents"""
+    tweets = {archived.id: archived.as_tweet() for archived in ArchivedTweet.objects.filter(id__in=tweet_ids)}
+
+    parent_ids = {tweet.parent_id for tweet in tweets.values() if tweet.parent_id is not None}
+    parents = tweet_cache.get_many(parent_ids)
+    missing = parent_ids - set(parents) - set(tweets)
+    if missing:
+        parents.update(
+            (archived.id, archived.as_tweet()) for archived in ArchivedTweet.objects.filter(id__in=missing)
+        )
+    parents.update(tweets)
+
+    for tweet in tweets.values():
+        if tweet.parent_id is not None:
+            tweet.parent = parents.get(tweet.parent_id)
+    return tweets
+
+
+def delete_archived(tweet):
+    """Delete an archived tweet with its comments and likes; returns whether it was still there"""
+    with transaction.atomic():
+        # Row by row, so its media references are released
+        deleted, _ = ArchivedTweet.objects.filter(id=tweet.id).delete()
+        if not deleted:
+            return False
+        ArchivedComment.objects.filter(tweet_id=tweet.id).delete()
+        ArchivedTweetLike.objects.filter(tweet_id=tweet.id).delete()
+        incr_user_counter(tweet.user_id, 'tweet_count', -1)
+        if tweet.parent_id is not None:
+            # The parent may be live or archived
+            incr_tweet_counter(tweet.parent_id, 'retweet_count', -1)
+            ArchivedTweet.objects.filter(id=tweet.parent_id).update(
+                retweet_count=Greatest(F('retweet_count') - 1, 0)
+            )
+    return True
@@ -0,0 +1,220 @@
+"""Tweet caches
+
+Anonymous ``list`` and ``retrieve`` responses are cached under keys that
+embed version tokens: a global one for lists and one per tweet for
+details, plus the one of the parent for retweets. Writes replace the
+tokens instead of deleting keys, so stale entries are simply never read
+again and expire on their own.
+
+Tokens are random, written with a plain ``set`` (no read-modify-write
+``incr`` for backends where it is not atomic) and kept in their own
+cache (``TWEET_VERSION_CACHE``) so responses never evict them. A token
+that is lost anyway is replaced by a new one, never by an earlier value.
+
+Tweet rows are also cached by id (``TweetCache``) so list pages can be
+hydrated with one multi-get. Their keys carry the tweet's token as read
+before the row was loaded: a reader that loaded a row just before a write
+committed stores it under the old token, where nobody looks anymore.
+
+Every worker process must see the invalidations: these caches have to be
+shared (system check ``tweets.E001``).
+"""
+
+# Python
+import hashlib
+import uuid
+
+# Django
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Models
+from tweets.models import Tweet
+
+# Utils
+from utils.instrumentation import object_cache_hits, object_cache_misses
+
+RESPONSE_CACHE = getattr(settings, 'TWEET_RESPONSE_CACHE', 'default')
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'TWEET_RESPONSE_CACHE_TIMEOUT', 60)
+
+VERSION_CACHE = getattr(settings, 'TWEET_VERSION_CACHE', 'default')
+
+OBJECT_CACHE = getattr(settings, 'TWEET_OBJECT_CACHE', 'default')
+OBJECT_CACHE_TIMEOUT = getattr(settings, 'TWEET_OBJECT_CACHE_TIMEOUT', 300)
+
+GLOBAL_VERSION_KEY = 'tweets:version'
+NO_PARENT = 0
+
+
+def get_response_cache():
+    return caches[RESPONSE_CACHE]
+
+
+def get_version_cache():
+    return caches[VERSION_CACHE]
+
+
+def tweet_version_key(tweet_id):
+    return 'tweets:version:{}'.format(tweet_id)
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def get_versions(version_keys):
+    """Current tokens of ``version_keys``; missing ones are created"""
+    cache = get_version_cache()
+    found = cache.get_many(version_keys)
+    missing = [key for key in version_keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, new_version(), None)
+        found.update(cache.get_many(missing))
+    # Without a working cache every request gets a key of its own
+    return [found.get(key) or new_version() for key in version_keys]
+
+
+def bump_versions(*tweet_ids):
+    """Invalidate cached lists and the details of ``tweet_ids``"""
+    version_keys = [GLOBAL_VERSION_KEY] + [tweet_version_key(tweet_id) for tweet_id in tweet_ids]
+    get_version_cache().set_many({key: new_version() for key in version_keys}, None)
+
+
+def tweets_changed(*tweet_ids):
+    """Invalidate every cache holding ``tweet_ids`` once the transaction commits"""
+    transaction.on_commit(lambda: bump_versions(*tweet_ids))
+
+
+def parent_key(tweet_id):
+    return 'tweets:parent:{}'.format(tweet_id)
+
+
+def get_parent_id(tweet_id):
+    """Parent of ``tweet_id`` (``NO_PARENT`` for originals), ``None`` if not known yet"""
+    return get_version_cache().get(parent_key(tweet_id))
+
+
+def set_parent_id(tweet_id, parent_id):
+    # A tweet never changes parent
+    get_version_cache().set(parent_key(tweet_id), parent_id or NO_PARENT, None)
+
+
+def response_cache_key(request, action, tweet_id=None, parent_id=None):
+    """Cache key of an anonymous response, for the current versions.
+
+    A retweet detail embeds its parent, so its key also carries the
+    version of ``parent_id``.
+    """
+    if tweet_id is None:
+        version_keys = [GLOBAL_VERSION_KEY]
+    else:
+        version_keys = [tweet_version_key(tweet_id)]
+        if parent_id:
+            version_keys.append(tweet_version_key(parent_id))
+    versions = get_versions(version_keys)
+
+    params = sorted(request.query_params.lists())
+    raw = '{}|{}|{}|{}'.format(request.build_absolute_uri('/'), tweet_id, versions, params)
+    return 'tweets:response:{}:{}'.format(action, hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+
+class TweetCache:
+    """Tweet-by-id object cache.
+
+    Only the tweet row is cached: the parent is hydrated from the cache as
+    a tweet of its own and authors come from the author cache.
+    """
+
+    def __init__(self, name, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+        self.name = name
+        object_cache_hits.declare(name)
+        object_cache_misses.declare(name)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, tweet_id, version):
+        return 'tweets:object:{}:{}'.format(tweet_id, version)
+
+    def get_many(self, tweet_ids):
+        """Return ``{id: tweet}`` for ``tweet_ids``; misses are loaded in one query.
+
+        Versions are read before the load, so a row read before a write
+        committed is filled under a token the write has already replaced.
+        """
+        tweet_ids = list(set(tweet_ids))
+        versions = get_versions([tweet_version_key(tweet_id) for tweet_id in tweet_ids])
+        keys = {self.key(tweet_id, version): tweet_id for tweet_id, version in zip(tweet_ids, versions)}
+        found = self.cache.get_many(list(keys))
+        tweets = {keys[key]: tweet for key, tweet in found.items()}
+
+        missing = {key: tweet_id for key, tweet_id in keys.items() if tweet_id not in tweets}
+        if missing:
+            loaded = Tweet.objects.filter(id__in=missing.values())
+            fresh = {tweet.id: tweet for tweet in loaded}
+            self.cache.set_many(
+                {key: fresh[tweet_id] for key, tweet_id in missing.items() if tweet_id in fresh},
+                self.timeout
+            )
+            tweets.update(fresh)
+
+        object_cache_hits.inc(self.name, len(keys) - len(missing))
+        object_cache_misses.inc(self.name, len(missing))
+        return tweets
+
+    def hydrate(self, rows):
+        """Replace tweet rows (only ``id`` and ``parent_id`` are read) with cached tweets.
+
+        Tweets and their parents are fetched with a single multi-get.
+        """
+        ids = [row.id for row in rows]
+        parent_ids = [row.parent_id for row in rows if row.parent_id is not None]
+        tweets = self.get_many(ids + parent_ids)
+
+        page = []
+        for tweet_id in ids:
+            tweet = tweets.get(tweet_id)
+            if tweet is None:
+                continue
+            if tweet.parent_id is not None:
+                tweet.parent = tweets.get(tweet.parent_id)
+            page.append(tweet)
+        return page
+
+    def get_ordered(self, tweet_ids):
+        """Tweets of ``tweet_ids`` in that order, with parents; missing ids are skipped"""
+        tweets = self.get_many(tweet_ids)
+        parent_ids = {tweet.parent_id for tweet in tweets.values() if tweet.parent_id is not None}
+        parent_ids -= set(tweets)
+        if parent_ids:
+            tweets.update(self.get_many(parent_ids))
+
+        page = []
+        for tweet_id in tweet_ids:
+            tweet = tweets.get(tweet_id)
+            if tweet is None:
+                continue
+            if tweet.parent_id is not None:
+                tweet.parent = tweets.get(tweet.parent_id)
+            page.append(tweet)
+        return page
+
+    @property
+    def hits(self):
+        return object_cache_hits.get(self.name)
+
+    @property
+    def misses(self):
+        return object_cache_misses.get(self.name)
+
+    def stats(self):
+        """Hits and misses of this process"""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+tweet_cache = TweetCache('tweets', OBJECT_CACHE, OBJECT_CACHE_TIMEOUT)
@@ -0,0 +1,59 @@
+"""Denormalized engagement counters
+
+Counters live on ``Tweet`` (likes, retweets, comments) and ``User``
+(followers, followings, tweets). Write paths bump them with a single
+``UPDATE ... SET x = x + n`` so concurrent requests never lose updates;
+``manage.py repair_counters`` recomputes them from the source tables.
+"""
+
+# Django
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Models
+from tweets.models import Tweet, TweetLike, Comment, ArchivedTweet
+from users.models import User, FollowRelation
+
+# Cache
+from tweets.cache import tweets_changed
+
+
+def incr_tweet_counter(tweet_id, field, delta=1):
+    """Add ``delta`` to ``field`` of a tweet"""
+    Tweet.objects.filter(pk=tweet_id).update(**{field: F(field) + delta})
+    tweets_changed(tweet_id)
+
+
+def incr_user_counter(user_id, field, delta=1):
+    """Add ``delta`` to ``field`` of a user"""
+    User.objects.filter(pk=user_id).update(**{field: F(field) + delta})
+
+
+def _count(queryset, field):
+    """Correlated ``COUNT(*)`` of ``queryset`` grouped by ``field``"""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        total=Count('pk')
+    ).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def recount_tweet_counters(queryset=None):
+    """Recompute the counters of ``queryset`` (every tweet by default)"""
+    if queryset is None:
+        queryset = Tweet.objects.all()
+    return queryset.update(
+        like_count=_count(TweetLike.objects.all(), 'tweet'),
+        retweet_count=_count(Tweet.objects.all(), 'parent') + _count(ArchivedTweet.objects.all(), 'parent_id'),
+        comment_count=_count(Comment.objects.all(), 'tweet')
+    )
+
+
+def recount_user_counters(queryset=None):
+    """Recompute the counters of ``queryset`` (every user by default)"""
+    if queryset is None:
+        queryset = User.objects.all()
+    return queryset.update(
+        follower_count=_count(FollowRelation.objects.all(), 'following'),
+        following_count=_count(FollowRelation.objects.all(), 'follower'),
+        tweet_count=_count(Tweet.objects.all(), 'user') + _count(ArchivedTweet.objects.all(), 'user')
+    )
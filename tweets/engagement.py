@@ -0,0 +1,215 @@
+"""Bulk engagement
+
+Applies a queue of likes, unlikes, follows and unfollows (as replayed by
+offline clients) with set-based queries: one lookup per kind of target,
+one read of the current state, then bulk inserts/deletes and one counter
+``UPDATE`` per direction, all in a single transaction.
+
+Operations are replayed in order against the current state, so every
+item reports whether it changed anything (liking twice changes once) and
+only the net difference is written. Counters are bumped by the rows the
+statements really inserted or deleted (``RETURNING``), so a concurrent
+request writing the same rows cannot make them drift. The tweets and
+users about to be liked or followed are locked first: those deleted in
+the meantime are reported as not found instead of failing the foreign
+key check at commit.
+"""
+
+# Python
+import sqlite3
+
+# Django
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Models
+from tweets.models import Tweet, TweetLike
+from users.models import User, FollowRelation
+
+# Jobs
+from tweets.tasks import update_timeline
+
+# Cache
+from tweets.cache import tweets_changed
+
+TWEET_ACTIONS = {'like': True, 'unlike': False}
+USER_ACTIONS = {'follow': True, 'unfollow': False}
+TWEET_NOT_FOUND = 'Tweet no encontrado'
+USER_NOT_FOUND = 'Usuario no encontrado'
+
+
+def _replay(operations, key, actions, state, targets, errors):
+    """Replay ``operations`` on ``state`` (set of target ids); returns per-item results"""
+    results = {}
+    for index, operation in enumerate(operations):
+        if operation['action'] not in actions:
+            continue
+        if operation[key] in errors:
+            results[index] = {'status': 'error', 'detail': errors[operation[key]]}
+            continue
+        target = targets[operation[key]]
+        before = target.id in state
+        if actions[operation['action']]:
+            state.add(target.id)
+        else:
+            state.discard(target.id)
+        results[index] = {'status': 'ok', 'changed': before != (target.id in state), 'target': target}
+    return results
+
+
+def _supports_returning():
+    if connection.vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 35)
+    return connection.vendor == 'postgresql'
+
+
+def _insert_edges(model, owner, target, owner_id, target_ids):
+    """Insert the missing ``(owner, target)`` rows; returns the target ids inserted"""
+    if not target_ids:
+        return set()
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}, {}, created, modified) VALUES {{}} ON CONFLICT ({}, {}) DO NOTHING'.format(
+        quote(model._meta.db_table), quote(owner), quote(target), quote(owner), quote(target)
+    )
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        if _supports_returning():
+            cursor.execute(
+                sql.format(', '.join(['(%s, %s, %s, %s)'] * len(target_ids))) + ' RETURNING ' + quote(target),
+                [value for target_id in target_ids for value in (owner_id, target_id, now, now)]
+            )
+            return {row[0] for row in cursor.fetchall()}
+        inserted = set()
+        for target_id in target_ids:
+            cursor.execute(sql.format('(%s, %s, %s, %s)'), [owner_id, target_id, now, now])
+            if cursor.rowcount > 0:
+                inserted.add(target_id)
+        return inserted
+
+
+def _delete_edges(model, owner, target, owner_id, target_ids):
+    """Delete the ``(owner, target)`` rows; returns the target ids deleted"""
+    if not target_ids:
+        return set()
+    quote = connection.ops.quote_name
+    sql = 'DELETE FROM {} WHERE {} = %s AND {} {{}}'.format(quote(model._meta.db_table), quote(owner), quote(target))
+    with connection.cursor() as cursor:
+        if _supports_returning():
+            cursor.execute(
+                sql.format('IN ({}) RETURNING {}'.format(', '.join(['%s'] * len(target_ids)), quote(target))),
+                [owner_id] + list(target_ids)
+            )
+            return {row[0] for row in cursor.fetchall()}
+        deleted = set()
+        for target_id in target_ids:
+            cursor.execute(sql.format('= %s'), [owner_id, target_id])
+            if cursor.rowcount > 0:
+                deleted.add(target_id)
+        return deleted
+
+
+def _lock(model, ids):
+    """Lock the rows of ``ids`` until the transaction ends; returns the ids still there"""
+    if not ids:
+        return set()
+    return set(model.objects.select_for_update().filter(id__in=ids).order_by('id').values_list('id', flat=True))
+
+
+def _not_found(results, operations, actions, target_ids, detail):
+    """Turn the results of ``operations`` on ``target_ids`` into errors"""
+    for index, operation in enumerate(operations):
+        if operation['action'] not in actions or index not in results:
+            continue
+        target = results[index].get('target')
+        if target is not None and target.id in target_ids:
+            results[index] = {'status': 'error', 'detail': detail}
+
+
+def _bump(model, ids, field, delta):
+    if ids:
+        model.objects.filter(id__in=ids).update(**{field: F(field) + delta})
+
+
+def apply_engagement(user, operations):
+    """Apply ``operations`` as ``user``; returns one result per operation"""
+    tweet_ids = {op['tweet'] for op in operations if op['action'] in TWEET_ACTIONS}
+    usernames = {op['user'] for op in operations if op['action'] in USER_ACTIONS}
+
+    tweets = {tweet.id: tweet for tweet in Tweet.objects.filter(id__in=tweet_ids).only('id').order_by()}
+    users = {
+        account.username: account
+        for account in User.objects.filter(username__in=usernames, is_active=True)
+    }
+    tweet_errors = {tweet_id: TWEET_NOT_FOUND for tweet_id in tweet_ids - set(tweets)}
+    user_errors = {username: USER_NOT_FOUND for username in usernames - set(users)}
+    if user.username in users:
+        user_errors[user.username] = 'No puedes seguir o dejar de seguir tu propio perfil'
+
+    liked = set(TweetLike.objects.filter(
+        user=user, tweet_id__in=list(tweets)
+    ).order_by().values_list('tweet_id', flat=True))
+    followed = set(FollowRelation.objects.filter(
+        follower=user, following__username__in=usernames
+    ).order_by().values_list('following_id', flat=True))
+
+    liked_before, followed_before = set(liked), set(followed)
+    results = _replay(operations, 'tweet', TWEET_ACTIONS, liked, tweets, tweet_errors)
+    results.update(_replay(operations, 'user', USER_ACTIONS, followed, users, user_errors))
+
+    likes, unlikes = liked - liked_before, liked_before - liked
+    follows, unfollows = followed - followed_before, followed_before - followed
+
+    with transaction.atomic():
+        # Targets deleted since the lookup cannot be linked to
+        gone_tweets = likes - _lock(Tweet, likes)
+        gone_users = follows - _lock(User, follows)
+        _not_found(results, operations, TWEET_ACTIONS, gone_tweets, TWEET_NOT_FOUND)
+        _not_found(results, operations, USER_ACTIONS, gone_users, USER_NOT_FOUND)
+        likes, unlikes = likes - gone_tweets, unlikes - gone_tweets
+        follows, unfollows = follows - gone_users, unfollows - gone_users
+
+        # The state above may be stale: count only what is really written
+        likes = _insert_edges(TweetLike, 'user_id', 'tweet_id', user.id, likes)
+        unlikes = _delete_edges(TweetLike, 'user_id', 'tweet_id', user.id, unlikes)
+        _bump(Tweet, likes, 'like_count', 1)
+        _bump(Tweet, unlikes, 'like_count', -1)
+
+        follows = _insert_edges(FollowRelation, 'follower_id', 'following_id', user.id, follows)
+        unfollows = _delete_edges(FollowRelation, 'follower_id', 'following_id', user.id, unfollows)
+        _bump(User, follows, 'follower_count', 1)
+        _bump(User, unfollows, 'follower_count', -1)
+        if follows or unfollows:
+            _bump(User, [user.id], 'following_count', len(follows) - len(unfollows))
+
+        if likes or unlikes:
+            tweets_changed(*(likes | unlikes))
+
+        for user_id in follows:
+            update_timeline.delay(user.id, user_id, True)
+        for user_id in unfollows:
+            update_timeline.delay(user.id, user_id, False)
+
+    accounts = {account.id: account for account in users.values()}
+
+    like_counts = dict(Tweet.objects.filter(id__in=list(tweets)).order_by().values_list('id', 'like_count'))
+    follower_counts = dict(User.objects.filter(id__in=list(accounts)).order_by().values_list('id', 'follower_count'))
+
+    response = []
+    for index, operation in enumerate(operations):
+        result = dict(operation)
+        outcome = results[index]
+        target = outcome.pop('target', None)
+        result.update(outcome)
+        if target is not None:
+            # Deleted after the transaction committed
+            if operation['action'] in TWEET_ACTIONS:
+                count, field, detail = like_counts.get(target.id), 'likes', TWEET_NOT_FOUND
+            else:
+                count, field, detail = follower_counts.get(target.id), 'followers', USER_NOT_FOUND
+            if count is None:
+                result = dict(operation, status='error', detail=detail)
+            else:
+                result[field] = count
+        response.append(result)
+    return response
@@ -0,0 +1,46 @@
+"""Hashtags and mentions
+
+Parsed once when a tweet is written and stored in ``TweetHashtag`` /
+``TweetMention``, so "tweets with #tag" and "tweets mentioning @user" are
+index lookups instead of ``content`` scans.
+"""
+
+# Python
+import re
+
+# Models
+from tweets.models import TweetHashtag, TweetMention
+from users.models import User
+
+HASHTAG_RE = re.compile(r'(?<![\w#])#(\w+)', re.UNICODE)
+MENTION_RE = re.compile(r'(?<![\w@])@([\w.+-]+)', re.UNICODE)
+
+
+def normalize_hashtag(tag):
+    return tag.lstrip('#').lower()
+
+
+def parse_hashtags(content):
+    """Distinct hashtags of ``content``, normalized"""
+    return {normalize_hashtag(tag) for tag in HASHTAG_RE.findall(content or '')}
+
+
+def parse_mentions(content):
+    """Distinct usernames mentioned in ``content``"""
+    return {username.rstrip('.') for username in MENTION_RE.findall(content or '')}
+
+
+def index_entities(tweet, replace=False):
+    """Store the hashtags and mentions of ``tweet``; ``replace`` drops the previous ones"""
+    if replace:
+        TweetHashtag.objects.filter(tweet=tweet).delete()
+        TweetMention.objects.filter(tweet=tweet).delete()
+
+    tags = parse_hashtags(tweet.content)
+    if tags:
+        TweetHashtag.objects.bulk_create([TweetHashtag(tweet=tweet, tag=tag) for tag in tags])
+
+    usernames = parse_mentions(tweet.content)
+    if usernames:
+        user_ids = User.objects.filter(username__in=usernames).values_list('id', flat=True)
+        TweetMention.objects.bulk_create([TweetMention(tweet=tweet, user_id=user_id) for user_id in user_ids])
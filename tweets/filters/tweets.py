@@ -4,10 +4,23 @@ from django_filters.rest_framework import FilterSet
 import django_filters
 # Models
 from tweets.models import Tweet
+# Search
+from tweets.search import get_search_backend
+from tweets.entities import normalize_hashtag
 
 class TweetFilter(FilterSet):
-    content = django_filters.CharFilter(field_name='content', lookup_expr='contains')
+    content = django_filters.CharFilter(method='search_content')
     username = django_filters.CharFilter(field_name='user__username', lookup_expr='exact')
+    hashtag = django_filters.CharFilter(method='filter_hashtag')
+    mention = django_filters.CharFilter(field_name='mentions__user__username', lookup_expr='exact')
     class Meta:
         model = Tweet
-        fields = []
\ No newline at end of file
+        fields = []
+
+    def search_content(self, queryset, name, value):
+        """Full-text search, best matches first"""
+        return get_search_backend().search(queryset, value)
+
+
+    def filter_hashtag(self, queryset, name, value):
+        return queryset.filter(hashtags__tag=normalize_hashtag(value))
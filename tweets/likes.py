@@ -0,0 +1,85 @@
+"""Like / unlike
+
+``TweetLike`` is unique on ``(user, tweet)``, so liking is an
+``INSERT ... ON CONFLICT DO NOTHING`` and unliking a ``DELETE``: double
+taps are no-ops instead of duplicate rows, and nothing is read first.
+On PostgreSQL the write and the ``like_count`` update run as a single
+statement; elsewhere the counter is updated right after, in the same
+transaction. A tweet deleted meanwhile raises ``Http404`` and rolls the
+like back.
+"""
+
+# Django
+from django.db import connection, transaction
+from django.http import Http404
+from django.utils import timezone
+
+# Models
+from tweets.models import Tweet, TweetLike
+
+# Cache
+from tweets.cache import tweets_changed
+
+
+def _write_sql(action):
+    like_table = connection.ops.quote_name(TweetLike._meta.db_table)
+    if action == 'like':
+        return (
+            'INSERT INTO {} (user_id, tweet_id, created, modified) VALUES (%s, %s, %s, %s) '
+            'ON CONFLICT (user_id, tweet_id) DO NOTHING'.format(like_table)
+        )
+    return 'DELETE FROM {} WHERE user_id = %s AND tweet_id = %s'.format(like_table)
+
+
+def _params(action, user_id, tweet_id):
+    if action == 'like':
+        now = timezone.now()
+        return [user_id, tweet_id, now, now]
+    return [user_id, tweet_id]
+
+
+def _set_like(action, user_id, tweet_id):
+    tweet_table = connection.ops.quote_name(Tweet._meta.db_table)
+    params = _params(action, user_id, tweet_id)
+    sign = '+' if action == 'like' else '-'
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'WITH changed AS ({} RETURNING 1) '
+                'UPDATE {} SET like_count = like_count {} (SELECT COUNT(*) FROM changed) '
+                'WHERE id = %s RETURNING (SELECT COUNT(*) FROM changed), like_count'.format(
+                    _write_sql(action), tweet_table, sign
+                ),
+                params + [tweet_id]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise Http404
+            changed, like_count = row
+            return bool(changed), like_count
+
+        cursor.execute(_write_sql(action), params)
+        changed = cursor.rowcount > 0
+        if changed:
+            cursor.execute(
+                'UPDATE {0} SET like_count = like_count {1} 1 WHERE id = %s'.format(tweet_table, sign),
+                [tweet_id]
+            )
+        cursor.execute('SELECT like_count FROM {} WHERE id = %s'.format(tweet_table), [tweet_id])
+        row = cursor.fetchone()
+        if row is None:
+            raise Http404
+        return changed, row[0]
+
+
+def set_like(user, tweet, action):
+    """Apply ``action`` (``like`` / ``unlike``); returns ``(changed, like count)``
+
+    Raises ``Http404`` when the tweet no longer exists.
+    """
+    with transaction.atomic():
+        changed, like_count = _set_like(action, user.id, tweet.id)
+        if changed:
+            tweets_changed(tweet.id)
+    return changed, like_count
@@ -0,0 +1,41 @@
+"""Move old tweets to the archive tables"""
+
+# Python
+from datetime import timedelta
+
+# Django
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+# Archive
+from tweets.archive import TWEET_ARCHIVE_DAYS, archivable, archive_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive tweets (with their comments and likes) older than --days. '
+        'Archived tweets are still found by id (detail, batch, comments) and can be deleted by their owner, '
+        'but they are read-only and left out of lists, search and user tweets.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=TWEET_ARCHIVE_DAYS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            self.stdout.write('{} tweets would be archived'.format(archivable(cutoff).count()))
+            return
+
+        total = 0
+        # Retweets are archived before their parents, so keep going until
+        # a pass moves nothing
+        while True:
+            moved = archive_batch(cutoff, options['batch_size'])
+            if not moved:
+                break
+            total += moved
+            self.stdout.write('Archived {} tweets'.format(total))
+        self.stdout.write(self.style.SUCCESS('Archived {} tweets created before {}'.format(total, cutoff)))
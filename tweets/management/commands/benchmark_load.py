@@ -0,0 +1,109 @@
+"""Load test the read endpoints of a running deployment
+
+This is the WSGI baseline. An ASGI entry point and async read actions
+are still blocked: they need Django 4.1+ (async ORM) and an async-capable
+DRF, which this project does not run yet.
+"""
+
+# Python
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+
+# Models
+from tweets.models import Tweet
+
+ENDPOINTS = [
+    ('tweets.list', '/api/tweets/', False),
+    ('tweets.retrieve', '/api/tweets/{tweet}/', False),
+    ('tweets.feed', '/api/tweets/feed/', True),
+    ('tweets.comments', '/api/tweets/{tweet}/comment/', False),
+    ('users.tweets', '/api/users/{username}/tweets/', False),
+    ('users.information', '/api/users/{username}/information/', False),
+    ('users.seguidores', '/api/users/{username}/seguidores/', False),
+    ('users.siguiendo', '/api/users/{username}/siguiendo/', False),
+]
+
+
+def percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Send concurrent GET requests to the read endpoints of a running server '
+        'and report requests per second and p50/p99 latency; run it against each '
+        'deployment (e.g. sync vs threaded WSGI workers) with the same --concurrency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the deployment')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint')
+        parser.add_argument('--token', help='Access token, required for the feed')
+        parser.add_argument('--tweet', type=int, help='Tweet id (default: the latest tweet)')
+        parser.add_argument('--username', help='Username (default: author of the tweet)')
+        parser.add_argument('--endpoint', action='append', help='Only run these endpoints (repeatable)')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def fetch(self, url, headers):
+        start = time.perf_counter()
+        try:
+            with urlopen(Request(url, headers=headers), timeout=30) as response:
+                response.read()
+                ok = response.status == 200
+        except (HTTPError, URLError, OSError):
+            ok = False
+        return ok, time.perf_counter() - start
+
+    def run_endpoint(self, url, headers, options):
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            # Warm up connections and caches
+            list(pool.map(lambda _: self.fetch(url, headers), range(options['concurrency'])))
+            start = time.perf_counter()
+            results = list(pool.map(lambda _: self.fetch(url, headers), range(options['requests'])))
+            elapsed = time.perf_counter() - start
+
+        latencies = [latency for ok, latency in results]
+        return {
+            'requests': len(results),
+            'errors': sum(1 for ok, latency in results if not ok),
+            'rps': round(len(results) / elapsed, 1),
+            'p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        }
+
+    def handle(self, *args, **options):
+        tweet_id, username = options['tweet'], options['username']
+        if tweet_id is None or username is None:
+            tweet = Tweet.objects.select_related('user').order_by('-id').first()
+            if tweet is None:
+                raise CommandError('No tweets; pass --tweet and --username')
+            tweet_id = tweet_id or tweet.id
+            username = username or tweet.user.username
+
+        results = {}
+        for name, path, authenticated in ENDPOINTS:
+            if options['endpoint'] and name not in options['endpoint']:
+                continue
+            headers = {'Accept': 'application/json'}
+            if options['token']:
+                headers['Authorization'] = 'JWT {}'.format(options['token'])
+            elif authenticated:
+                continue
+            url = options['url'].rstrip('/') + path.format(tweet=tweet_id, username=username)
+            results[name] = self.run_endpoint(url, headers, options)
+            if not options['json']:
+                self.stdout.write('{:<20} {rps:>8} req/s  p50 {p50_ms:>8} ms  p99 {p99_ms:>8} ms  {errors} errors'.format(
+                    name, **results[name]
+                ))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
@@ -0,0 +1,35 @@
+"""Compare full-text search against the substring scan"""
+
+# Python
+import time
+
+# Django
+from django.core.management.base import BaseCommand
+
+# Models
+from tweets.models import Tweet
+
+# Search
+from tweets.search import ContainsSearchBackend, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Time tweet content searches with the configured backend and with LIKE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('terms', nargs='+')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=20, help='Rows fetched per search (one page)')
+
+    def handle(self, *args, **options):
+        backends = [get_search_backend(), ContainsSearchBackend()]
+        self.stdout.write('{} tweets'.format(Tweet.objects.count()))
+        for term in options['terms']:
+            for backend in backends:
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    rows = list(backend.search(Tweet.objects.all(), term)[:options['limit']])
+                elapsed = (time.perf_counter() - start) / options['repeat']
+                self.stdout.write('{:<24} {:<24} {:>4} rows {:>9.2f} ms'.format(
+                    term, type(backend).__name__, len(rows), elapsed * 1000
+                ))
@@ -0,0 +1,60 @@
+"""Replay a synthetic tweet stream through the trending engine"""
+
+# Python
+import random
+import time
+from collections import Counter
+from itertools import accumulate
+
+# Django
+from django.core.management.base import BaseCommand
+
+# Trending
+from tweets.trending import TrendingTopics
+
+
+class Command(BaseCommand):
+    help = 'Measure trending update throughput and top-k accuracy against exact counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tweets', type=int, default=200000)
+        parser.add_argument('--hashtags', type=int, default=5000, help='Vocabulary size')
+        parser.add_argument('--minutes', type=int, default=60, help='Length of the replayed stream')
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of hashtag popularity')
+        parser.add_argument('-k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = ['tag{}'.format(i) for i in range(options['hashtags'])]
+        cum_weights = list(accumulate(1 / (rank + 1) ** options['skew'] for rank in range(len(vocabulary))))
+        seconds = options['minutes'] * 60
+        start = time.time() - seconds
+
+        tweets = []
+        for i in range(options['tweets']):
+            tags = set(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(1, 3)))
+            timestamp = start + seconds * i / options['tweets']
+            tweets.append((' '.join('#' + tag for tag in tags), timestamp, tags))
+
+        # One extra minute so the oldest, partial bucket is still in the window
+        engine = TrendingTopics(window_minutes=options['minutes'] + 1)
+        exact = Counter()
+        began = time.perf_counter()
+        for content, timestamp, tags in tweets:
+            engine.record(content, timestamp)
+        elapsed = time.perf_counter() - began
+        for content, timestamp, tags in tweets:
+            exact.update(tags)
+
+        k = options['k']
+        top = engine.top(k)['hashtags']
+        expected = exact.most_common(k)
+        found = {tag for tag, count in top}
+        recall = len(found & {tag for tag, count in expected}) / k
+        error = sum(abs(count - exact[tag]) / exact[tag] for tag, count in top) / len(top)
+
+        self.stdout.write('{} tweets in {:.2f} s: {:,.0f} tweets/s'.format(len(tweets), elapsed, len(tweets) / elapsed))
+        self.stdout.write('top-{} recall {:.0%}, mean relative count error {:.2%}'.format(k, recall, error))
+        for (tag, count), (exact_tag, exact_count) in zip(top, expected):
+            self.stdout.write('  {:<10} {:>8}   {:<10} {:>8}'.format(tag, count, exact_tag, exact_count))
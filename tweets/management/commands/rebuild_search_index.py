@@ -0,0 +1,18 @@
+"""Rebuild the tweet full-text index"""
+
+# Django
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+# Search
+from tweets.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Create the full-text search structures if missing and re-index every tweet'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.install(connection)
+        backend.rebuild(connection)
+        self.stdout.write('Rebuilt the {} index'.format(type(backend).__name__))
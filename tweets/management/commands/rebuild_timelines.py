@@ -0,0 +1,31 @@
+"""Rebuild materialized home timelines"""
+
+# Django
+from django.core.management.base import BaseCommand
+
+# Models
+from tweets.models import Tweet
+from users.models import User
+
+# Timelines
+from tweets.timelines import get_timeline_store, TIMELINE_MAX_LENGTH
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the home timeline of every active user from the follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild these users')
+
+    def handle(self, *args, **options):
+        store = get_timeline_store()
+        users = User.objects.filter(is_active=True)
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        for user in users.iterator():
+            tweets = list(
+                Tweet.objects.all().feed(user).select_related(None).only('id', 'user_id')[:TIMELINE_MAX_LENGTH]
+            )
+            store.replace(user, tweets)
+            self.stdout.write('{}: {} tweets'.format(user.username, len(tweets)))
@@ -0,0 +1,18 @@
+"""Recompute denormalized engagement counters"""
+
+# Django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# Counters
+from tweets.counters import recount_tweet_counters, recount_user_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute like/retweet/comment counts on tweets and follower/following/tweet counts on users'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            tweets = recount_tweet_counters()
+            users = recount_user_counters()
+        self.stdout.write('Recounted {} tweets and {} users'.format(tweets, users))
@@ -0,0 +1,15 @@
+"""Trim materialized home timelines"""
+
+# Django
+from django.core.management.base import BaseCommand
+
+# Timelines
+from tweets.timelines import get_timeline_store, TIMELINE_MAX_LENGTH
+
+
+class Command(BaseCommand):
+    help = 'Drop the timeline entries beyond the newest TIMELINE_MAX_LENGTH of every user'
+
+    def handle(self, *args, **options):
+        dropped = get_timeline_store().trim()
+        self.stdout.write('Dropped {} timeline entries (keeping {} per user)'.format(dropped, TIMELINE_MAX_LENGTH))
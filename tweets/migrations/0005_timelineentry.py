@@ -0,0 +1,51 @@
+# Generated by Django 2.2 on 2026-10-18 10:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Q
+
+
+def seed_timelines(apps, schema_editor):
+    """Materialize the current feed of every user"""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Tweet = apps.get_model('tweets', 'Tweet')
+    TimelineEntry = apps.get_model('tweets', 'TimelineEntry')
+    max_length = getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+
+    for user in User.objects.all().iterator():
+        followed_ids = user.followings.values_list('id', flat=True)
+        tweet_ids = Tweet.objects.filter(
+            Q(user__id__in=followed_ids) | Q(user=user)
+        ).order_by('-created').values_list('id', flat=True)[:max_length]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner=user, tweet_id=tweet_id) for tweet_id in tweet_ids],
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tweets', '0004_auto_20200707_0653'),
+        ('users', '0002_auto_20200706_0045'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='Date time on which the objec was created', verbose_name='created_at')),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='tweets.Tweet')),
+            ],
+            options={
+                'ordering': ['-created'],
+                'unique_together': {('owner', 'tweet')},
+            },
+        ),
+        migrations.RunPython(seed_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 2.2 on 2026-10-18 10:32
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+def _count(model, field):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        total=Count('pk')
+    ).values('total')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def count_tweet_engagement(apps, schema_editor):
+    Tweet = apps.get_model('tweets', 'Tweet')
+    TweetLike = apps.get_model('tweets', 'TweetLike')
+    Comment = apps.get_model('tweets', 'Comment')
+    Tweet.objects.update(
+        like_count=_count(TweetLike, 'tweet'),
+        retweet_count=_count(Tweet, 'parent'),
+        comment_count=_count(Comment, 'tweet')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweets', '0005_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tweet',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tweet',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tweet',
+            name='retweet_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_tweet_engagement, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2 on 2026-10-18 11:05
+
+from django.db import migrations
+
+SEARCH_CONFIG = 'pg_catalog.spanish'
+
+
+def create_search_vector(apps, schema_editor):
+    """PostgreSQL only: other databases are handled by tweets.search"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE tweets_tweet ADD COLUMN search_vector tsvector')
+    schema_editor.execute(
+        "UPDATE tweets_tweet SET search_vector = to_tsvector('{}', coalesce(content, ''))".format(SEARCH_CONFIG)
+    )
+    schema_editor.execute(
+        'CREATE INDEX tweets_tweet_search_vector_idx ON tweets_tweet USING GIN (search_vector)'
+    )
+    schema_editor.execute(
+        'CREATE TRIGGER tweets_tweet_search_vector_update '
+        'BEFORE INSERT OR UPDATE OF content ON tweets_tweet FOR EACH ROW '
+        "EXECUTE PROCEDURE tsvector_update_trigger(search_vector, '{}', content)".format(SEARCH_CONFIG)
+    )
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP TRIGGER IF EXISTS tweets_tweet_search_vector_update ON tweets_tweet')
+    schema_editor.execute('ALTER TABLE tweets_tweet DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweets', '0006_tweet_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+HASHTAG_RE = re.compile(r'(?<![\w#])#(\w+)', re.UNICODE)
+MENTION_RE = re.compile(r'(?<![\w@])@([\w.+-]+)', re.UNICODE)
+
+
+def index_existing_tweets(apps, schema_editor):
+    Tweet = apps.get_model('tweets', 'Tweet')
+    TweetHashtag = apps.get_model('tweets', 'TweetHashtag')
+    TweetMention = apps.get_model('tweets', 'TweetMention')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    user_ids = dict(User.objects.values_list('username', 'id'))
+
+    hashtags = []
+    mentions = []
+    for tweet_id, content in Tweet.objects.exclude(content=None).values_list('id', 'content').iterator():
+        for tag in {tag.lower() for tag in HASHTAG_RE.findall(content)}:
+            hashtags.append(TweetHashtag(tweet_id=tweet_id, tag=tag))
+        for username in {username.rstrip('.') for username in MENTION_RE.findall(content)}:
+            if username in user_ids:
+                mentions.append(TweetMention(tweet_id=tweet_id, user_id=user_ids[username]))
+    TweetHashtag.objects.bulk_create(hashtags, batch_size=1000)
+    TweetMention.objects.bulk_create(mentions, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tweets', '0007_tweet_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TweetMention',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='Date time on which the objec was created', verbose_name='created_at')),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='tweets.Tweet')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+                'unique_together': {('user', 'tweet')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TweetHashtag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='Date time on which the objec was created', verbose_name='created_at')),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('tag', models.CharField(max_length=250)),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hashtags', to='tweets.Tweet')),
+            ],
+            options={
+                'ordering': ['-created'],
+                'unique_together': {('tag', 'tweet')},
+            },
+        ),
+        migrations.RunPython(index_existing_tweets, migrations.RunPython.noop),
+    ]
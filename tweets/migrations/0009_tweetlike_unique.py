@@ -0,0 +1,46 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    """Keep the oldest like of each (user, tweet) and recount the affected tweets"""
+    Tweet = apps.get_model('tweets', 'Tweet')
+    TweetLike = apps.get_model('tweets', 'TweetLike')
+
+    duplicates = TweetLike.objects.values('user_id', 'tweet_id').annotate(
+        keep=Min('id'), total=Count('id')
+    ).filter(total__gt=1).order_by()
+    tweet_ids = set()
+    for row in duplicates.iterator():
+        TweetLike.objects.filter(
+            user_id=row['user_id'], tweet_id=row['tweet_id']
+        ).exclude(id=row['keep']).delete()
+        tweet_ids.add(row['tweet_id'])
+
+    if tweet_ids:
+        counts = TweetLike.objects.filter(tweet=OuterRef('pk')).order_by().values('tweet').annotate(
+            total=Count('pk')
+        ).values('total')
+        Tweet.objects.filter(id__in=tweet_ids).update(
+            like_count=Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tweets', '0008_tweet_entities'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='tweetlike',
+            unique_together={('user', 'tweet')},
+        ),
+    ]
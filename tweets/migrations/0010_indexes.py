@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweets', '0009_tweetlike_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['tweet', '-created'], name='comment_tweet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tweet',
+            index=models.Index(fields=['user', '-created'], name='tweet_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tweetlike',
+            index=models.Index(fields=['tweet', 'user'], name='tweetlike_tweet_user_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweets', '0010_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tweet',
+            name='image_renditions',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
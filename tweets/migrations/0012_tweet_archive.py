@@ -0,0 +1,70 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tweets', '0011_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTweet',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('parent_id', models.IntegerField(blank=True, null=True)),
+                ('content', models.TextField(blank=True, null=True)),
+                ('image', models.FileField(blank=True, null=True, upload_to='images/')),
+                ('image_renditions', models.TextField(blank=True, default='')),
+                ('like_count', models.PositiveIntegerField(default=0)),
+                ('retweet_count', models.PositiveIntegerField(default=0)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('created', models.DateTimeField()),
+                ('modified', models.DateTimeField()),
+                ('archived', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_tweets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('tweet_id', models.IntegerField(db_index=True)),
+                ('content', models.TextField()),
+                ('created', models.DateTimeField()),
+                ('modified', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_comments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTweetLike',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tweet_id', models.IntegerField()),
+                ('created', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_likes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'tweet_id')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedtweet',
+            index=models.Index(fields=['user', '-created'], name='archivedtweet_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtweet',
+            index=models.Index(fields=['parent_id'], name='archivedtweet_parent_idx'),
+        ),
+    ]
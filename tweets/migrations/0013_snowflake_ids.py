@@ -0,0 +1,103 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:06
+
+from django.db import migrations, models
+import utils.ids
+
+
+def drop_sequences(apps, schema_editor):
+    """Ids now come from utils.ids: drop the serial defaults (PostgreSQL)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in ['tweets_tweet', 'tweets_comment']:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+            sequence = cursor.fetchone()[0]
+        schema_editor.execute('ALTER TABLE {} ALTER COLUMN id DROP DEFAULT'.format(table))
+        if sequence:
+            schema_editor.execute('DROP SEQUENCE IF EXISTS {}'.format(sequence))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweets', '0012_tweet_archive'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='archivedcomment',
+            options={'ordering': ['-id']},
+        ),
+        migrations.AlterModelOptions(
+            name='archivedtweet',
+            options={'ordering': ['-id']},
+        ),
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ['-id']},
+        ),
+        migrations.AlterModelOptions(
+            name='tweet',
+            options={'ordering': ['-id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='archivedtweet',
+            name='archivedtweet_user_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_tweet_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tweet',
+            name='tweet_user_created_idx',
+        ),
+        migrations.AlterField(
+            model_name='archivedcomment',
+            name='id',
+            field=models.BigIntegerField(primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='archivedcomment',
+            name='tweet_id',
+            field=models.BigIntegerField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='archivedtweet',
+            name='id',
+            field=models.BigIntegerField(primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='archivedtweet',
+            name='parent_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='archivedtweetlike',
+            name='tweet_id',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=models.BigIntegerField(default=utils.ids.next_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='tweet',
+            name='id',
+            field=models.BigIntegerField(default=utils.ids.next_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtweet',
+            index=models.Index(fields=['user', '-id'], name='archivedtweet_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['tweet', '-id'], name='comment_tweet_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tweet',
+            index=models.Index(fields=['user', '-id'], name='tweet_user_id_idx'),
+        ),
+        migrations.RunPython(drop_sequences, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,7 @@ from django.db.models import Q
 
 # Utils
 from utils.models import TweetmeBaseModel
+from utils.ids import next_id
 
 User = settings.AUTH_USER_MODEL
 
@@ -15,7 +16,7 @@ class TweetQuerySet(models.QuerySet):
             followed_user_id = user.followings.values_list("id", flat=True)
         return self.filter(
             Q(user__id__in=followed_user_id) | Q(user=user)
-        ).select_related('user').distinct().order_by('-created')
+        ).select_related('user').distinct().order_by('-id')
 
 
 class TweetManager(models.Manager):
@@ -27,30 +28,142 @@ class TweetLike(TweetmeBaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     tweet = models.ForeignKey('Tweet', on_delete=models.CASCADE)
 
+    class Meta(TweetmeBaseModel.Meta):
+        unique_together = ['user', 'tweet']
+        indexes = [
+            models.Index(fields=['tweet', 'user'], name='tweetlike_tweet_user_idx'),
+        ]
+
 
 class Tweet(TweetmeBaseModel):
+    # Time-ordered, see utils.ids: ``-id`` is newest first
+    id = models.BigIntegerField(primary_key=True, default=next_id, editable=False)
     parent = models.ForeignKey('self', null=True, on_delete=models.SET_NULL)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tweets')
     content =  models.TextField(blank=True, null=True)
     image = models.FileField(upload_to='images/', blank=True, null=True)
+    # JSON list of resized copies of ``image``, see utils.images
+    image_renditions = models.TextField(blank=True, default='')
     likes = models.ManyToManyField(User, related_name='tweet_user', through=TweetLike, blank=True)
-    
+
+    # Denormalized counters, see tweets.counters
+    like_count = models.PositiveIntegerField(default=0)
+    retweet_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
     objects = TweetManager()
 
     class  Meta: 
-        ordering = ['-created']
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['user', '-id'], name='tweet_user_id_idx'),
+        ]
 
     @property
     def is_retweet(self):
-        return self.parent != None
+        return self.parent_id is not None
 
     def __str__(self):
         return self.content
 
 class Comment(TweetmeBaseModel):
+    id = models.BigIntegerField(primary_key=True, default=next_id, editable=False)
     user = models.ForeignKey(User, related_name='comentarios', on_delete=models.CASCADE)
     tweet = models.ForeignKey(Tweet, related_name='comentario', on_delete=models.CASCADE)
     content = models.TextField()
 
     class  Meta: 
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['tweet', '-id'], name='comment_tweet_id_idx'),
+        ]
+
+
+class TimelineEntry(TweetmeBaseModel):
+    """Materialized home timeline row: ``tweet`` is in ``owner``'s feed"""
+    owner = models.ForeignKey(User, related_name='timeline', on_delete=models.CASCADE)
+    tweet = models.ForeignKey(Tweet, related_name='timeline_entries', on_delete=models.CASCADE)
+
+    class Meta:
+        ordering = ['-created']
+        unique_together = ['owner', 'tweet']
+
+
+class TweetHashtag(TweetmeBaseModel):
+    """``#tag`` used in ``tweet``, lowercased and without the ``#``"""
+    tweet = models.ForeignKey(Tweet, related_name='hashtags', on_delete=models.CASCADE)
+    tag = models.CharField(max_length=250)
+
+    class Meta:
+        ordering = ['-created']
+        unique_together = ['tag', 'tweet']
+
+
+class TweetMention(TweetmeBaseModel):
+    """``@user`` mentioned in ``tweet``"""
+    tweet = models.ForeignKey(Tweet, related_name='mentions', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='mentions', on_delete=models.CASCADE)
+
+    class Meta:
         ordering = ['-created']
+        unique_together = ['user', 'tweet']
+
+
+class ArchivedTweet(models.Model):
+    """Tweet moved out of ``Tweet`` by ``manage.py archive_tweets``.
+
+    Ids, timestamps and counters are kept; ``parent_id`` is a plain column
+    since the parent may be live or archived.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    parent_id = models.BigIntegerField(null=True, blank=True)
+    user = models.ForeignKey(User, related_name='archived_tweets', on_delete=models.CASCADE)
+    content = models.TextField(blank=True, null=True)
+    image = models.FileField(upload_to='images/', blank=True, null=True)
+    image_renditions = models.TextField(blank=True, default='')
+
+    like_count = models.PositiveIntegerField(default=0)
+    retweet_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    created = models.DateTimeField()
+    modified = models.DateTimeField()
+    archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['user', '-id'], name='archivedtweet_user_idx'),
+            models.Index(fields=['parent_id'], name='archivedtweet_parent_idx'),
+        ]
+
+    def as_tweet(self):
+        """Unsaved ``Tweet`` with the archived values, for serializers"""
+        tweet = Tweet(**{field.attname: getattr(self, field.attname) for field in Tweet._meta.concrete_fields})
+        tweet._state.adding = False
+        # Its likes are ArchivedTweetLike rows, see tweets.viewer
+        tweet.archived = True
+        return tweet
+
+
+class ArchivedComment(models.Model):
+    """Comment of an archived tweet"""
+    id = models.BigIntegerField(primary_key=True)
+    tweet_id = models.BigIntegerField(db_index=True)
+    user = models.ForeignKey(User, related_name='archived_comments', on_delete=models.CASCADE)
+    content = models.TextField()
+    created = models.DateTimeField()
+    modified = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-id']
+
+
+class ArchivedTweetLike(models.Model):
+    """Like of an archived tweet"""
+    user = models.ForeignKey(User, related_name='archived_likes', on_delete=models.CASCADE)
+    tweet_id = models.BigIntegerField()
+    created = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'tweet_id']
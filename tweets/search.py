@@ -0,0 +1,161 @@
+"""Tweet full-text search
+
+``TweetFilter.content`` routes through a search backend instead of a
+``LIKE '%term%'`` scan:
+
+- ``PostgresSearchBackend``: ``tsvector`` column with a GIN index, kept up
+  to date by a trigger (see migration 0007), ranked with ``ts_rank``.
+- ``SqliteSearchBackend``: FTS5 external-content table kept up to date by
+  triggers, ranked with ``bm25``. Installed after every ``migrate``,
+  because SQLite rebuilds tables on ``ALTER`` and drops their triggers.
+- ``ContainsSearchBackend``: the old substring match, for other databases.
+
+Matches are annotated with ``search_rank`` and ordered best first.
+"""
+
+# Python
+import re
+
+# Django
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Models
+from tweets.models import Tweet
+
+SEARCH_CONFIG = 'pg_catalog.spanish'
+
+
+class BaseSearchBackend:
+    """Search backend interface"""
+
+    def search(self, queryset, query):
+        """Filter tweets of ``queryset`` matching ``query``, best first"""
+        raise NotImplementedError
+
+    def install(self, connection):
+        """Create the index structures, if the backend keeps any"""
+
+    def rebuild(self, connection):
+        """Re-index every tweet"""
+
+
+class ContainsSearchBackend(BaseSearchBackend):
+    """Substring match, no index"""
+
+    def search(self, queryset, query):
+        return queryset.filter(content__contains=query)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """``tsvector`` + GIN index"""
+
+    def search(self, queryset, query):
+        table = Tweet._meta.db_table
+        tsquery = "plainto_tsquery('{}', %s)".format(SEARCH_CONFIG)
+        return queryset.extra(
+            where=['"{}"."search_vector" @@ {}'.format(table, tsquery)],
+            params=[query]
+        ).annotate(
+            search_rank=RawSQL(
+                'ts_rank("{}"."search_vector", {})'.format(table, tsquery),
+                (query,),
+                output_field=FloatField()
+            )
+        ).order_by('-search_rank', '-id')
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE {} SET search_vector = to_tsvector('{}', coalesce(content, ''))".format(
+                    Tweet._meta.db_table, SEARCH_CONFIG
+                )
+            )
+
+
+class SqliteSearchBackend(BaseSearchBackend):
+    """FTS5 external-content table over ``content``"""
+
+    fts_table = 'tweets_tweet_fts'
+    token_re = re.compile(r'\w+', re.UNICODE)
+
+    def match_expression(self, query):
+        """Quote every word so user input is never parsed as FTS5 syntax"""
+        return ' '.join('"{}"'.format(token) for token in self.token_re.findall(query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        table = Tweet._meta.db_table
+        # Not ``id__in=RawSQL(...)``: SQLite reads ``IN ((SELECT ...))`` as a scalar subquery
+        return queryset.extra(
+            where=['"{0}"."id" IN (SELECT rowid FROM {1} WHERE {1} MATCH %s)'.format(table, self.fts_table)],
+            params=[match]
+        ).annotate(
+            search_rank=RawSQL(
+                'SELECT -bm25({0}) FROM {0} WHERE {0} MATCH %s AND rowid = "{1}"."id"'.format(
+                    self.fts_table, table
+                ),
+                (match,),
+                output_field=FloatField()
+            )
+        ).order_by('-search_rank', '-id')
+
+    def triggers(self):
+        table = Tweet._meta.db_table
+        insert = 'INSERT INTO {0}(rowid, content) VALUES (new.id, new.content);'.format(self.fts_table)
+        delete = "INSERT INTO {0}({0}, rowid, content) VALUES ('delete', old.id, old.content);".format(
+            self.fts_table
+        )
+        return {
+            '{}_insert'.format(self.fts_table): 'AFTER INSERT ON {} BEGIN {} END'.format(table, insert),
+            '{}_delete'.format(self.fts_table): 'AFTER DELETE ON {} BEGIN {} END'.format(table, delete),
+            '{}_update'.format(self.fts_table): 'AFTER UPDATE OF content ON {} BEGIN {} {} END'.format(
+                table, delete, insert
+            ),
+        }
+
+    def install(self, connection):
+        triggers = self.triggers()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN ({})".format(
+                    ', '.join(['%s'] * len(triggers))
+                ),
+                list(triggers)
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if len(existing) == len(triggers):
+                return
+
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5("
+                "content, content='{}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')".format(
+                    self.fts_table, Tweet._meta.db_table
+                )
+            )
+            for name, body in triggers.items():
+                cursor.execute('CREATE TRIGGER IF NOT EXISTS {} {}'.format(name, body))
+        self.rebuild(connection)
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO {0}({0}) VALUES ('rebuild')".format(self.fts_table))
+
+
+VENDOR_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SqliteSearchBackend,
+}
+
+
+def get_search_backend(vendor=None):
+    """Return the backend in ``settings.TWEET_SEARCH_BACKEND``, or the one for the database"""
+    path = getattr(settings, 'TWEET_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return VENDOR_BACKENDS.get(vendor or connection.vendor, ContainsSearchBackend)()
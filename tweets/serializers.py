@@ -1,20 +1,53 @@
 """Tweets serializers"""
 
+# Python
+from collections import OrderedDict
+
 # Conf
 from django.conf import settings
 
+# Django
+from django.db import transaction
+
 # Django Rest Framework
 from rest_framework import serializers
 from rest_framework.permissions import IsAuthenticated
 
 # Models
-from .models import Tweet, TweetLike, Comment
+from .models import Tweet, Comment
 
 # Serializers
-from users.serializers import UserProfileSerializer
+from users.serializers import AuthorField
+
+# Jobs
+from tweets.tasks import fan_out_tweet
+from utils.images import process_image
+
+# Counters
+from tweets.counters import incr_tweet_counter, incr_user_counter
+
+# Likes
+from tweets.likes import set_like
+
+# Hashtags and mentions
+from tweets.entities import index_entities
+
+# Bulk engagement
+from tweets.engagement import apply_engagement
+
+# Trending
+from tweets.trending import TRENDING_WINDOW_MINUTES
+
+# Viewer state
+from tweets.viewer import ViewerState, PageListSerializer
+
+# Utils
+from utils.serializers import ImageUploadField, RenditionsField
 
 MAX_TWEET_LENGTH = settings.MAX_TWEET_LENGTH
 TWEET_ACTION_OPTIONS = settings.TWEET_ACTION_OPTIONS
+MAX_ENGAGEMENT_OPERATIONS = 100
+MAX_BATCH_TWEETS = 200
 
 class TweetActionSerializer(serializers.Serializer):
     action = serializers.CharField()
@@ -26,33 +59,20 @@ class TweetActionSerializer(serializers.Serializer):
             raise serializers.ValidationError('This is not a valid option')
         return value
     
-    def validate(self, data):
-        tweet = self.context['tweet']
-        user = data['user']
-        if data['action'] == 'like':
-            if tweet.likes.filter(id=user.id).exists():
-                raise serializers.ValidationError('Ya te gusta este tweet')
-
-        if data['action'] == 'unlike':
-            if not tweet.likes.filter(id=user.id).exists():
-                raise serializers.ValidationError('Aun no te gusta este tweet')
-        return data
-    
     def create(self, data):
-        user = data['user']
+        """Like or unlike; repeating an action is a no-op reported as ``changed: False``"""
         tweet = self.context['tweet']
-        if data['action'] == 'like':
-            TweetLike.objects.create(user=user, tweet=tweet)
-        if data['action'] == 'unlike':
-            tweelike = TweetLike.objects.filter(user=user, tweet=tweet)
-            tweelike.delete()
-        return data
+        changed, like_count = False, tweet.like_count
+        if data['action'] in ['like', 'unlike']:
+            changed, like_count = set_like(data['user'], tweet, data['action'])
+        return {'action': data['action'], 'changed': changed, 'likes': like_count}
 
 class TweetCreateSerializer(serializers.ModelSerializer):
+    image = ImageUploadField(required=False, allow_null=True)
 
     class Meta:
         model = Tweet
-        fields = ['content']
+        fields = ['content', 'image']
 
     def validate_content(self, value):
         if len(value) > 250:
@@ -61,50 +81,64 @@ class TweetCreateSerializer(serializers.ModelSerializer):
 
     def create(self, data):
         user = self.context['user']
-        tweet = Tweet.objects.create(content=data['content'], user=user)
+        with transaction.atomic():
+            tweet = Tweet.objects.create(content=data.get('content'), image=data.get('image'), user=user)
+            incr_user_counter(user.id, 'tweet_count')
+            index_entities(tweet)
+            fan_out_tweet.delay(tweet.id)
+            if tweet.image:
+                process_image.delay('tweets.Tweet', tweet.id, 'image')
+        return tweet
+
+    def update(self, instance, data):
+        with transaction.atomic():
+            tweet = super(TweetCreateSerializer, self).update(instance, data)
+            index_entities(tweet, replace=True)
+            if data.get('image'):
+                process_image.delay('tweets.Tweet', tweet.id, 'image')
         return tweet
 
 class TweetParentSerializer(serializers.ModelSerializer):
-    user = UserProfileSerializer(read_only=True)
-    likes = serializers.SerializerMethodField(read_only=True)
+    id_str = serializers.CharField(source='id', read_only=True)
+    user = AuthorField(source='user_id')
+    likes = serializers.IntegerField(source='like_count', read_only=True)
     user_like_it = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Tweet
-        fields = ['id', 'content', 'likes', 'user_like_it', 'user']
-    
-    def get_likes(self, obj):
-        return obj.likes.count()
+        fields = ['id', 'id_str', 'content', 'likes', 'user_like_it', 'user']
 
     def get_user_like_it(self, obj):
-        user = self.context['user']
-        if not user.is_anonymous:
-            return obj.likes.filter(id=user.id).exists()
-        return False
+        return ViewerState.from_context(self.context).likes(obj)
 
 class BasicTweetSerializer(serializers.ModelSerializer):
-    likes = serializers.SerializerMethodField(read_only=True)
+    # Ids are above 2 ** 53: JavaScript clients must use the string
+    id_str = serializers.CharField(source='id', read_only=True)
+    likes = serializers.IntegerField(source='like_count', read_only=True)
+    retweets = serializers.IntegerField(source='retweet_count', read_only=True)
+    comments = serializers.IntegerField(source='comment_count', read_only=True)
     parent = TweetParentSerializer(read_only=True)
     user_like_it = serializers.SerializerMethodField(read_only=True)
+    image_renditions = RenditionsField('image')
 
     class Meta:
         model = Tweet
-        fields = ['id', 'content', 'likes', 'is_retweet', 'parent', 'created', 'user_like_it']
-    
-    def get_likes(self, obj):
-        return obj.likes.count()
+        fields = [
+            'id', 'id_str', 'content', 'image', 'image_renditions', 'likes', 'retweets', 'comments',
+            'is_retweet', 'parent', 'created', 'user_like_it'
+        ]
+        list_serializer_class = PageListSerializer
+        select_related = ['parent']
     
     def get_user_like_it(self, obj):
-        user = self.context['user']
-        if not user.is_anonymous:
-            return obj.likes.filter(id=user.id).exists()
-        return False
+        return ViewerState.from_context(self.context).likes(obj)
 
 class TweetSerializer(BasicTweetSerializer):
-    user = UserProfileSerializer(read_only=True)
+    user = AuthorField(source='user_id')
 
     class Meta(BasicTweetSerializer.Meta):
         fields = BasicTweetSerializer.Meta.fields + ['user']
+        compiled = True
     
 
 
@@ -121,9 +155,60 @@ class RetweetSerializers(serializers.Serializer):
         tweet = self.context['tweet']
         user = data['user']
 
-        newTweet = Tweet.objects.create(user=user, content=data['content'], parent=tweet)
+        with transaction.atomic():
+            newTweet = Tweet.objects.create(user=user, content=data['content'], parent=tweet)
+            incr_tweet_counter(tweet.id, 'retweet_count')
+            incr_user_counter(user.id, 'tweet_count')
+            index_entities(newTweet)
+            fan_out_tweet.delay(newTweet.id)
         return newTweet
 
+class EngagementOperationSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=['like', 'unlike', 'follow', 'unfollow'])
+    tweet = serializers.IntegerField(required=False)
+    user = serializers.CharField(required=False)
+
+    def validate(self, data):
+        if data['action'] in ['like', 'unlike'] and 'tweet' not in data:
+            raise serializers.ValidationError({'tweet': 'Este campo es requerido'})
+        if data['action'] in ['follow', 'unfollow'] and 'user' not in data:
+            raise serializers.ValidationError({'user': 'Este campo es requerido'})
+        return data
+
+class EngagementSerializer(serializers.Serializer):
+    operations = EngagementOperationSerializer(many=True, allow_empty=False)
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
+    def validate_operations(self, value):
+        if len(value) > MAX_ENGAGEMENT_OPERATIONS:
+            raise serializers.ValidationError(
+                'Máximo {} operaciones por petición'.format(MAX_ENGAGEMENT_OPERATIONS)
+            )
+        return value
+
+    def create(self, data):
+        return {'results': apply_engagement(data['user'], data['operations'])}
+
+class TweetBatchQuerySerializer(serializers.Serializer):
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        """Comma separated ids, duplicates dropped, order kept"""
+        try:
+            ids = [int(tweet_id) for tweet_id in value.split(',') if tweet_id.strip()]
+        except ValueError:
+            raise serializers.ValidationError('Los ids deben ser números separados por comas')
+        ids = list(OrderedDict.fromkeys(ids))
+        if not ids:
+            raise serializers.ValidationError('Este campo es requerido')
+        if len(ids) > MAX_BATCH_TWEETS:
+            raise serializers.ValidationError('Máximo {} tweets por petición'.format(MAX_BATCH_TWEETS))
+        return ids
+
+class TrendingQuerySerializer(serializers.Serializer):
+    minutes = serializers.IntegerField(min_value=1, max_value=TRENDING_WINDOW_MINUTES, default=TRENDING_WINDOW_MINUTES)
+    k = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
 class CommentCreateSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     content = serializers.CharField(
@@ -146,17 +231,22 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         context = self.context        
         tweet = context['tweet']
         user = data['user']
-        Comment.objects.create(
-            content=data['content'],
-            user=user,
-            tweet=tweet
-        )
+        with transaction.atomic():
+            Comment.objects.create(
+                content=data['content'],
+                user=user,
+                tweet=tweet
+            )
+            incr_tweet_counter(tweet.id, 'comment_count')
 
         return data
 
 class CommentSerializer(serializers.ModelSerializer):
-    user = UserProfileSerializer(read_only=True)
+    id_str = serializers.CharField(source='id', read_only=True)
+    user = AuthorField(source='user_id')
     class Meta:
         model = Comment
-        fields = ['id', 'content', 'user', 'created']
+        fields = ['id', 'id_str', 'content', 'user', 'created']
+        list_serializer_class = PageListSerializer
+        compiled = True
         
\ No newline at end of file
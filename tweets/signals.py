@@ -0,0 +1,38 @@
+"""Tweets signals"""
+
+# Django
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# Models
+from tweets.models import Tweet
+
+# Cache
+from tweets.cache import tweets_changed
+
+# Search
+from tweets.search import get_search_backend
+
+# Trending
+from tweets.trending import trending_topics
+
+
+@receiver(post_save, sender=Tweet)
+@receiver(post_delete, sender=Tweet)
+def invalidate_tweet_responses(sender, instance, **kwargs):
+    """Tweet created, edited or deleted"""
+    tweets_changed(instance.id)
+
+
+@receiver(post_save, sender=Tweet)
+def count_trending(sender, instance, created, **kwargs):
+    """Count new tweets in this process as soon as they are committed"""
+    if created:
+        transaction.on_commit(lambda: trending_topics.record_tweet(instance))
+
+
+def install_search_index(sender, using, **kwargs):
+    """Create the full-text index structures after ``migrate``"""
+    connection = connections[using]
+    get_search_backend(connection.vendor).install(connection)
@@ -0,0 +1,32 @@
+"""Tweets background jobs"""
+
+# Models
+from tweets.models import Tweet
+from users.models import User
+
+# Timelines
+from tweets.timelines import get_timeline_store
+
+# Jobs
+from jobs.queue import job
+
+
+@job()
+def fan_out_tweet(tweet_id):
+    """Push a new tweet to the timelines of its author and followers"""
+    tweet = Tweet.objects.filter(id=tweet_id).only('id', 'user_id').first()
+    if tweet is not None:
+        get_timeline_store().fan_out(tweet)
+
+
+@job()
+def update_timeline(owner_id, author_id, follow):
+    """Backfill (``follow``) or purge ``author``'s tweets in ``owner``'s timeline"""
+    users = User.objects.in_bulk([owner_id, author_id])
+    if owner_id not in users or author_id not in users:
+        return
+    store = get_timeline_store()
+    if follow:
+        store.follow(users[owner_id], users[author_id])
+    else:
+        store.unfollow(users[owner_id], users[author_id])
@@ -1,3 +1,1189 @@
-from django.test import TestCase
+"""Tweets tests"""
 
-# Create your tests here.
+# Python
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+# Pillow
+from PIL import Image
+
+# Django
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import Http404
+from django.utils import timezone
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+# Django Rest Framework
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+# Models
+from tweets.models import (
+    Tweet, TweetLike, Comment, TimelineEntry, TweetHashtag, ArchivedTweet, ArchivedComment, ArchivedTweetLike
+)
+
+# Cache
+from tweets.cache import bump_versions, get_version_cache, tweets_changed, tweet_cache, GLOBAL_VERSION_KEY
+from tweets.trending import trending_topics
+from tweets import engagement
+from tweets.likes import set_like
+from tweets.tasks import fan_out_tweet, update_timeline
+from tweets.timelines import DatabaseTimelineStore
+from tweets.views import TweetViewSet
+from users.models import User, Profile, FollowRelation
+from users.serializers import FollowUnfollowUserSerializer
+
+# Utils
+from utils import ids as ids_module
+from utils.ids import SnowflakeGenerator, datetime_to_id, id_to_datetime, next_id
+from utils.images import process_image
+from utils.instrumentation import request_serialize_duration, DURATION_BUCKETS, METRICS
+from utils.pagination import KeysetPagination
+from utils.renderers import FastJSONRenderer
+from rest_framework.renderers import JSONRenderer
+from utils.routers import ReplicaRouter, replica_health, routing, stick_to_primary
+
+
+def create_user(username):
+    user = User.objects.create_user(
+        username,
+        '{}@tweetme.com'.format(username),
+        'Nombre',
+        'Paterno',
+        'password123'
+    )
+    Profile.objects.create(user=user)
+    return user
+
+
+def clear_caches():
+    # Version tokens and markers live in their own alias
+    for alias_cache in caches.all():
+        alias_cache.clear()
+
+
+def api_client(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+class QueryPlanMixin:
+    """Fail when a hot query is planned as a full table scan.
+
+    On PostgreSQL sequential scans (and sorts, for ``ordered``) are
+    disabled while planning, so they only show up when no index can serve
+    the query, whatever the size of the test tables.
+    """
+
+    def query_plan(self, queryset, ordered):
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            if ordered:
+                cursor.execute('SET LOCAL enable_sort = off')
+            try:
+                return queryset.explain()
+            finally:
+                cursor.execute('RESET enable_seqscan')
+                cursor.execute('RESET enable_sort')
+
+    def assertIndexScan(self, queryset, ordered=False):
+        """``ordered``: the index must also return rows in ``ORDER BY`` order"""
+        plan = self.query_plan(queryset, ordered)
+        # SQLite reports index lookups as SEARCH, full table or index scans as SCAN
+        patterns = [r'Seq Scan', r'\bSCAN (?!CONSTANT)']
+        if ordered:
+            patterns += [r'\bSort\b', r'TEMP B-TREE']
+        for pattern in patterns:
+            for line in plan.splitlines():
+                if re.search(pattern, line):
+                    self.fail('Query is not served by an index:\n{}\n{}'.format(queryset.query, plan))
+
+
+class TweetQueryCountTestCase(TestCase):
+    """Tweet list endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        self.alice_client = api_client(self.alice)
+        self.bob_client = api_client(self.bob)
+
+        self.bob_client.post('/api/users/alice/follow_unfollow/', {'action': 'follow'})
+        for i in range(10):
+            self.alice_client.post('/api/tweets/', {'content': 'tweet {}'.format(i)})
+        self.tweet = Tweet.objects.filter(user=self.alice).first()
+        for tweet in Tweet.objects.filter(user=self.alice)[:3]:
+            self.bob_client.post('/api/tweets/{}/like/'.format(tweet.id), {'action': 'like'})
+            self.bob_client.post('/api/tweets/{}/retweet/'.format(tweet.id), {'content': 'rt'})
+        for i in range(6):
+            self.bob_client.post('/api/tweets/{}/comment/'.format(self.tweet.id), {'content': 'c{}'.format(i)})
+        # Counts below are for cold caches
+        clear_caches()
+
+    def assertQueries(self, num, client, url):
+        with self.assertNumQueries(num):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_feed(self):
+        # COUNT, page, tweet cache misses, author cache misses, viewer likes
+        response = self.assertQueries(5, self.bob_client, '/api/tweets/feed/')
+        self.assertTrue(any(tweet['is_retweet'] for tweet in response.data['results']))
+        # authors are cached now
+        self.assertQueries(4, self.bob_client, '/api/tweets/feed/?page=2')
+        # page, viewer likes
+        self.assertQueries(2, self.bob_client, '/api/tweets/feed/?cursor=')
+
+    def test_list(self):
+        # COUNT, page, author cache misses
+        self.assertQueries(3, api_client(), '/api/tweets/')
+        # COUNT, page, viewer likes
+        self.assertQueries(3, self.bob_client, '/api/tweets/')
+        self.assertQueries(3, self.bob_client, '/api/tweets/?page=3')
+
+    def test_retrieve(self):
+        # tweet, author, viewer likes
+        self.assertQueries(3, self.bob_client, '/api/tweets/{}/'.format(self.tweet.id))
+
+    def test_comments(self):
+        url = '/api/tweets/{}/comment/'.format(self.tweet.id)
+        # tweet, COUNT, page, author cache misses
+        self.assertQueries(4, self.bob_client, url)
+        # tweet, page
+        self.assertQueries(2, self.bob_client, url + '?cursor=')
+
+
+class ViewerStateTestCase(TestCase):
+    """``PageListSerializer`` resolves user_like_it and follow_account once per page"""
+
+    def setUp(self):
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        self.bob_client = api_client(self.bob)
+        self.tweets = [Tweet.objects.create(user=self.alice, content=str(i)) for i in range(8)]
+        self.liked = {tweet.id for tweet in self.tweets[::2]}
+        for tweet_id in self.liked:
+            self.bob_client.post('/api/tweets/{}/like/'.format(tweet_id), {'action': 'like'})
+        self.users = [create_user('user{}'.format(i)) for i in range(6)]
+        for user in self.users:
+            api_client(user).post('/api/users/alice/follow_unfollow/', {'action': 'follow'})
+        self.followed = {user.username for user in self.users[:3]}
+        for username in self.followed:
+            self.bob_client.post('/api/users/{}/follow_unfollow/'.format(username), {'action': 'follow'})
+
+    def assertQueriesPerPage(self, num, url, page_sizes):
+        pages = []
+        for page_size in page_sizes:
+            clear_caches()
+            with mock.patch.object(KeysetPagination, 'page_size', page_size), self.assertNumQueries(num):
+                response = self.bob_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+            pages.append(response.data['results'])
+        return pages
+
+    def test_user_like_it(self):
+        # page, author cache misses, viewer likes; whatever the page size
+        for page in self.assertQueriesPerPage(3, '/api/tweets/?cursor=', [2, 8]):
+            for tweet in page:
+                self.assertEqual(tweet['user_like_it'], tweet['id'] in self.liked)
+
+    def test_follow_account(self):
+        # user, page, viewer follows, author cache misses; whatever the page size
+        for page in self.assertQueriesPerPage(4, '/api/users/alice/seguidores/?cursor=', [2, 6]):
+            for user in page:
+                self.assertEqual(user['follow_account'], user['username'] in self.followed)
+
+
+class CompiledSerializerParityTestCase(TestCase):
+    """Compiled serializers and FastJSONRenderer render the same bytes"""
+
+    def setUp(self):
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        Profile.objects.filter(user=self.alice).update(
+            picture='users/pictures/r2d2.jpg',
+            biografia='Bip bup \u2028 ñandú'
+        )
+        self.bob_client = api_client(self.bob)
+        api_client(self.alice).post('/api/users/bobby/follow_unfollow/', {'action': 'follow'})
+        self.bob_client.post('/api/users/alice/follow_unfollow/', {'action': 'follow'})
+
+        self.tweet = Tweet.objects.create(user=self.alice, content='¿Qué tal? "hola" </script>')
+        Tweet.objects.create(user=self.alice, content=None)
+        self.bob_client.post('/api/tweets/{}/like/'.format(self.tweet.id), {'action': 'like'})
+        self.bob_client.post('/api/tweets/{}/retweet/'.format(self.tweet.id), {'content': ''})
+        self.bob_client.post('/api/tweets/{}/comment/'.format(self.tweet.id), {'content': 'Genial'})
+
+    def test_parity(self):
+        urls = [
+            '/api/tweets/',
+            '/api/tweets/{}/'.format(self.tweet.id),
+            '/api/tweets/batch/?ids={},999&format=json'.format(self.tweet.id),
+            '/api/tweets/feed/',
+            '/api/tweets/trending/',
+            '/api/tweets/{}/comment/'.format(self.tweet.id),
+            '/api/users/alice/',
+            '/api/users/alice/tweets/',
+            '/api/users/alice/seguidores/',
+            '/api/users/alice/siguiendo/',
+        ]
+        for url in urls:
+            if '?' not in url:
+                url += '?format=json'
+            expected = self.bob_client.get(url).content
+            with override_settings(FAST_SERIALIZATION=True):
+                response = self.bob_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.content, expected, url)
+            self.assertEqual(FastJSONRenderer().render(response.data), expected, url)
+
+    def test_renderers(self):
+        data = {'texto': 'ñandú \u2028 </script>', 1: [True, None, -7], 'fecha': timezone.now()}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        # Documented differences
+        self.assertEqual(FastJSONRenderer().render({'n': 1e16}), b'{"n":1e16}')
+        self.assertEqual(JSONRenderer().render({'n': 1e16}), b'{"n":1e+16}')
+
+
+class TweetCacheTestCase(TransactionTestCase):
+    """Cached responses and tweets are invalidated by writes"""
+
+    def setUp(self):
+        clear_caches()
+        self.alice = create_user('alice')
+        self.alice_client = api_client(self.alice)
+        self.alice_client.post('/api/tweets/', {'content': 'hola'})
+        self.tweet = Tweet.objects.get()
+
+    def assertCached(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = api_client().get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        # COUNT, page
+        self.assertCached('/api/tweets/', 2)
+        self.assertCached('/api/tweets/', 0)
+        self.assertCached('/api/tweets/?page=1', 2)
+        self.alice_client.post('/api/tweets/', {'content': 'adios'})
+        response = self.assertCached('/api/tweets/', 2)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_lost_version(self):
+        self.assertCached('/api/tweets/', 2)
+        self.alice_client.post('/api/tweets/', {'content': 'adios'})
+        # Evicted or reset: an earlier version must not come back
+        get_version_cache().delete(GLOBAL_VERSION_KEY)
+        response = self.assertCached('/api/tweets/', 2)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_retrieve(self):
+        url = '/api/tweets/{}/'.format(self.tweet.id)
+        self.assertCached(url, 1)
+        self.assertCached(url, 0)
+        self.alice_client.post(url + 'like/', {'action': 'like'})
+        response = self.assertCached(url, 1)
+        self.assertEqual(response.data['likes'], 1)
+
+    def test_retweet(self):
+        bob_client = api_client(create_user('bobby'))
+        bob_client.post('/api/tweets/{}/retweet/'.format(self.tweet.id), {'content': 'rt'})
+        url = '/api/tweets/{}/'.format(Tweet.objects.get(parent=self.tweet).id)
+        # The parent is learnt first, then the response is cached
+        self.assertCached(url, 1)
+        self.assertCached(url, 1)
+        self.assertCached(url, 0)
+        bob_client.post('/api/tweets/{}/like/'.format(self.tweet.id), {'action': 'like'})
+        response = self.assertCached(url, 1)
+        self.assertEqual(response.data['parent']['likes'], 1)
+
+    def test_tweet_cache(self):
+        hits, misses = tweet_cache.hits, tweet_cache.misses
+        self.alice_client.get('/api/tweets/feed/')
+        self.alice_client.get('/api/tweets/feed/')
+        self.assertEqual(tweet_cache.misses - misses, 1)
+        self.assertEqual(tweet_cache.hits - hits, 1)
+
+        self.alice_client.post('/api/tweets/{}/like/'.format(self.tweet.id), {'action': 'like'})
+        response = self.alice_client.get('/api/tweets/feed/')
+        self.assertEqual(response.data['results'][0]['likes'], 1)
+
+    def test_stale_fill(self):
+        # The row is read, then a write commits and bumps the version
+        # before the reader fills the cache
+        stale = list(Tweet.objects.filter(id=self.tweet.id))
+        Tweet.objects.filter(id=self.tweet.id).update(like_count=1)
+
+        def concurrent_write(**kwargs):
+            bump_versions(self.tweet.id)
+            return stale
+
+        with mock.patch.object(Tweet.objects, 'filter', side_effect=concurrent_write):
+            self.assertEqual(tweet_cache.get_many([self.tweet.id])[self.tweet.id].like_count, 0)
+        self.assertEqual(tweet_cache.get_many([self.tweet.id])[self.tweet.id].like_count, 1)
+
+
+class TweetSearchTestCase(TestCase):
+    """The content filter runs a ranked full-text search"""
+
+    def setUp(self):
+        self.alice = create_user('alice')
+        self.alice_client = api_client(self.alice)
+        for content in ['Aprendiendo Django', 'django, django y más django', 'Hola mundo', 'Campeón']:
+            self.alice_client.post('/api/tweets/', {'content': content})
+
+    def search(self, term):
+        response = self.alice_client.get('/api/tweets/', {'content': term})
+        self.assertEqual(response.status_code, 200)
+        return [tweet['content'] for tweet in response.data['results']]
+
+    def test_search(self):
+        self.assertEqual(self.search('django'), ['django, django y más django', 'Aprendiendo Django'])
+        self.assertEqual(self.search('hola mundo'), ['Hola mundo'])
+        self.assertEqual(self.search('"; DROP'), [])
+
+    def test_index_follows_writes(self):
+        tweet = Tweet.objects.get(content='Hola mundo')
+        self.alice_client.patch('/api/tweets/{}/'.format(tweet.id), {'content': 'Adiós mundo'})
+        self.assertEqual(self.search('hola'), [])
+        self.assertEqual(self.search('adiós'), ['Adiós mundo'])
+
+        self.alice_client.delete('/api/tweets/{}/'.format(tweet.id))
+        self.assertEqual(self.search('mundo'), [])
+
+    def test_cursor(self):
+        # A cursor would drop the ranking
+        response = self.alice_client.get('/api/tweets/', {'content': 'django', 'cursor': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
+        response = self.alice_client.get('/api/tweets/', {'content': '', 'cursor': ''})
+        self.assertEqual(len(response.data['results']), 4)
+
+
+class TweetEntitiesTestCase(TestCase):
+    """Hashtags and mentions are indexed on write"""
+
+    def setUp(self):
+        clear_caches()
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        self.alice_client = api_client(self.alice)
+        self.alice_client.post('/api/tweets/', {'content': 'Hola @bobby, mira #Django y #python'})
+        self.alice_client.post('/api/tweets/', {'content': 'Sin etiquetas, correo a x@bobby.com'})
+        self.tweet = Tweet.objects.get(content__startswith='Hola')
+
+    def contents(self, url, params=None):
+        response = self.alice_client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [tweet['content'] for tweet in response.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.contents('/api/tweets/', {'hashtag': '#django'}), [self.tweet.content])
+        self.assertEqual(self.contents('/api/tweets/', {'hashtag': 'PYTHON', 'cursor': ''}), [self.tweet.content])
+        self.assertEqual(self.contents('/api/tweets/', {'mention': 'bobby'}), [self.tweet.content])
+        self.assertEqual(self.contents('/api/users/bobby/mentions/', {'cursor': ''}), [self.tweet.content])
+
+    def test_update(self):
+        self.alice_client.patch('/api/tweets/{}/'.format(self.tweet.id), {'content': '#nuevo'})
+        self.assertEqual(self.contents('/api/tweets/', {'hashtag': 'django'}), [])
+        self.assertEqual(self.contents('/api/tweets/', {'hashtag': 'nuevo'}), ['#nuevo'])
+        self.assertEqual(self.contents('/api/users/bobby/mentions/'), [])
+
+
+class TrendingTestCase(TestCase):
+    """Trending hashtags and terms come from the streaming counters"""
+
+    def setUp(self):
+        clear_caches()
+        trending_topics.reset()
+        self.alice = create_user('alice')
+        self.alice_client = api_client(self.alice)
+        for content in ['#Django rocks', '#django y #python', 'Aprendiendo #python con django', '#django']:
+            self.alice_client.post('/api/tweets/', {'content': content})
+
+    def test_trending(self):
+        with self.assertNumQueries(1):
+            response = api_client().get('/api/tweets/trending/', {'k': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['hashtags'], [
+            {'hashtag': 'django', 'count': 3},
+            {'hashtag': 'python', 'count': 2},
+        ])
+        self.assertEqual(response.data['terms'][:2], [
+            {'term': 'aprendiendo', 'count': 1},
+            {'term': 'django', 'count': 1},
+        ])
+
+        # Cached until the next tick
+        self.alice_client.post('/api/tweets/', {'content': '#python #python'})
+        with self.assertNumQueries(0):
+            api_client().get('/api/tweets/trending/', {'k': 2})
+        clear_caches()
+        response = api_client().get('/api/tweets/trending/', {'k': 2})
+        self.assertEqual(response.data['hashtags'][1], {'hashtag': 'python', 'count': 3})
+
+    def test_out_of_order_commits(self):
+        trending_topics.ingest()
+        # Id generated before the last scan, committed after it
+        late = datetime_to_id(timezone.now() - timedelta(seconds=30))
+        Tweet.objects.create(id=late, user=self.alice, content='#tarde')
+        trending_topics.record_tweet(Tweet.objects.create(user=self.alice, content='#tarde'))
+        trending_topics.ingest()
+        trending_topics.ingest()
+        self.assertEqual(trending_topics.top(1)['hashtags'], [('django', 3)])
+        self.assertIn(('tarde', 2), trending_topics.top(3)['hashtags'])
+
+    def test_invalid(self):
+        response = api_client().get('/api/tweets/trending/', {'minutes': 0})
+        self.assertEqual(response.status_code, 400)
+
+
+class TimelineTestCase(TestCase):
+    """Tweets fan out to followers; follows backfill, unfollows prune"""
+
+    def setUp(self):
+        clear_caches()
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        self.carol = create_user('carol')
+        self.store = DatabaseTimelineStore()
+        FollowRelation.objects.create(follower=self.bob, following=self.alice)
+
+    def timeline(self, user):
+        return list(self.store.tweet_ids(user).order_by('-tweet_id'))
+
+    def test_fan_out(self):
+        tweet = Tweet.objects.create(user=self.alice, content='hola')
+        fan_out_tweet(tweet.id)
+        self.assertEqual(self.timeline(self.alice), [tweet.id])
+        self.assertEqual(self.timeline(self.bob), [tweet.id])
+        self.assertEqual(self.timeline(self.carol), [])
+
+    def test_follow_unfollow(self):
+        tweets = [Tweet.objects.create(user=self.alice, content=str(number)) for number in range(3)]
+        own = Tweet.objects.create(user=self.carol, content='mio')
+        self.store.push(own, [self.carol.id])
+
+        with mock.patch('tweets.timelines.TIMELINE_MAX_LENGTH', 3):
+            update_timeline(self.carol.id, self.alice.id, True)
+        # The backfill keeps the newest three
+        self.assertEqual(self.timeline(self.carol), [own.id, tweets[2].id, tweets[1].id])
+
+        update_timeline(self.carol.id, self.alice.id, False)
+        self.assertEqual(self.timeline(self.carol), [own.id])
+
+    def test_trim(self):
+        tweets = [Tweet.objects.create(user=self.alice, content=str(number)) for number in range(4)]
+        for tweet in tweets:
+            self.store.push(tweet, [self.alice.id, self.bob.id])
+        self.store.push(tweets[0], [self.carol.id])
+
+        with mock.patch('tweets.timelines.TIMELINE_MAX_LENGTH', 2):
+            self.assertEqual(self.store.trim(), 4)
+        self.assertEqual(self.timeline(self.alice), [tweets[3].id, tweets[2].id])
+        self.assertEqual(self.timeline(self.bob), [tweets[3].id, tweets[2].id])
+        self.assertEqual(self.timeline(self.carol), [tweets[0].id])
+
+    def test_rebuild(self):
+        tweets = [Tweet.objects.create(user=self.alice, content=str(number)) for number in range(3)]
+        stray = Tweet.objects.create(user=self.carol, content='ajeno')
+        self.store.push(stray, [self.bob.id])
+
+        with mock.patch('tweets.management.commands.rebuild_timelines.get_timeline_store', return_value=self.store), \
+                mock.patch('tweets.management.commands.rebuild_timelines.TIMELINE_MAX_LENGTH', 2), \
+                mock.patch.object(TimelineEntry.objects, 'bulk_create', wraps=TimelineEntry.objects.bulk_create) as bulk:
+            call_command('rebuild_timelines', 'bobby', stdout=StringIO())
+        # One insert for the whole timeline
+        self.assertEqual(bulk.call_count, 1)
+        self.assertEqual(self.timeline(self.bob), [tweets[2].id, tweets[1].id])
+
+
+class CounterTestCase(TestCase):
+    """Write paths keep the denormalized counters exact"""
+
+    def setUp(self):
+        clear_caches()
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        self.alice_client = api_client(self.alice)
+        self.bob_client = api_client(self.bob)
+
+    def assertCounters(self, user, **expected):
+        user.refresh_from_db()
+        self.assertEqual({field: getattr(user, field) for field in expected}, expected)
+
+    def test_tweets(self):
+        response = self.alice_client.post('/api/tweets/', {'content': 'hola'})
+        tweet_id = response.data['id']
+        self.bob_client.post('/api/tweets/{}/retweet/'.format(tweet_id), {'content': 'rt'})
+        self.bob_client.post('/api/tweets/{}/comment/'.format(tweet_id), {'content': 'bien'})
+        self.bob_client.post('/api/tweets/{}/like/'.format(tweet_id), {'action': 'like'})
+
+        tweet = Tweet.objects.get(pk=tweet_id)
+        self.assertEqual((tweet.like_count, tweet.retweet_count, tweet.comment_count), (1, 1, 1))
+        self.assertCounters(self.alice, tweet_count=1)
+        self.assertCounters(self.bob, tweet_count=1)
+
+        retweet = Tweet.objects.get(parent_id=tweet_id)
+        self.assertEqual(self.bob_client.delete('/api/tweets/{}/'.format(retweet.id)).status_code, 204)
+        self.bob_client.post('/api/tweets/{}/like/'.format(tweet_id), {'action': 'unlike'})
+        tweet.refresh_from_db()
+        self.assertEqual((tweet.like_count, tweet.retweet_count), (0, 0))
+        self.assertCounters(self.bob, tweet_count=0)
+
+    def test_follow(self):
+        url = '/api/users/alice/follow_unfollow/'
+        self.assertEqual(self.bob_client.post(url, {'action': 'follow'}).data, {'count': 1})
+        self.assertEqual(self.bob_client.post(url, {'action': 'follow'}).status_code, 400)
+        self.assertCounters(self.alice, follower_count=1, following_count=0)
+        self.assertCounters(self.bob, follower_count=0, following_count=1)
+
+        self.assertEqual(self.bob_client.post(url, {'action': 'unfollow'}).data, {'count': 0})
+        self.assertEqual(self.bob_client.post(url, {'action': 'unfollow'}).status_code, 400)
+        self.assertCounters(self.alice, follower_count=0)
+        self.assertCounters(self.bob, following_count=0)
+
+    def test_concurrent_unfollow(self):
+        FollowRelation.objects.create(follower=self.bob, following=self.alice)
+        User.objects.filter(pk=self.alice.pk).update(follower_count=1)
+        User.objects.filter(pk=self.bob.pk).update(following_count=1)
+        serializer = FollowUnfollowUserSerializer(context={'siguiendo': self.alice})
+
+        # Both requests validated while the edge existed; the second deletes nothing
+        serializer.create({'seguidor': self.bob, 'action': 'unfollow'})
+        with self.assertRaises(ValidationError):
+            serializer.create({'seguidor': self.bob, 'action': 'unfollow'})
+        self.assertCounters(self.alice, follower_count=0)
+        self.assertCounters(self.bob, following_count=0)
+
+    def test_concurrent_delete(self):
+        tweet = Tweet.objects.create(user=self.alice, content='hola')
+        retweet = Tweet.objects.create(user=self.bob, content='rt', parent=tweet)
+        Tweet.objects.filter(pk=tweet.pk).update(retweet_count=1)
+        User.objects.filter(pk=self.bob.pk).update(tweet_count=1)
+
+        # Both requests loaded the retweet; the second deletes nothing
+        TweetViewSet().perform_destroy(retweet)
+        TweetViewSet().perform_destroy(retweet)
+        tweet.refresh_from_db()
+        self.assertEqual(tweet.retweet_count, 0)
+        self.assertCounters(self.bob, tweet_count=0)
+
+    def test_repair(self):
+        tweet = Tweet.objects.create(user=self.alice, content='hola')
+        Tweet.objects.create(user=self.bob, content='rt', parent=tweet)
+        TweetLike.objects.create(user=self.bob, tweet=tweet)
+        Comment.objects.create(user=self.bob, tweet=tweet, content='bien')
+        FollowRelation.objects.create(follower=self.bob, following=self.alice)
+        Tweet.objects.update(like_count=7, retweet_count=7, comment_count=7)
+        User.objects.update(follower_count=7, following_count=7, tweet_count=7)
+
+        call_command('repair_counters', stdout=StringIO())
+        tweet.refresh_from_db()
+        self.assertEqual((tweet.like_count, tweet.retweet_count, tweet.comment_count), (1, 1, 1))
+        self.assertCounters(self.alice, follower_count=1, following_count=0, tweet_count=1)
+        self.assertCounters(self.bob, follower_count=0, following_count=1, tweet_count=1)
+
+
+class TweetLikeTestCase(TestCase):
+    """Like and unlike are idempotent and report the new count"""
+
+    def setUp(self):
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        self.bob_client = api_client(self.bob)
+        self.tweet = Tweet.objects.create(user=self.alice, content='hola')
+        self.url = '/api/tweets/{}/like/'.format(self.tweet.id)
+
+    def act(self, action, changed, likes):
+        response = self.bob_client.post(self.url, {'action': action})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'action': action, 'changed': changed, 'likes': likes})
+
+    def test_like_unlike(self):
+        self.act('like', True, 1)
+        self.act('like', False, 1)
+        self.assertEqual(TweetLike.objects.filter(tweet=self.tweet).count(), 1)
+        self.act('unlike', True, 0)
+        self.act('unlike', False, 0)
+        self.assertEqual(Tweet.objects.get(pk=self.tweet.pk).like_count, 0)
+
+    def test_deleted_tweet(self):
+        # The tweet is deleted after the view looked it up
+        Tweet.objects.filter(pk=self.tweet.pk).delete()
+        with self.assertRaises(Http404):
+            set_like(self.bob, self.tweet, 'like')
+        self.assertFalse(TweetLike.objects.filter(tweet_id=self.tweet.pk).exists())
+
+        # PostgreSQL: the UPDATE ... RETURNING of the like_count has no row
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchone.return_value = None
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.object(connection, 'cursor', return_value=cursor):
+            with self.assertRaises(Http404):
+                set_like(self.bob, self.tweet, 'unlike')
+
+        # Answered as a 404 by the view
+        tweet = Tweet.objects.create(user=self.alice, content='adiós')
+        with mock.patch('tweets.serializers.set_like', side_effect=Http404):
+            response = self.bob_client.post('/api/tweets/{}/like/'.format(tweet.id), {'action': 'like'})
+        self.assertEqual(response.status_code, 404)
+
+
+class TweetQueryPlanTestCase(QueryPlanMixin, TestCase):
+    """Hot tweet queries are served by indexes"""
+
+    def setUp(self):
+        self.alice = create_user('alice')
+        self.tweet = Tweet.objects.create(user=self.alice, content='hola #django')
+
+    def test_plans(self):
+        self.assertIndexScan(Tweet.objects.filter(user=self.alice).order_by('-id'), ordered=True)
+        self.assertIndexScan(Tweet.objects.filter(id__in=[1, 2, 3]))
+        self.assertIndexScan(Comment.objects.filter(tweet=self.tweet).order_by('-id'), ordered=True)
+        self.assertIndexScan(TweetLike.objects.filter(user=self.alice, tweet_id__in=[1, 2]).order_by())
+        self.assertIndexScan(TweetLike.objects.filter(tweet=self.tweet).order_by().values('user_id'))
+        self.assertIndexScan(TimelineEntry.objects.filter(owner=self.alice).order_by())
+        self.assertIndexScan(TweetHashtag.objects.filter(tag='django').order_by())
+
+
+class EngagementTestCase(TestCase):
+    """Queued likes and follows are applied in one request"""
+
+    def setUp(self):
+        clear_caches()
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        self.carol = create_user('carol')
+        self.bob_client = api_client(self.bob)
+        self.tweets = [Tweet.objects.create(user=self.alice, content='t{}'.format(i)) for i in range(3)]
+        TweetLike.objects.create(user=self.bob, tweet=self.tweets[2])
+        Tweet.objects.filter(pk=self.tweets[2].pk).update(like_count=1)
+
+    def test_engagement(self):
+        first, second, third = [tweet.id for tweet in self.tweets]
+        operations = [
+            {'action': 'like', 'tweet': first},
+            {'action': 'like', 'tweet': first},
+            {'action': 'like', 'tweet': second},
+            {'action': 'unlike', 'tweet': second},
+            {'action': 'unlike', 'tweet': third},
+            {'action': 'like', 'tweet': 999},
+            {'action': 'follow', 'user': 'alice'},
+            {'action': 'follow', 'user': 'carol'},
+            {'action': 'unfollow', 'user': 'carol'},
+            {'action': 'follow', 'user': 'bobby'},
+            {'action': 'follow', 'user': 'nadie'},
+        ]
+        # tweets, users, likes, follows, savepoint, tweet lock, user lock, like insert, unlike,
+        # 2 like counts, follow insert, follower count, following count, timeline backfill job
+        # (4 with the trim, eager), release, like counts, follower counts
+        with self.assertNumQueries(21):
+            response = self.bob_client.post('/api/tweets/engagement/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(
+            [(result['status'], result.get('changed')) for result in results],
+            [('ok', True), ('ok', False), ('ok', True), ('ok', True), ('ok', True), ('error', None),
+             ('ok', True), ('ok', True), ('ok', True), ('error', None), ('error', None)]
+        )
+        self.assertEqual([result.get('likes') for result in results[:5]], [1, 1, 0, 0, 0])
+        self.assertEqual(results[6]['followers'], 1)
+
+        self.assertEqual(set(TweetLike.objects.filter(user=self.bob).values_list('tweet_id', flat=True)), {first})
+        self.assertEqual([tweet.like_count for tweet in Tweet.objects.order_by('id')], [1, 0, 0])
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.following_count, 1)
+        self.assertEqual(list(self.bob.followings.all()), [self.alice])
+
+    def test_concurrent_writes(self):
+        first, second, third = [tweet.id for tweet in self.tweets]
+        operations = [
+            {'action': 'like', 'tweet': first},
+            {'action': 'unlike', 'tweet': third},
+            {'action': 'follow', 'user': 'alice'},
+        ]
+        replay = engagement._replay
+
+        def concurrent_replay(*args):
+            # Another request of bob writes the same rows after the state was read
+            if not TweetLike.objects.filter(user=self.bob, tweet_id=first).exists():
+                set_like(self.bob, self.tweets[0], 'like')
+                set_like(self.bob, self.tweets[2], 'unlike')
+                FollowRelation.objects.create(follower=self.bob, following=self.alice)
+                User.objects.filter(pk=self.alice.pk).update(follower_count=1)
+                User.objects.filter(pk=self.bob.pk).update(following_count=1)
+            return replay(*args)
+
+        with mock.patch('tweets.engagement._replay', side_effect=concurrent_replay):
+            for _ in range(2):
+                response = self.bob_client.post('/api/tweets/engagement/', {'operations': operations}, format='json')
+                self.assertEqual(response.status_code, 200)
+
+        self.assertEqual([tweet.like_count for tweet in Tweet.objects.order_by('id')], [1, 0, 0])
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.follower_count, self.bob.following_count), (1, 1))
+
+    def test_concurrent_delete(self):
+        first, second, third = [tweet.id for tweet in self.tweets]
+        operations = [
+            {'action': 'like', 'tweet': first},
+            {'action': 'like', 'tweet': second},
+            {'action': 'unlike', 'tweet': third},
+        ]
+        replay = engagement._replay
+
+        def concurrent_replay(*args):
+            # The first tweet is deleted after the lookup, the third after the writes
+            Tweet.objects.filter(pk=first).delete()
+            return replay(*args)
+
+        def deleting_counts(*args, **kwargs):
+            Tweet.objects.filter(pk=third).delete()
+            return tweets_changed(*args, **kwargs)
+
+        with mock.patch('tweets.engagement._replay', side_effect=concurrent_replay), \
+                mock.patch('tweets.engagement.tweets_changed', side_effect=deleting_counts):
+            response = self.bob_client.post('/api/tweets/engagement/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(
+            [(result['status'], result.get('detail'), result.get('likes')) for result in results],
+            [('error', 'Tweet no encontrado', None), ('ok', None, 1), ('error', 'Tweet no encontrado', None)]
+        )
+        self.assertEqual(list(TweetLike.objects.filter(user=self.bob).values_list('tweet_id', flat=True)), [second])
+
+    def test_invalid(self):
+        response = self.bob_client.post('/api/tweets/engagement/', {'operations': [{'action': 'like'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class TweetBatchTestCase(TestCase):
+    """Tweets are fetched by id in one round trip"""
+
+    def setUp(self):
+        clear_caches()
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        self.bob_client = api_client(self.bob)
+        self.tweets = [Tweet.objects.create(user=self.alice, content='t{}'.format(i)) for i in range(3)]
+        self.retweet = Tweet.objects.create(user=self.bob, content='rt', parent=self.tweets[0])
+        TweetLike.objects.create(user=self.bob, tweet=self.tweets[0])
+        clear_caches()
+
+    def test_batch(self):
+        ids = [self.tweets[2].id, 999, self.retweet.id, self.tweets[1].id, self.tweets[2].id]
+        url = '/api/tweets/batch/?ids={}'.format(','.join(str(tweet_id) for tweet_id in ids))
+        # tweet cache misses, parent cache misses, archive, author cache misses, viewer likes
+        with self.assertNumQueries(5):
+            response = self.bob_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['results']],
+            [self.tweets[2].id, self.retweet.id, self.tweets[1].id]
+        )
+        self.assertEqual(response.data['missing'], [999])
+        self.assertTrue(response.data['results'][1]['parent']['user_like_it'])
+
+        # missing id, archive, viewer likes
+        with self.assertNumQueries(3):
+            self.bob_client.get(url)
+
+    def test_invalid(self):
+        self.assertEqual(self.bob_client.get('/api/tweets/batch/?ids=1,a').status_code, 400)
+        ids = ','.join(str(tweet_id) for tweet_id in range(1, 202))
+        self.assertEqual(self.bob_client.get('/api/tweets/batch/?ids=' + ids).status_code, 400)
+
+
+def image_upload(name='foto.jpg', size=(2000, 1000)):
+    """JPEG with EXIF orientation and camera metadata"""
+    image = Image.new('RGB', size, (200, 30, 30))
+    exif = Image.Exif()
+    exif[0x0112] = 1
+    exif[0x010F] = 'Camara'
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImagePipelineTestCase(TestCase):
+    """Uploads are validated, stripped of metadata and resized"""
+
+    def setUp(self):
+        clear_caches()
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root, JOBS_ALWAYS_EAGER=True)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.alice = create_user('alice')
+        self.client = api_client(self.alice)
+
+    def test_tweet_image(self):
+        response = self.client.post('/api/tweets/', {'content': 'foto', 'image': image_upload()}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+        tweet = Tweet.objects.get(id=response.data['id'])
+        with default_storage.open(tweet.image.name) as original:
+            self.assertNotIn('exif', Image.open(original).info)
+
+        response = self.client.get('/api/tweets/{}/'.format(tweet.id))
+        renditions = response.data['image_renditions']
+        self.assertEqual(
+            [(r['name'], r['format'], r['width'], r['height']) for r in renditions],
+            [
+                ('small', 'webp', 320, 160), ('small', 'jpeg', 320, 160),
+                ('medium', 'webp', 640, 320), ('medium', 'jpeg', 640, 320),
+                ('large', 'webp', 1280, 640), ('large', 'jpeg', 1280, 640),
+            ]
+        )
+        self.assertTrue(renditions[0]['url'].startswith('http://testserver/media/blobs/'))
+        with default_storage.open(renditions[0]['url'].split('/media/', 1)[1]) as small:
+            self.assertEqual(Image.open(small).format, 'WEBP')
+
+    def test_no_upscaling(self):
+        self.client.put('/api/users/alice/', {'picture': image_upload(size=(400, 300))}, format='multipart')
+        response = self.client.get('/api/users/alice/')
+        renditions = response.data['profile']['picture_renditions']
+        self.assertEqual(
+            [(r['name'], r['width'], r['height']) for r in renditions],
+            [('small', 320, 240), ('small', 320, 240), ('medium', 400, 300), ('medium', 400, 300)]
+        )
+
+    def test_invalid_image(self):
+        upload = SimpleUploadedFile('foto.jpg', b'not an image', content_type='image/jpeg')
+        response = self.client.post('/api/tweets/', {'content': 'foto', 'image': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+    def test_max_pixels(self):
+        # Pillow alone only warns between 1x and 2x its limit
+        with mock.patch('utils.images.IMAGE_MAX_PIXELS', 1000 * 1000), \
+                mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000 * 1000):
+            upload = image_upload(size=(1500, 1000))
+            response = self.client.post('/api/tweets/', {'content': 'foto', 'image': upload}, format='multipart')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('image', response.data)
+            self.assertEqual(Image.MAX_IMAGE_PIXELS, 1000 * 1000)
+
+    def test_processed_once(self):
+        response = self.client.post('/api/tweets/', {'content': 'foto', 'image': image_upload()}, format='multipart')
+        tweet = Tweet.objects.get(id=response.data['id'])
+        with default_storage.open(tweet.image.name) as original:
+            content = original.read()
+
+        # A retried job finds the image already processed
+        with mock.patch('utils.images.run') as run:
+            process_image('tweets.Tweet', tweet.id, 'image')
+        run.assert_not_called()
+        processed = Tweet.objects.get(id=tweet.id)
+        self.assertEqual((processed.image.name, processed.image_renditions), (tweet.image.name, tweet.image_renditions))
+        with default_storage.open(processed.image.name) as original:
+            self.assertEqual(original.read(), content)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTestCase(SimpleTestCase):
+    """Safe reads go to replicas unless the user just wrote"""
+
+    def setUp(self):
+        clear_caches()
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.user = User(id=1, username='alice')
+        healthy = mock.patch.object(replica_health, 'is_healthy', return_value=True)
+        self.is_healthy = healthy.start()
+        self.addCleanup(healthy.stop)
+
+    def read_db(self, method='get', user=None):
+        request = getattr(self.factory, method)('/api/tweets/')
+        if user is not None:
+            request.user = user
+        with routing(request):
+            return self.router.db_for_read(Tweet)
+
+    def test_routing(self):
+        self.assertEqual(self.read_db(), 'replica')
+        self.assertEqual(self.read_db('post'), 'default')
+        # outside a request (jobs, commands)
+        self.assertEqual(self.router.db_for_read(Tweet), 'default')
+
+        with routing(self.factory.get('/api/tweets/')):
+            self.assertEqual(self.router.db_for_read(Tweet), 'replica')
+            self.assertEqual(self.router.db_for_write(Tweet), 'default')
+            self.assertEqual(self.router.db_for_read(Tweet), 'default')
+
+    def test_read_your_writes(self):
+        self.assertEqual(self.read_db(user=self.user), 'replica')
+        stick_to_primary(self.user.id)
+        self.assertEqual(self.read_db(user=self.user), 'default')
+        self.assertEqual(self.read_db(user=User(id=2, username='bobby')), 'replica')
+
+    def test_unhealthy_replica(self):
+        self.is_healthy.return_value = False
+        self.assertEqual(self.read_db(), 'default')
+
+
+class TweetArchiveTestCase(TestCase):
+    """Old tweets move to the archive and are still found by id"""
+
+    def setUp(self):
+        clear_caches()
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        old = timezone.now() - timedelta(days=400)
+
+        self.old = Tweet.objects.create(user=self.alice, content='viejo', like_count=1, comment_count=1)
+        self.old_retweet = Tweet.objects.create(user=self.bob, content='rt viejo', parent=self.old)
+        self.kept = Tweet.objects.create(user=self.alice, content='retuiteado')
+        self.recent_retweet = Tweet.objects.create(user=self.bob, content='rt', parent=self.kept)
+        TweetLike.objects.create(user=self.bob, tweet=self.old)
+        Comment.objects.create(user=self.bob, tweet=self.old, content='hola')
+        Tweet.objects.filter(id__in=[self.old.id, self.old_retweet.id, self.kept.id]).update(created=old)
+
+    def test_archive(self):
+        call_command('archive_tweets', days=365, batch_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            set(ArchivedTweet.objects.values_list('id', flat=True)), {self.old.id, self.old_retweet.id}
+        )
+        self.assertEqual(set(Tweet.objects.values_list('id', flat=True)), {self.kept.id, self.recent_retweet.id})
+        self.assertEqual(ArchivedComment.objects.get().tweet_id, self.old.id)
+
+        client = api_client(self.bob)
+        response = client.get('/api/tweets/{}/'.format(self.old_retweet.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['parent']['content'], 'viejo')
+        self.assertTrue(response.data['parent']['user_like_it'])
+        response = client.get('/api/tweets/{}/'.format(self.old.id))
+        self.assertEqual(response.data['likes'], 1)
+        self.assertTrue(response.data['user_like_it'])
+        self.assertFalse(api_client(self.alice).get('/api/tweets/{}/'.format(self.old.id)).data['user_like_it'])
+
+        ids = '{},{},999'.format(self.old.id, self.kept.id)
+        response = client.get('/api/tweets/batch/?ids=' + ids)
+        self.assertEqual([tweet['id'] for tweet in response.data['results']], [self.old.id, self.kept.id])
+        self.assertEqual(response.data['missing'], [999])
+
+        call_command('repair_counters', stdout=StringIO())
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.tweet_count, 2)
+
+    def test_archived_comments_and_delete(self):
+        call_command('archive_tweets', days=365, stdout=StringIO())
+        call_command('repair_counters', stdout=StringIO())
+        alice_client, bob_client = api_client(self.alice), api_client(self.bob)
+        url = '/api/tweets/{}/'.format(self.old.id)
+
+        response = bob_client.get(url + 'comment/')
+        self.assertEqual([comment['content'] for comment in response.data['results']], ['hola'])
+        # Read-only otherwise
+        self.assertEqual(bob_client.post(url + 'like/', {'action': 'like'}).status_code, 404)
+        self.assertEqual(bob_client.post(url + 'comment/', {'content': 'hola'}).status_code, 404)
+
+        self.assertEqual(bob_client.delete(url).status_code, 403)
+        self.assertEqual(bob_client.delete('/api/tweets/{}/'.format(self.old_retweet.id)).status_code, 204)
+        self.assertEqual(ArchivedTweet.objects.get(id=self.old.id).retweet_count, 0)
+
+        self.assertEqual(alice_client.delete(url).status_code, 204)
+        self.assertFalse(ArchivedTweet.objects.exists())
+        self.assertFalse(ArchivedComment.objects.exists())
+        self.assertFalse(ArchivedTweetLike.objects.exists())
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.tweet_count, self.bob.tweet_count), (1, 1))
+        self.assertEqual(alice_client.get(url).status_code, 404)
+
+
+def generate_ids(barrier, results):
+    ids = [next_id() for _ in range(1000)]
+    # Every process holds its lease at once
+    barrier.wait()
+    results.put((ids_module.get_generator().worker_id, ids))
+
+
+class SnowflakeIdTestCase(TestCase):
+    """Ids are unique, time-ordered and paginate without ``created``"""
+
+    def test_unique_and_ordered(self):
+        generator = SnowflakeGenerator(worker_id=7)
+        ids = []
+
+        def generate():
+            batch = [generator.next_id() for _ in range(5000)]
+            self.assertEqual(batch, sorted(batch))
+            ids.extend(batch)
+
+        threads = [threading.Thread(target=generate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(ids)), 20000)
+
+    def test_leases(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(SNOWFLAKE_LOCK_DIR=directory), \
+                mock.patch('utils.ids._candidates', return_value=[3, 4]):
+            first = ids_module.lease_worker_id()
+            second = ids_module.lease_worker_id()
+            self.assertEqual((first.worker_id, second.worker_id), (3, 4))
+            with self.assertRaises(RuntimeError):
+                ids_module.lease_worker_id()
+            first.release()
+            third = ids_module.lease_worker_id()
+            self.assertEqual(third.worker_id, 3)
+            second.release()
+            third.release()
+
+    def test_unique_across_processes(self):
+        context = multiprocessing.get_context('fork')
+        barrier, results = context.Barrier(3), context.Queue()
+        with tempfile.TemporaryDirectory() as directory, override_settings(SNOWFLAKE_LOCK_DIR=directory), \
+                mock.patch('utils.ids._candidates', return_value=list(range(1024))):
+            processes = [context.Process(target=generate_ids, args=(barrier, results)) for _ in range(3)]
+            for process in processes:
+                process.start()
+            batches = [results.get(timeout=30) for _ in processes]
+            for process in processes:
+                process.join()
+
+        # Without leases every process would take worker id 0
+        self.assertEqual(len({worker_id for worker_id, _ in batches}), 3)
+        ids = [value for _, batch in batches for value in batch]
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_clock_going_back(self):
+        generator = SnowflakeGenerator(worker_id=1)
+        with mock.patch.object(generator, 'now_ms', return_value=1000):
+            first = generator.next_id()
+        with mock.patch.object(generator, 'now_ms', return_value=900):
+            self.assertGreater(generator.next_id(), first)
+
+    def test_time(self):
+        now = timezone.now()
+        value = next_id()
+        self.assertLess(abs((id_to_datetime(value) - now).total_seconds()), 1)
+        self.assertLessEqual(datetime_to_id(now - timedelta(seconds=1)), value)
+
+    def test_pagination(self):
+        alice = create_user('alice')
+        tweets = [Tweet.objects.create(user=alice, content=str(number)) for number in range(5)]
+        self.assertGreater(tweets[0].id, 2 ** 53)
+
+        client = api_client(alice)
+        with mock.patch.object(KeysetPagination, 'page_size', 3):
+            first = client.get('/api/tweets/?cursor=')
+            second = client.get(first.data['next'])
+        self.assertEqual([tweet['id'] for tweet in first.data['results']], [t.id for t in tweets[:1:-1]])
+        self.assertEqual(first.data['results'][0]['id_str'], str(tweets[-1].id))
+        self.assertEqual([tweet['id'] for tweet in second.data['results']], [tweets[1].id, tweets[0].id])
+
+
+class InstrumentationTestCase(TestCase):
+    """Requests report their timings and feed the /metrics histograms"""
+
+    def setUp(self):
+        clear_caches()
+        for metric in METRICS:
+            metric.reset()
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        metrics_dir = override_settings(METRICS_DIR=self.metrics_dir)
+        metrics_dir.enable()
+        self.addCleanup(metrics_dir.disable)
+        self.alice = create_user('alice')
+        Tweet.objects.create(user=self.alice, content='hola')
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing(self):
+        response = api_client(self.alice).get('/api/tweets/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        for name in ['db', 'db-slowest', 'serialize', 'render', 'total']:
+            self.assertRegex(timing, r'(^|, ){};dur=[0-9.]+'.format(name))
+        self.assertRegex(timing, r'desc="[1-9][0-9]* queries"')
+
+        with override_settings(SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', api_client(self.alice).get('/api/tweets/'))
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1', '10.0.0.0/8'])
+    def test_metrics(self):
+        api_client(self.alice).get('/api/tweets/')
+        api_client(self.alice).get('/api/users/alice/')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="TweetViewSet.list"} 1', body)
+        self.assertIn('http_request_duration_seconds_count{view="UserViewSet.retrieve"} 1', body)
+        self.assertIn('http_request_db_queries_bucket{view="TweetViewSet.list",le="+Inf"} 1', body)
+        self.assertIn('object_cache_hits_total{cache="tweets"}', body)
+        self.assertIn('# TYPE jobs_queue_lag_seconds gauge', body)
+
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_worker_processes(self):
+        api_client(self.alice).get('/api/tweets/')
+        # Another worker process (or one that exited) flushed its totals
+        other = {metric.name: {} for metric in METRICS}
+        other['http_request_duration_seconds'] = {
+            'TweetViewSet.list': [0] * (len(DURATION_BUCKETS) - 1) + [2, 12.5, 2],
+        }
+        other['object_cache_misses_total'] = {'authors': 3}
+        with open(os.path.join(self.metrics_dir, '1-otro.json'), 'w') as file:
+            json.dump(other, file)
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="TweetViewSet.list"} 3', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="TweetViewSet.list",le="10"} 3', body)
+        self.assertRegex(body, r'object_cache_misses_total{cache="authors"} [1-9]')
+        # Every scrape sees the same totals, whichever worker serves it
+        self.assertIn('http_request_duration_seconds_count{view="TweetViewSet.list"} 3',
+                      self.client.get('/metrics').content.decode())
+
+    def test_view_serializers(self):
+        api_client(self.alice).post('/api/tweets/', {'content': 'adios'})
+        api_client(self.alice).get('/api/users/alice/information/')
+        series = request_serialize_duration.snapshot()
+        # sum over one request
+        self.assertGreater(series['TweetViewSet.create'][-2], 0)
+        self.assertGreater(series['UserViewSet.information'][-2], 0)
+
+    def test_metrics_access(self):
+        # Refused to everyone unless allowed
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(METRICS_TOKEN='secreto'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro')
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer secreto')
+            self.assertEqual(response.status_code, 200)
+
+    @override_settings(PERFORMANCE_QUERY_BUDGET=0)
+    def test_budget(self):
+        with self.assertLogs('utils.instrumentation', 'WARNING') as logs:
+            api_client(self.alice).get('/api/tweets/')
+        self.assertIn('GET /api/tweets/ (TweetViewSet.list) over budget', logs.output[0])
@@ -0,0 +1,183 @@
+"""Home timeline stores
+
+The feed is materialized on write: every new tweet is pushed to the
+timeline of its author and of each follower, and follow/unfollow fixes the
+follower's timeline up. Reading the feed is then a lookup of precomputed
+tweet ids instead of the ``IN (followings) OR user=me`` scan.
+
+Timelines keep the newest ``TIMELINE_MAX_LENGTH`` tweets: follows trim
+the follower's timeline right away, fan-out pushes are trimmed by
+``manage.py trim_timelines`` (run it periodically, e.g. from cron) so a
+tweet does not cost one extra query per follower.
+"""
+
+# Python
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+# Django
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Subquery
+from django.utils.module_loading import import_string
+
+# Models
+from tweets.models import Tweet, TimelineEntry
+from users.models import FollowRelation
+
+TIMELINE_MAX_LENGTH = getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+
+
+class BaseTimelineStore:
+    """Timeline store interface"""
+
+    def push(self, tweet, owner_ids):
+        """Add ``tweet`` to the timelines of ``owner_ids``"""
+        raise NotImplementedError
+
+    def follow(self, owner, author):
+        """Backfill ``owner``'s timeline with ``author``'s recent tweets"""
+        raise NotImplementedError
+
+    def unfollow(self, owner, author):
+        """Remove ``author``'s tweets from ``owner``'s timeline"""
+        raise NotImplementedError
+
+    def tweet_ids(self, owner):
+        """Tweet ids in ``owner``'s timeline, usable in ``id__in`` lookups"""
+        raise NotImplementedError
+
+    def clear(self, owner):
+        """Drop ``owner``'s timeline"""
+        raise NotImplementedError
+
+    def replace(self, owner, tweets):
+        """Swap ``owner``'s timeline for ``tweets`` in one step"""
+        raise NotImplementedError
+
+    def trim(self, owner_ids=None):
+        """Keep the newest ``TIMELINE_MAX_LENGTH`` tweets of each timeline; returns how many were dropped"""
+        raise NotImplementedError
+
+    def fan_out(self, tweet):
+        """Push a new tweet to its author and every follower"""
+        follower_ids = FollowRelation.objects.filter(
+            following_id=tweet.user_id
+        ).values_list('follower_id', flat=True)
+        self.push(tweet, [tweet.user_id, *follower_ids])
+
+    def recent_tweets(self, author):
+        return Tweet.objects.filter(user=author).only('id', 'user_id').order_by('-id')[:TIMELINE_MAX_LENGTH]
+
+
+class DatabaseTimelineStore(BaseTimelineStore):
+    """Timelines stored in the ``TimelineEntry`` table"""
+
+    def push(self, tweet, owner_ids):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, tweet=tweet) for owner_id in set(owner_ids)],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    def follow(self, owner, author):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner=owner, tweet=tweet) for tweet in self.recent_tweets(author)],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+        self.trim([owner.id])
+
+    def unfollow(self, owner, author):
+        TimelineEntry.objects.filter(owner=owner, tweet__user=author).delete()
+
+    def tweet_ids(self, owner):
+        return TimelineEntry.objects.filter(owner_id=owner.id).values_list('tweet_id', flat=True)
+
+    def clear(self, owner):
+        TimelineEntry.objects.filter(owner_id=owner.id).delete()
+
+    def replace(self, owner, tweets):
+        with transaction.atomic():
+            self.clear(owner)
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(owner_id=owner.id, tweet_id=tweet.id) for tweet in tweets],
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+
+    def trim(self, owner_ids=None):
+        if owner_ids is None:
+            owner_ids = TimelineEntry.objects.order_by().values('owner_id').annotate(
+                total=Count('id')
+            ).filter(total__gt=TIMELINE_MAX_LENGTH).values_list('owner_id', flat=True)
+        dropped = 0
+        for owner_id in owner_ids:
+            # Served by the (owner, tweet) unique index
+            oldest_kept = TimelineEntry.objects.filter(owner_id=owner_id).order_by('-tweet_id').values(
+                'tweet_id'
+            )[TIMELINE_MAX_LENGTH - 1:TIMELINE_MAX_LENGTH]
+            dropped += TimelineEntry.objects.filter(
+                owner_id=owner_id, tweet_id__lt=Subquery(oldest_kept)
+            ).delete()[0]
+        return dropped
+
+
+class InMemoryTimelineStore(BaseTimelineStore):
+    """Process local timelines, for tests and development servers.
+
+    Each timeline keeps at most ``TIMELINE_MAX_LENGTH`` tweets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # owner id -> [(tweet id, author id)], newest (highest id) first
+        self._timelines = defaultdict(list)
+
+    def _insert(self, owner_id, entries):
+        timeline = self._timelines[owner_id]
+        known = {tweet_id for tweet_id, _ in timeline}
+        timeline.extend(entry for entry in entries if entry[0] not in known)
+        timeline.sort(reverse=True)
+        del timeline[TIMELINE_MAX_LENGTH:]
+
+    def push(self, tweet, owner_ids):
+        entry = (tweet.id, tweet.user_id)
+        with self._lock:
+            for owner_id in set(owner_ids):
+                self._insert(owner_id, [entry])
+
+    def follow(self, owner, author):
+        entries = [(tweet.id, tweet.user_id) for tweet in self.recent_tweets(author)]
+        with self._lock:
+            self._insert(owner.id, entries)
+
+    def unfollow(self, owner, author):
+        with self._lock:
+            timeline = self._timelines.get(owner.id, [])
+            timeline[:] = [entry for entry in timeline if entry[1] != author.id]
+
+    def tweet_ids(self, owner):
+        with self._lock:
+            return [tweet_id for tweet_id, _ in self._timelines.get(owner.id, [])]
+
+    def clear(self, owner):
+        with self._lock:
+            self._timelines.pop(owner.id, None)
+
+    def replace(self, owner, tweets):
+        entries = [(tweet.id, tweet.user_id) for tweet in tweets]
+        with self._lock:
+            self._timelines.pop(owner.id, None)
+            self._insert(owner.id, entries)
+
+    def trim(self, owner_ids=None):
+        # Timelines are trimmed on insert
+        return 0
+
+
+@lru_cache(maxsize=None)
+def get_timeline_store():
+    """Return the store configured in ``settings.TIMELINE_STORE``"""
+    return import_string(settings.TIMELINE_STORE)()
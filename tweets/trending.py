@@ -0,0 +1,250 @@
+"""Trending hashtags and terms
+
+Counts are kept in memory as a stream instead of running ``GROUP BY``
+over the tweets table: each time bucket (one minute by default) holds a
+count-min sketch and a space-saving list of heavy hitters. The top-k of
+the last N minutes adds up the sketch estimates of the candidates of the
+live buckets; buckets older than the window are dropped.
+
+A tweet is counted as soon as it is committed by the process that wrote
+it. Every other process follows the tweet stream by id range: each scan
+starts ``TRENDING_OVERLAP_SECONDS`` before the end of the previous one
+and skips the ids already counted, so tweets committed out of id order
+(ids are generated before the insert commits) are still counted once.
+Results are cached for ``TRENDING_TICK`` seconds.
+"""
+
+# Python
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+# Django
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+# Models
+from tweets.models import Tweet
+
+# Utils
+from utils.ids import datetime_to_id, id_to_datetime
+
+# Hashtags and mentions
+from tweets.entities import HASHTAG_RE, MENTION_RE
+
+TRENDING_WINDOW_MINUTES = getattr(settings, 'TRENDING_WINDOW_MINUTES', 60)
+TRENDING_BUCKET_SECONDS = getattr(settings, 'TRENDING_BUCKET_SECONDS', 60)
+TRENDING_TICK = getattr(settings, 'TRENDING_TICK', 30)
+TRENDING_OVERLAP_SECONDS = getattr(settings, 'TRENDING_OVERLAP_SECONDS', 120)
+
+TERM_RE = re.compile(r'[^\W\d_]{3,}', re.UNICODE)
+URL_RE = re.compile(r'https?://\S+')
+STOPWORDS = frozenset('''
+    que los las del con por para una uno unos unas como pero sus más mas muy sin sobre este esta
+    esto eso ese esa hay fue son está estan están ser han hoy ya también tambien porque cuando
+    todo todos nos les the and for you with this that are was have not but
+'''.split())
+
+
+def parse_terms(content):
+    """Hashtags and plain terms of ``content``, lowercased"""
+    content = URL_RE.sub(' ', content or '')
+    hashtags = {tag.lower() for tag in HASHTAG_RE.findall(content)}
+    text = MENTION_RE.sub(' ', HASHTAG_RE.sub(' ', content))
+    terms = {term for term in (word.lower() for word in TERM_RE.findall(text)) if term not in STOPWORDS}
+    return hashtags, terms
+
+
+class CountMinSketch:
+    """Approximate counts in ``depth`` rows of ``width`` counters; never under-counts"""
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def indexes(self, item):
+        # Double hashing: row i uses h1 + i * h2
+        h = hash(item)
+        h1, h2 = h & 0xffffffff, (h >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, item, count=1):
+        estimate = None
+        for row, index in zip(self.rows, self.indexes(item)):
+            row[index] += count
+            if estimate is None or row[index] < estimate:
+                estimate = row[index]
+        return estimate
+
+    def estimate(self, item):
+        return min(row[index] for row, index in zip(self.rows, self.indexes(item)))
+
+
+class SpaceSaving:
+    """At most ``capacity`` heavy-hitter candidates (space-saving algorithm)"""
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, item, count=1):
+        counts = self.counts
+        if item in counts or len(counts) < self.capacity:
+            counts[item] = counts.get(item, 0) + count
+            return
+        victim = min(counts, key=counts.get)
+        counts[item] = counts.pop(victim) + count
+
+    def __iter__(self):
+        return iter(self.counts)
+
+
+class Bucket:
+    def __init__(self, width, depth, capacity):
+        self.sketch = CountMinSketch(width, depth)
+        self.candidates = SpaceSaving(capacity)
+
+    def add(self, item):
+        self.sketch.add(item)
+        self.candidates.add(item)
+
+
+class SlidingTopK:
+    """Top-k items of a sliding time window of buckets"""
+
+    def __init__(self, window_seconds, bucket_seconds=60, width=2048, depth=4, capacity=100):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.buckets = OrderedDict()
+
+    def add(self, items, timestamp):
+        """Count ``items`` once each at ``timestamp`` (seconds)"""
+        bucket_id = int(timestamp // self.bucket_seconds)
+        bucket = self.buckets.get(bucket_id)
+        if bucket is None:
+            bucket = self.buckets[bucket_id] = Bucket(self.width, self.depth, self.capacity)
+            if len(self.buckets) > 1 and bucket_id < next(reversed(self.buckets)):
+                self.buckets = OrderedDict(sorted(self.buckets.items()))
+        for item in items:
+            bucket.add(item)
+
+    def expire(self, now):
+        oldest = int((now - self.window_seconds) // self.bucket_seconds)
+        for bucket_id in [bucket_id for bucket_id in self.buckets if bucket_id <= oldest]:
+            del self.buckets[bucket_id]
+
+    def top(self, k, now, seconds=None):
+        """``[(item, estimated count)]`` of the last ``seconds``, most frequent first"""
+        seconds = min(seconds or self.window_seconds, self.window_seconds)
+        oldest = int((now - seconds) // self.bucket_seconds)
+        buckets = [bucket for bucket_id, bucket in self.buckets.items() if bucket_id > oldest]
+
+        candidates = set()
+        for bucket in buckets:
+            candidates.update(bucket.candidates)
+        counts = [
+            (item, sum(bucket.sketch.estimate(item) for bucket in buckets))
+            for item in candidates
+        ]
+        counts.sort(key=lambda pair: (-pair[1], pair[0]))
+        return counts[:k]
+
+
+class TrendingTopics:
+    """Trending hashtags and terms of the tweet stream"""
+
+    batch_size = 1000
+
+    def __init__(self, window_minutes=TRENDING_WINDOW_MINUTES, bucket_seconds=TRENDING_BUCKET_SECONDS,
+                 overlap_seconds=TRENDING_OVERLAP_SECONDS):
+        self.window_seconds = window_minutes * 60
+        self.bucket_seconds = bucket_seconds
+        self.overlap_seconds = overlap_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every count; the next ``ingest`` reloads the window"""
+        self.hashtags = SlidingTopK(self.window_seconds, self.bucket_seconds)
+        self.terms = SlidingTopK(self.window_seconds, self.bucket_seconds)
+        self.scanned_until = None
+        # Ids counted within the overlap, a scan may see them again
+        self.seen = set()
+
+    def record(self, tweet_id, content, timestamp):
+        """Count a tweet once; returns whether it was new"""
+        if tweet_id in self.seen:
+            return False
+        self.seen.add(tweet_id)
+        hashtags, terms = parse_terms(content)
+        self.hashtags.add(hashtags, timestamp)
+        self.terms.add(terms, timestamp)
+        return True
+
+    def record_tweet(self, tweet):
+        """Count a tweet just committed by this process"""
+        with self._lock:
+            if self.scanned_until is not None:
+                self.record(tweet.id, tweet.content, tweet.created.timestamp())
+
+    def ingest(self):
+        """Count the tweets committed since the last call"""
+        with self._lock:
+            now = timezone.now()
+            if self.scanned_until is None:
+                start = now - timedelta(seconds=self.window_seconds)
+            else:
+                start = self.scanned_until - timedelta(seconds=self.overlap_seconds)
+
+            last_id = datetime_to_id(start) - 1
+            while True:
+                rows = list(
+                    Tweet.objects.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'created', 'content')[:self.batch_size]
+                )
+                for tweet_id, created, content in rows:
+                    self.record(tweet_id, content, created.timestamp())
+                if len(rows) < self.batch_size:
+                    break
+                last_id = rows[-1][0]
+
+            self.scanned_until = now
+            horizon = now - timedelta(seconds=self.overlap_seconds)
+            self.seen = {tweet_id for tweet_id in self.seen if id_to_datetime(tweet_id) >= horizon}
+            self.hashtags.expire(now.timestamp())
+            self.terms.expire(now.timestamp())
+
+    def top(self, k=10, minutes=None):
+        now = time.time()
+        seconds = minutes * 60 if minutes else None
+        with self._lock:
+            return {
+                'hashtags': self.hashtags.top(k, now, seconds),
+                'terms': self.terms.top(k, now, seconds),
+            }
+
+
+trending_topics = TrendingTopics()
+
+
+def get_trending(k=10, minutes=TRENDING_WINDOW_MINUTES):
+    """Trending hashtags and terms, recomputed at most once per tick"""
+    key = 'tweets:trending:{}:{}'.format(k, minutes)
+    data = cache.get(key)
+    if data is None:
+        trending_topics.ingest()
+        top = trending_topics.top(k, minutes)
+        data = {
+            'minutes': minutes,
+            'hashtags': [{'hashtag': tag, 'count': count} for tag, count in top['hashtags']],
+            'terms': [{'term': term, 'count': count} for term, count in top['terms']],
+        }
+        cache.set(key, data, TRENDING_TICK)
+    return data
@@ -0,0 +1,126 @@
+"""Viewer state
+
+Resolves how the requesting user relates to the rows being rendered
+("do I like this tweet", "do I follow this user") with one set query per
+relation for the whole page, instead of one ``exists()`` per row. Likes
+of archived tweets (``ArchivedTweet.as_tweet``) are read from
+``ArchivedTweetLike``.
+``PageListSerializer`` also resolves the page's author blocks in one go.
+"""
+
+# Django
+from django.db import models
+
+# Django Rest Framework
+from rest_framework import serializers
+
+# Models
+from tweets.models import ArchivedTweetLike, Tweet, TweetLike
+from users.models import User, FollowRelation
+
+# Cache
+from users.cache import AuthorBlocks
+
+
+class ViewerState:
+    """Liked tweets and followed users of ``viewer`` among resolved ids"""
+
+    context_key = 'viewer_state'
+
+    def __init__(self, viewer):
+        self.viewer = viewer
+        self.tweet_ids = set()
+        self.liked_tweet_ids = set()
+        self.user_ids = set()
+        self.followed_user_ids = set()
+
+    @classmethod
+    def from_context(cls, context):
+        """Return the state stored in a serializer context, creating it if needed"""
+        state = context.get(cls.context_key)
+        if state is None:
+            state = cls(context['user'])
+            context[cls.context_key] = state
+        return state
+
+    def resolve(self, instances):
+        """Fetch viewer relationships for every tweet and user in ``instances``"""
+        tweet_ids = set()
+        archived_ids = set()
+        user_ids = set()
+        for instance in instances:
+            if isinstance(instance, Tweet):
+                parent = instance.parent if Tweet.parent.field.is_cached(instance) else None
+                for tweet in [instance, parent]:
+                    if tweet is not None:
+                        (archived_ids if getattr(tweet, 'archived', False) else tweet_ids).add(tweet.id)
+                if instance.parent_id is not None and parent is None:
+                    tweet_ids.add(instance.parent_id)
+            elif isinstance(instance, User):
+                user_ids.add(instance.id)
+        self.resolve_tweets(tweet_ids - self.tweet_ids, archived_ids - self.tweet_ids)
+        self.resolve_users(user_ids - self.user_ids)
+
+    def resolve_tweets(self, tweet_ids, archived_ids=()):
+        if not self.viewer.is_anonymous:
+            for model, ids in [(TweetLike, tweet_ids), (ArchivedTweetLike, archived_ids)]:
+                if ids:
+                    self.liked_tweet_ids.update(model.objects.filter(
+                        user=self.viewer,
+                        tweet_id__in=ids
+                    ).values_list('tweet_id', flat=True))
+        self.tweet_ids.update(tweet_ids, archived_ids)
+
+    def resolve_users(self, user_ids):
+        if not user_ids:
+            return
+        if not self.viewer.is_anonymous:
+            self.followed_user_ids.update(FollowRelation.objects.filter(
+                follower=self.viewer,
+                following_id__in=user_ids
+            ).values_list('following_id', flat=True))
+        self.user_ids.update(user_ids)
+
+    def likes(self, tweet):
+        """Return True if the viewer likes ``tweet``"""
+        if self.viewer.is_anonymous:
+            return False
+        if tweet.id not in self.tweet_ids:
+            if getattr(tweet, 'archived', False):
+                self.resolve_tweets(set(), {tweet.id})
+            else:
+                self.resolve_tweets({tweet.id})
+        return tweet.id in self.liked_tweet_ids
+
+    def follows(self, user):
+        """Return True if the viewer follows ``user``"""
+        if self.viewer.is_anonymous:
+            return False
+        if user.id not in self.user_ids:
+            self.resolve_users({user.id})
+        return user.id in self.followed_user_ids
+
+
+def author_ids(instances):
+    """Ids of the authors rendered for ``instances``, including loaded parents"""
+    user_ids = set()
+    for instance in instances:
+        if isinstance(instance, User):
+            user_ids.add(instance.id)
+            continue
+        user_ids.add(instance.user_id)
+        if isinstance(instance, Tweet) and Tweet.parent.field.is_cached(instance) and instance.parent:
+            user_ids.add(instance.parent.user_id)
+    return user_ids
+
+
+class PageListSerializer(serializers.ListSerializer):
+    """List serializer that resolves viewer state and authors of the page up front"""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        instances = list(iterable)
+        if 'user' in self.context:
+            ViewerState.from_context(self.context).resolve(instances)
+        AuthorBlocks.from_context(self.context).resolve(author_ids(instances))
+        return super(PageListSerializer, self).to_representation(instances)
@@ -1,6 +1,7 @@
 # Django
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.db import transaction
 
 # Django Rest Framework
 from rest_framework.response import Response
@@ -19,35 +20,73 @@ from .serializers import (
     RetweetSerializers,
     BasicTweetSerializer,
     CommentCreateSerializer,
-    CommentSerializer
+    CommentSerializer,
+    EngagementSerializer,
+    TweetBatchQuerySerializer,
+    TrendingQuerySerializer
     )
 
 # Models
-from tweets.models import Tweet, Comment
+from tweets.models import Tweet, Comment, ArchivedComment
 
 # Permissions
 from rest_framework.permissions import IsAuthenticated
 from tweets.permissions import IsOwnerTweet
 
+# Timelines
+from tweets.timelines import get_timeline_store
+
+# Counters
+from tweets.counters import incr_tweet_counter, incr_user_counter
+
+# Cache
+from tweets.cache import (
+    get_parent_id, get_response_cache, response_cache_key, set_parent_id, tweet_cache, RESPONSE_CACHE_TIMEOUT
+)
+
+# Trending
+from tweets.trending import get_trending
+
+# Archive
+from tweets.archive import delete_archived, get_archived
+
+# Utils
+from utils.instrumentation import time_serializer
+from utils.pagination import KeysetPaginationMixin
+from utils.views import CompiledSerializerMixin, EagerLoadingMixin, SerializerTimingMixin
+
 
 
 class TweetViewSet(
+    KeysetPaginationMixin,
+    SerializerTimingMixin,
+    CompiledSerializerMixin,
+    EagerLoadingMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.DestroyModelMixin,
     viewsets.GenericViewSet):
-    """Tweet viewset """
+    """Tweet viewset
+
+    Archived tweets (``manage.py archive_tweets``) are served by retrieve,
+    batch and the comment list, and can be deleted by their owner. Other
+    actions answer 404 for them, and lists and search leave them out.
+    """
     queryset = Tweet.objects.all()
 
     filter_backends = [DjangoFilterBackend]
     filterset_class = TweetFilter
+    keyset_pagination_actions = ['list', 'feed', 'get_comments']
+    # Ranked full-text search, see TweetFilter
+    ranked_query_params = ['content']
+    archive_actions = ['destroy', 'get_comments']
 
 
     def get_permissions(self):
         permissions = []
-        if self.action in ['retweet','like', 'create', 'destroy', 'update', 'partial_update', 'feed', 'comment']:
+        if self.action in ['retweet','like', 'create', 'destroy', 'update', 'partial_update', 'feed', 'comment', 'engagement']:
             permissions.append(IsAuthenticated)
         if self.action in ['destroy', 'update', 'partial_update']:
             permissions.append(IsOwnerTweet)
@@ -62,13 +101,69 @@ class TweetViewSet(
             return RetweetSerializers
         if self.action == 'comment':
             return CommentCreateSerializer
+        if self.action == 'engagement':
+            return EngagementSerializer
         return TweetSerializer
 
+    def get_object(self):
+        try:
+            return super(TweetViewSet, self).get_object()
+        except Http404:
+            if self.action not in self.archive_actions:
+                raise
+            # Slow path: tweets moved out by archive_tweets
+            tweet_id = self.kwargs[self.lookup_field]
+            tweet = get_archived([int(tweet_id)]).get(int(tweet_id)) if str(tweet_id).isdigit() else None
+            if tweet is None:
+                raise
+            self.check_object_permissions(self.request, tweet)
+            return tweet
+
     def get_serializer_context(self):
         context = super(TweetViewSet, self).get_serializer_context()
         context['user'] = self.request.user
         return context
 
+    def cached_response(self, view, request, *args, **kwargs):
+        """Serve anonymous responses of ``view`` from the versioned cache"""
+        if not request.user.is_anonymous:
+            return view(request, *args, **kwargs)
+
+        cache = get_response_cache()
+        tweet_id = kwargs.get(self.lookup_field)
+        parent_id = get_parent_id(tweet_id) if tweet_id is not None else None
+        # Versions are read before the tweet is loaded
+        key = response_cache_key(request, self.action, tweet_id, parent_id)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, status=status.HTTP_200_OK)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            if tweet_id is not None and parent_id is None:
+                parent = response.data.get('parent')
+                set_parent_id(tweet_id, parent['id'] if parent else None)
+                if parent:
+                    # The key lacks the parent version: cache from the next request
+                    return response
+            cache.set(key, response.data, RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super(TweetViewSet, self).list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return self.cached_response(super(TweetViewSet, self).retrieve, request, *args, **kwargs)
+        except Http404:
+            # Slow path: tweets moved out by archive_tweets
+            tweet_id = int(kwargs['pk']) if str(kwargs['pk']).isdigit() else None
+            tweet = get_archived([tweet_id]).get(tweet_id) if tweet_id is not None else None
+            if tweet is None:
+                raise
+        serializer = time_serializer(TweetSerializer(tweet, context=self.get_serializer_context()))
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     def create(self, request, *args, **kwargs):
         serializer_class = self.get_serializer_class()
         context = self.get_serializer_context()
@@ -79,9 +174,22 @@ class TweetViewSet(
         serializer.is_valid(raise_exception=True)
         tweet = serializer.save()
 
-        read_serializer = TweetSerializer(tweet, context=context)
+        read_serializer = time_serializer(TweetSerializer(tweet, context=context))
         return Response(read_serializer.data, status=status.HTTP_201_CREATED)
 
+    def perform_destroy(self, instance):
+        if getattr(instance, 'archived', False):
+            delete_archived(instance)
+            return
+        with transaction.atomic():
+            # A concurrent delete of the same tweet removes nothing here
+            deleted, _ = Tweet.objects.filter(pk=instance.pk).delete()
+            if not deleted:
+                return
+            incr_user_counter(instance.user_id, 'tweet_count', -1)
+            if instance.parent_id is not None:
+                incr_tweet_counter(instance.parent_id, 'retweet_count', -1)
+
 
     @action(detail=True, methods=['post'])
     def like(self, request, *args, **kwargs):
@@ -95,8 +203,8 @@ class TweetViewSet(
             }
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response({}, status=status.HTTP_200_OK)
+        result = serializer.save()
+        return Response(result, status=status.HTTP_200_OK)
 
 
     @action(detail=True, methods=['post'])
@@ -112,25 +220,53 @@ class TweetViewSet(
         )
         serializer.is_valid(raise_exception=True)
         newTweet = serializer.save()
-        serializer_new = TweetSerializer(newTweet, context=context)
+        serializer_new = time_serializer(TweetSerializer(newTweet, context=context))
         return Response(serializer_new.data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['get'])
     def feed(self, request, *args, **kwargs):
         user = request.user
-        qs = Tweet.objects.all().feed(user)
-        page = self.paginate_queryset(qs)
+        tweet_ids = get_timeline_store().tweet_ids(user)
+        qs = Tweet.objects.filter(id__in=tweet_ids).only('id', 'created', 'parent_id').order_by('-id')
+        return self.paginated_response(qs, TweetSerializer, hydrate=tweet_cache.hydrate)
 
-        context = self.get_serializer_context()
-        serializer = TweetSerializer(
-            page,
-            many=True,
-            context=context
-        )
+    @action(detail=False, methods=['get'])
+    def batch(self, request, *args, **kwargs):
+        """Tweets by id (``?ids=3,1,2``), in the requested order"""
+        query = TweetBatchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ids = query.validated_data['ids']
+
+        tweets = tweet_cache.get_ordered(ids)
+        found = {tweet.id for tweet in tweets}
+        if len(found) < len(ids):
+            archived = get_archived([tweet_id for tweet_id in ids if tweet_id not in found])
+            if archived:
+                live = {tweet.id: tweet for tweet in tweets}
+                live.update(archived)
+                tweets = [live[tweet_id] for tweet_id in ids if tweet_id in live]
+                found = set(live)
+        serializer = self.get_list_serializer(TweetSerializer, tweets)
+        return Response({
+            'results': serializer.data,
+            'missing': [tweet_id for tweet_id in ids if tweet_id not in found]
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def engagement(self, request, *args, **kwargs):
+        """Apply a batch of likes, unlikes, follows and unfollows"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        return Response(result, status=status.HTTP_200_OK)
 
-        result = self.get_paginated_response(serializer.data)
-        
-        return Response(result.data, status=status.HTTP_200_OK)
+    @action(detail=False, methods=['get'])
+    def trending(self, request, *args, **kwargs):
+        """Top hashtags and terms of the last ``minutes``"""
+        serializer = TrendingQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = get_trending(**serializer.validated_data)
+        return Response(data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'])
     def comment(self, request, *args, **kwargs):
@@ -151,14 +287,8 @@ class TweetViewSet(
     @comment.mapping.get
     def get_comments(self, request, pk=None):
         tweet = self.get_object()
-        context = self.get_serializer_context()
-        qs = Comment.objects.filter(tweet=tweet)
-
-        page = self.paginate_queryset(qs)
-        serializer = CommentSerializer(
-            page,
-            many=True,
-            context=context
-        )
-        result = self.get_paginated_response(serializer.data)
-        return Response(result.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        if getattr(tweet, 'archived', False):
+            qs = ArchivedComment.objects.filter(tweet_id=tweet.id)
+        else:
+            qs = Comment.objects.filter(tweet=tweet)
+        return self.paginated_response(qs, CommentSerializer)
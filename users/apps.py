@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     name = 'users'
     verbose_name = 'users'
+
+    def ready(self):
+        from users import signals  # noqa: F401
+        from utils import checks  # noqa: F401
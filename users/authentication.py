@@ -0,0 +1,129 @@
+"""Users authentication
+
+``CachedJWTAuthentication`` is simplejwt's ``JWTAuthentication`` without
+the ``User`` query on read-only requests (``GET``, ``HEAD``, ``OPTIONS``):
+
+- By default the user row is cached for ``AUTH_USER_CACHE_TIMEOUT``
+  seconds and invalidated whenever the user is saved.
+- With ``AUTH_TRUST_TOKEN_CLAIMS`` the user is built from the claims
+  ``MyTokenObtainPairSerializer.get_token`` embeds (``username``,
+  ``nombre``, ``a_paterno``) and the cache is only asked whether the user
+  was found active recently. Other fields of such users are deferred, so
+  reading one loads the row.
+
+Both fail closed: the row and the "active" marker are only written after
+loading an active user and expire after ``AUTH_USER_CACHE_TIMEOUT``
+seconds, and saving or deleting a user drops them. Anything missing
+(evicted, cache restarted, never written) loads the row, so deactivations
+the signals never see (``queryset.update()``) take effect within the
+timeout. Writes and tokens without those claims always load the row.
+
+Deactivations only reach the other worker processes through a cache they
+all share: a process-local ``AUTH_USER_CACHE`` or ``AUTH_MARKER_CACHE``
+fails the ``users.E001`` system check.
+"""
+
+# Django
+from django.conf import settings
+from django.core.cache import caches
+
+# Django REST Framework
+from rest_framework.permissions import SAFE_METHODS
+
+# Jwt
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Models
+from users.models import User
+
+AUTH_USER_CACHE = getattr(settings, 'AUTH_USER_CACHE', 'default')
+AUTH_MARKER_CACHE = getattr(settings, 'AUTH_MARKER_CACHE', AUTH_USER_CACHE)
+AUTH_USER_CACHE_TIMEOUT = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60)
+AUTH_TRUST_TOKEN_CLAIMS = getattr(settings, 'AUTH_TRUST_TOKEN_CLAIMS', False)
+
+# Token claim -> User field
+TOKEN_CLAIMS = {'username': 'username', 'nombre': 'nombre', 'a_paterno': 'apellido_paterno'}
+# Never cached
+PRIVATE_FIELDS = {'password'}
+
+
+def user_key(user_id):
+    return 'users:auth:{}'.format(user_id)
+
+
+def active_key(user_id):
+    return 'users:auth:active:{}'.format(user_id)
+
+
+def user_changed(user, deleted=False):
+    """Drop the cached row and the active marker of ``user``"""
+    caches[AUTH_USER_CACHE].delete(user_key(user.id))
+    caches[AUTH_MARKER_CACHE].delete(active_key(user.id))
+
+
+def _from_db(**fields):
+    """A ``User`` instance as if it had been loaded from the database"""
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in fields]
+    return User.from_db('default', names, [fields[name] for name in names])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT authentication resolving the user from a cache or the token on reads"""
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if request.method in SAFE_METHODS:
+            user = self.get_cached_user(validated_token)
+        else:
+            user = self.get_user(validated_token)
+        return user, validated_token
+
+    @property
+    def cache(self):
+        return caches[AUTH_USER_CACHE]
+
+    @property
+    def marker_cache(self):
+        return caches[AUTH_MARKER_CACHE]
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+    def get_cached_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+
+        if AUTH_TRUST_TOKEN_CLAIMS and all(claim in validated_token for claim in TOKEN_CLAIMS):
+            if self.marker_cache.get(active_key(user_id)):
+                fields = {field: validated_token[claim] for claim, field in TOKEN_CLAIMS.items()}
+                return _from_db(id=user_id, is_active=True, **fields)
+            # get_user rejects inactive and deleted users
+            user = self.get_user(validated_token)
+            self.marker_cache.set(active_key(user_id), True, AUTH_USER_CACHE_TIMEOUT)
+            return user
+
+        row = self.cache.get(user_key(user_id))
+        if row is not None:
+            return _from_db(**row)
+        user = self.get_user(validated_token)
+        self.cache.set(user_key(user_id), self.to_row(user), AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+    def to_row(self, user):
+        return {
+            field.attname: getattr(user, field.attname)
+            for field in User._meta.concrete_fields
+            if field.attname not in PRIVATE_FIELDS
+        }
@@ -0,0 +1,129 @@
+"""Users caches
+
+Tweets, retweet parents, comments and follower lists all embed the same
+``UserProfileSerializer`` block for their author. Blocks are cached across
+requests by user id and resolved for a whole page with one multi-get.
+"""
+
+# Django
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+# Models
+from users.models import User
+
+# Utils
+from utils.instrumentation import object_cache_hits, object_cache_misses
+
+AUTHOR_CACHE = getattr(settings, 'AUTHOR_CACHE', 'default')
+AUTHOR_CACHE_TIMEOUT = getattr(settings, 'AUTHOR_CACHE_TIMEOUT', 600)
+
+
+class AuthorCache:
+    """Serialized author blocks by user id.
+
+    Blocks are rendered without a request, so picture and rendition URLs are stored
+    relative and made absolute when a block is embedded.
+    """
+    serializer_class = 'users.serializers.users.UserProfileSerializer'
+
+    def __init__(self, name, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+        self.name = name
+        object_cache_hits.declare(name)
+        object_cache_misses.declare(name)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, user_id):
+        return 'users:author:{}'.format(user_id)
+
+    def get_many(self, user_ids):
+        """Return ``{id: block}`` for ``user_ids``; misses are loaded in one query"""
+        keys = {self.key(user_id): user_id for user_id in set(user_ids)}
+        found = self.cache.get_many(list(keys))
+        blocks = {keys[key]: block for key, block in found.items()}
+
+        missing = set(keys.values()) - set(blocks)
+        if missing:
+            serializer_class = import_string(self.serializer_class)
+            users = User.objects.filter(id__in=missing).select_related('profile')
+            fresh = {user.id: dict(serializer_class(user).data) for user in users}
+            self.cache.set_many(
+                {self.key(user_id): block for user_id, block in fresh.items()},
+                self.timeout
+            )
+            blocks.update(fresh)
+
+        object_cache_hits.inc(self.name, len(keys) - len(missing))
+        object_cache_misses.inc(self.name, len(missing))
+        return blocks
+
+    def invalidate(self, *user_ids):
+        self.cache.delete_many([self.key(user_id) for user_id in user_ids])
+
+    @property
+    def hits(self):
+        return object_cache_hits.get(self.name)
+
+    @property
+    def misses(self):
+        return object_cache_misses.get(self.name)
+
+    def stats(self):
+        """Hits and misses of this process"""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+author_cache = AuthorCache('authors', AUTHOR_CACHE, AUTHOR_CACHE_TIMEOUT)
+
+
+class AuthorBlocks:
+    """Author blocks of the rows rendered in one response"""
+
+    context_key = 'author_blocks'
+
+    def __init__(self, request=None):
+        self.request = request
+        self.blocks = {}
+
+    @classmethod
+    def from_context(cls, context):
+        """Return the blocks stored in a serializer context, creating them if needed"""
+        blocks = context.get(cls.context_key)
+        if blocks is None:
+            blocks = cls(context.get('request'))
+            context[cls.context_key] = blocks
+        return blocks
+
+    def resolve(self, user_ids):
+        """Fetch the blocks of ``user_ids`` not resolved yet"""
+        user_ids = set(user_ids) - set(self.blocks)
+        if user_ids:
+            self.blocks.update(author_cache.get_many(user_ids))
+
+    def get(self, user_id):
+        """Return the author block of ``user_id`` with absolute URLs"""
+        self.resolve([user_id])
+        block = self.blocks.get(user_id)
+        if block is None:
+            return None
+
+        block = dict(block)
+        profile = block.get('profile')
+        if profile and self.request is not None:
+            absolute = self.request.build_absolute_uri
+            profile = dict(profile)
+            if profile.get('picture'):
+                profile['picture'] = absolute(profile['picture'])
+            if profile.get('picture_renditions'):
+                profile['picture_renditions'] = [
+                    dict(rendition, url=absolute(rendition['url']))
+                    for rendition in profile['picture_renditions']
+                ]
+            block['profile'] = profile
+        return block
@@ -0,0 +1,49 @@
+# Generated by Django 2.2 on 2026-10-18 10:32
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+def _count(model, field):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        total=Count('pk')
+    ).values('total')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def count_user_engagement(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    FollowRelation = apps.get_model('users', 'FollowRelation')
+    Tweet = apps.get_model('tweets', 'Tweet')
+    User.objects.update(
+        follower_count=_count(FollowRelation, 'following'),
+        following_count=_count(FollowRelation, 'follower'),
+        tweet_count=_count(Tweet, 'user')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_auto_20200706_0045'),
+        ('tweets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='tweet_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_user_engagement, migrations.RunPython.noop),
+    ]
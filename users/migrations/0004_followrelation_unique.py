@@ -0,0 +1,52 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:48
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+def _count(model, field):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        total=Count('pk')
+    ).values('total')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Keep the oldest edge of each (follower, following) and recount the affected users"""
+    User = apps.get_model('users', 'User')
+    FollowRelation = apps.get_model('users', 'FollowRelation')
+
+    duplicates = FollowRelation.objects.values('follower_id', 'following_id').annotate(
+        keep=Min('id'), total=Count('id')
+    ).filter(total__gt=1).order_by()
+    user_ids = set()
+    for row in duplicates.iterator():
+        FollowRelation.objects.filter(
+            follower_id=row['follower_id'], following_id=row['following_id']
+        ).exclude(id=row['keep']).delete()
+        user_ids.update([row['follower_id'], row['following_id']])
+
+    if user_ids:
+        User.objects.filter(id__in=user_ids).update(
+            follower_count=_count(FollowRelation, 'following'),
+            following_count=_count(FollowRelation, 'follower')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='followrelation',
+            unique_together={('follower', 'following')},
+        ),
+        migrations.AddIndex(
+            model_name='followrelation',
+            index=models.Index(fields=['following', 'follower'], name='follow_following_follower_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_followrelation_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='picture_renditions',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
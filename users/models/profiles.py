@@ -17,6 +17,8 @@ class Profile(TweetmeBaseModel):
         blank=True,
         null=True
     )
+    # JSON list of resized copies of ``picture``, see utils.images
+    picture_renditions = models.TextField(blank=True, default='')
 
     biografia = models.TextField(max_length=500, blank=True, null=True)
 
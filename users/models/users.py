@@ -52,6 +52,11 @@ class User(TweetmeBaseModel, AbstractBaseUser):
     is_active = models.BooleanField(default=True)
     is_admin = models.BooleanField(default=False)
 
+    # Denormalized counters, see tweets.counters
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    tweet_count = models.PositiveIntegerField(default=0)
+
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['nombre', 'apellido_paterno', 'email']
 
@@ -63,7 +68,13 @@ class User(TweetmeBaseModel, AbstractBaseUser):
     )
 
     objects = MyUserManager()
-    
+
+    class Meta(TweetmeBaseModel.Meta):
+        indexes = [
+            # Keyset pagination of followers and followings, see utils.pagination
+            models.Index(fields=['created', 'id'], name='user_created_id_idx'),
+        ]
+
     def __str__(self):
         """Return username"""
         return self.username
@@ -71,4 +82,10 @@ class User(TweetmeBaseModel, AbstractBaseUser):
 
 class FollowRelation(TweetmeBaseModel):
     follower = models.ForeignKey(User, related_name='following', on_delete=models.CASCADE);
-    following = models.ForeignKey(User, on_delete=models.CASCADE);
\ No newline at end of file
+    following = models.ForeignKey(User, on_delete=models.CASCADE);
+
+    class Meta(TweetmeBaseModel.Meta):
+        unique_together = ['follower', 'following']
+        indexes = [
+            models.Index(fields=['following', 'follower'], name='follow_following_follower_idx'),
+        ]
\ No newline at end of file
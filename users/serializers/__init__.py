@@ -1,2 +1,3 @@
 from .profiles import *
 from .users import *
+from .authors import *
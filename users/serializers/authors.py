@@ -0,0 +1,22 @@
+"""Author serializers"""
+
+# Django Rest Framework
+from rest_framework import serializers
+
+# Cache
+from users.cache import AuthorBlocks
+
+
+class AuthorField(serializers.Field):
+    """Read only author block, from the author cache.
+
+    Point ``source`` at the foreign key column (``user_id``) so rendering
+    never loads the user row.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super(AuthorField, self).__init__(**kwargs)
+
+    def to_representation(self, user_id):
+        return AuthorBlocks.from_context(self.context).get(user_id)
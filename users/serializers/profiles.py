@@ -5,9 +5,13 @@ from rest_framework import serializers
 # Models
 from users.models import Profile
 
+# Utils
+from utils.serializers import RenditionsField
+
 class ProfileModelSerializer(serializers.ModelSerializer):
     """Profile model serializer"""
+    picture_renditions = RenditionsField('picture')
 
     class Meta:
         model = Profile
-        fields = ['picture', 'biografia']
\ No newline at end of file
+        fields = ['picture', 'picture_renditions', 'biografia']
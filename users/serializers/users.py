@@ -1,6 +1,7 @@
 """User serializers"""
 # Django
 from django.contrib.auth import password_validation
+from django.db import IntegrityError, transaction
 
 # Django REST Framework
 from rest_framework import serializers
@@ -15,6 +16,22 @@ from users.models import User, Profile, FollowRelation
 # Serializers
 from users.serializers.profiles import ProfileModelSerializer
 
+# Jobs
+from tweets.tasks import update_timeline
+from utils.images import process_image
+
+# Counters
+from tweets.counters import incr_user_counter
+
+# Viewer state
+from tweets.viewer import ViewerState, PageListSerializer
+
+# Cache
+from users.cache import AuthorBlocks
+
+# Utils
+from utils.serializers import ImageUploadField
+
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
 
     @classmethod
@@ -53,20 +70,35 @@ class UserProfileSerializer(UserModelSerializer):
 
     class Meta(UserModelSerializer.Meta):
         fields = UserModelSerializer.Meta.fields + ['profile']
+        select_related = ['profile']
 
 
 class UserProfileInformationSerializer(UserProfileSerializer):
     follow_account = serializers.SerializerMethodField(read_only=True)
     
     class Meta(UserProfileSerializer.Meta):
-        fields = UserProfileSerializer.Meta.fields + ['follow_account']
+        fields = UserProfileSerializer.Meta.fields + [
+            'follow_account',
+            'follower_count',
+            'following_count',
+            'tweet_count'
+        ]
+        read_only_fields = ['follower_count', 'following_count', 'tweet_count']
+        list_serializer_class = PageListSerializer
+        # The profile comes from the author cache
+        select_related = []
+        compiled = True
+
+    def to_representation(self, instance):
+        ret = AuthorBlocks.from_context(self.context).get(instance.id)
+        ret['follow_account'] = self.get_follow_account(instance)
+        ret['follower_count'] = instance.follower_count
+        ret['following_count'] = instance.following_count
+        ret['tweet_count'] = instance.tweet_count
+        return ret
     
     def get_follow_account(self, obj):
-        me = self.context['user']
-        if not me.is_anonymous:
-            qs = obj.followers.filter(id=me.id)
-            return qs.exists()
-        return False
+        return ViewerState.from_context(self.context).follows(obj)
 
 
 class UserSignUpSerializer(serializers.Serializer):
@@ -117,7 +149,7 @@ class UserSignUpSerializer(serializers.Serializer):
 
 class UserProfileUpdateSerializer(UserProfileSerializer):
     biografia = serializers.CharField(required=False, write_only=True)
-    picture = serializers.ImageField(required=False, write_only=True)
+    picture = ImageUploadField(required=False, write_only=True)
 
     class Meta(UserProfileSerializer.Meta):
         fields = UserProfileSerializer.Meta.fields + ['biografia', 'picture']
@@ -129,6 +161,8 @@ class UserProfileUpdateSerializer(UserProfileSerializer):
         if 'picture' in data:
             profile.picture = data['picture']
         profile.save()
+        if 'picture' in data:
+            process_image.delay('users.Profile', profile.id, 'picture')
         return super(UserProfileUpdateSerializer, self).update(instance, data)
 
 class FollowUnfollowUserSerializer(serializers.Serializer):
@@ -167,15 +201,26 @@ class FollowUnfollowUserSerializer(serializers.Serializer):
         me = data['seguidor']
         action = data['action']
 
-        if action == 'follow':
-            user.followers.add(me)
-        else:
-            """seguidor_siguiendo = Seguidor.objects.filter(
-                seguidor=me,
-                siguiendo=user
-            )"""
-            # seguidor_siguiendo.delete()
-            user.followers.remove(me)
+        with transaction.atomic():
+            if action == 'follow':
+                try:
+                    with transaction.atomic():
+                        user.followers.add(me)
+                except IntegrityError:
+                    # Concurrent follow of the same user, the edge is unique
+                    raise serializers.ValidationError('Ya sigues a este usuario')
+                delta = 1
+            else:
+                deleted, _ = FollowRelation.objects.filter(follower=me, following=user).delete()
+                if not deleted:
+                    # Concurrent unfollow already removed the edge
+                    raise serializers.ValidationError('No sigues a este usuario')
+                delta = -deleted
+            incr_user_counter(user.id, 'follower_count', delta)
+            incr_user_counter(me.id, 'following_count', delta)
+            update_timeline.delay(me.id, user.id, action == 'follow')
+
+        user.refresh_from_db(fields=['follower_count'])
         return {
-            "count": user.followers.count()
+            "count": user.follower_count
         }
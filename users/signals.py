@@ -0,0 +1,35 @@
+"""Users signals"""
+
+# Django
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# Models
+from users.models import User, Profile
+
+# Cache
+from users.cache import author_cache
+from users.authentication import user_changed
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_author(sender, instance, **kwargs):
+    """User edited or deleted"""
+    transaction.on_commit(lambda: author_cache.invalidate(instance.id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_authenticated_user(sender, instance, signal, **kwargs):
+    """Cached user of ``CachedJWTAuthentication`` outdated"""
+    deleted = signal is post_delete
+    transaction.on_commit(lambda: user_changed(instance, deleted))
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_author(sender, instance, **kwargs):
+    """Profile picture or biography edited"""
+    transaction.on_commit(lambda: author_cache.invalidate(instance.user_id))
@@ -1,3 +1,242 @@
-from django.test import TestCase
+"""Users tests"""
 
-# Create your tests here.
+# Python
+from base64 import b64encode
+from unittest import mock
+
+# Django
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+# Django REST Framework
+from rest_framework.test import APIRequestFactory
+
+# Jwt
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+# Authentication
+from users.authentication import active_key, CachedJWTAuthentication, AUTH_MARKER_CACHE
+from users.serializers import MyTokenObtainPairSerializer
+
+# Models
+from users.models import User, FollowRelation
+
+# Utils
+from utils.checks import check_auth_cache, check_invalidation_caches, check_sticky_cache, check_tweet_caches
+from utils.pagination import KeysetPagination
+
+# Tests
+from tweets.tests import QueryPlanMixin, api_client, clear_caches, create_user
+
+
+class UserQueryCountTestCase(TestCase):
+    """User list endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        self.alice = create_user('alice')
+        self.alice_client = api_client(self.alice)
+        for i in range(6):
+            user = create_user('user{}'.format(i))
+            api_client(user).post('/api/users/alice/follow_unfollow/', {'action': 'follow'})
+            self.alice_client.post('/api/users/user{}/follow_unfollow/'.format(i), {'action': 'follow'})
+        for i in range(6):
+            self.alice_client.post('/api/tweets/', {'content': 'tweet {}'.format(i)})
+        # Counts below are for cold caches
+        clear_caches()
+
+    def assertQueries(self, num, client, url):
+        with self.assertNumQueries(num):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_tweets(self):
+        # user, COUNT, page, tweet cache misses, author cache misses, viewer likes
+        self.assertQueries(6, self.alice_client, '/api/users/alice/tweets/')
+        # user, COUNT, page, tweet cache misses
+        self.assertQueries(4, api_client(), '/api/users/alice/tweets/?page=2')
+        # user, page, viewer likes
+        self.assertQueries(3, self.alice_client, '/api/users/alice/tweets/?cursor=')
+
+    def test_followers(self):
+        # user, COUNT, page, viewer follows, author cache misses
+        response = self.assertQueries(5, self.alice_client, '/api/users/alice/seguidores/')
+        self.assertTrue(all(user['follow_account'] for user in response.data['results']))
+        self.assertQueries(5, self.alice_client, '/api/users/alice/siguiendo/?page=2')
+        # user, page, viewer follows
+        self.assertQueries(3, self.alice_client, '/api/users/alice/siguiendo/?cursor=')
+
+    def test_information(self):
+        # user, viewer follows, author
+        self.assertQueries(3, self.alice_client, '/api/users/user1/information/')
+
+
+class KeysetPaginationTestCase(TestCase):
+    """Cursors walk follower lists (keyed on ``(created, id)``) without gaps"""
+
+    def setUp(self):
+        self.alice = create_user('alice')
+        self.client = api_client(self.alice)
+        self.followers = [create_user('user{}'.format(i)) for i in range(5)]
+        for user in self.followers:
+            api_client(user).post('/api/users/alice/follow_unfollow/', {'action': 'follow'})
+        # Same timestamp for every follower: ties are broken on the id
+        created = timezone.now()
+        User.objects.filter(pk__in=[user.pk for user in self.followers]).update(created=created)
+        clear_caches()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def usernames(self, page):
+        return [user['username'] for user in page['results']]
+
+    def test_round_trip(self):
+        expected = ['user4', 'user3', 'user2', 'user1', 'user0']
+        with mock.patch.object(KeysetPagination, 'page_size', 2):
+            first = self.get('/api/users/alice/seguidores/?cursor=')
+            self.assertIsNone(first['previous'])
+            second = self.get(first['next'])
+            third = self.get(second['next'])
+            self.assertIsNone(third['next'])
+            self.assertEqual(self.usernames(first) + self.usernames(second) + self.usernames(third), expected)
+
+            # Back again, page by page
+            self.assertEqual(self.usernames(self.get(third['previous'])), self.usernames(second))
+            back = self.get(second['previous'])
+            self.assertEqual(self.usernames(back), self.usernames(first))
+            self.assertIsNone(back['previous'])
+            self.assertEqual(self.usernames(self.get(back['next'])), self.usernames(second))
+
+    def test_invalid_cursor(self):
+        cursors = [
+            'no-es-base64!',
+            b64encode(b'i=abc').decode('ascii'),
+            # Followers are keyed on the creation time too
+            b64encode(b'i=1').decode('ascii'),
+            b64encode(b'c=ayer&i=1').decode('ascii'),
+        ]
+        for cursor in cursors:
+            response = self.client.get('/api/users/alice/seguidores/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.data['detail'], 'Cursor inválido')
+
+
+class UserQueryPlanTestCase(QueryPlanMixin, TestCase):
+    """Hot social graph queries are served by indexes"""
+
+    def setUp(self):
+        self.alice = create_user('alice')
+        self.bob = create_user('bobby')
+        api_client(self.bob).post('/api/users/alice/follow_unfollow/', {'action': 'follow'})
+
+    def test_plans(self):
+        self.assertIndexScan(FollowRelation.objects.filter(follower=self.bob, following_id__in=[1, 2]).order_by())
+        self.assertIndexScan(FollowRelation.objects.filter(following=self.alice).order_by().values('follower_id'))
+        self.assertIndexScan(FollowRelation.objects.filter(follower=self.bob).order_by().values('following_id'))
+
+    def test_unique_follow(self):
+        response = api_client(self.bob).post('/api/users/alice/follow_unfollow/', {'action': 'follow'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(FollowRelation.objects.filter(following=self.alice).count(), 1)
+
+
+class CachedJWTAuthenticationTestCase(TransactionTestCase):
+    """Read-only requests resolve the user without a query"""
+
+    def setUp(self):
+        clear_caches()
+        self.alice = create_user('alice')
+        token = MyTokenObtainPairSerializer.get_token(self.alice).access_token
+        self.header = 'JWT {}'.format(token)
+        self.factory = APIRequestFactory()
+        self.authentication = CachedJWTAuthentication()
+
+    def authenticate(self, method='get'):
+        request = getattr(self.factory, method)('/api/tweets/', HTTP_AUTHORIZATION=self.header)
+        return self.authentication.authenticate(request)[0]
+
+    def deactivate(self):
+        self.alice.is_active = False
+        self.alice.save()
+
+    def test_cached_user(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual(user, self.alice)
+        self.assertEqual(user.email, self.alice.email)
+
+        with self.assertNumQueries(1):
+            self.authenticate('post')
+
+        self.deactivate()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    @mock.patch('users.authentication.AUTH_TRUST_TOKEN_CLAIMS', True)
+    def test_token_claims(self):
+        # The first request finds the user active
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual((user.id, user.username), (self.alice.id, 'alice'))
+
+        self.deactivate()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    @mock.patch('users.authentication.AUTH_TRUST_TOKEN_CLAIMS', True)
+    def test_lost_marker(self):
+        self.authenticate()
+        # No signal runs: the user is rejected once the marker expires
+        User.objects.filter(pk=self.alice.pk).update(is_active=False)
+        caches[AUTH_MARKER_CACHE].delete(active_key(self.alice.id))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        # Nor does an unknown user get a marker
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        self.assertIsNone(caches[AUTH_MARKER_CACHE].get(active_key(self.alice.id)))
+
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'invalidation': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+class SharedCacheCheckTestCase(SimpleTestCase):
+    """Features relying on invalidations refuse a per-process cache"""
+
+    def test_auth_cache(self):
+        self.assertEqual(check_auth_cache(None), [])
+        with override_settings(CACHES=LOCMEM_CACHES):
+            self.assertEqual([error.id for error in check_auth_cache(None)], ['users.E001'] * 2)
+
+    def test_sticky_cache(self):
+        with override_settings(CACHES=LOCMEM_CACHES):
+            self.assertEqual(check_sticky_cache(None), [])
+            with override_settings(DATABASE_REPLICAS=['replica']):
+                self.assertEqual([error.id for error in check_sticky_cache(None)], ['utils.E001'])
+
+    def test_tweet_caches(self):
+        self.assertEqual(check_tweet_caches(None), [])
+        with override_settings(CACHES=LOCMEM_CACHES):
+            self.assertEqual([error.id for error in check_tweet_caches(None)], ['tweets.E001'] * 2)
+
+    def test_invalidation_caches(self):
+        self.assertEqual(check_invalidation_caches(None), [])
+        small = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/tmp/tweetme-cache',
+        }
+        with override_settings(CACHES={'default': small, 'invalidation': small}):
+            self.assertEqual([error.id for error in check_invalidation_caches(None)], ['utils.E002'])
+        with override_settings(TWEET_VERSION_CACHE='default'):
+            self.assertEqual([error.id for error in check_invalidation_caches(None)], ['utils.E002'])
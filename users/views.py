@@ -31,6 +31,14 @@ from tweets.serializers import TweetSerializer
 from users.models import User
 from tweets.models import Tweet
 
+# Cache
+from tweets.cache import tweet_cache
+
+# Utils
+from utils.instrumentation import time_serializer
+from utils.pagination import KeysetPaginationMixin
+from utils.views import CompiledSerializerMixin, EagerLoadingMixin, SerializerTimingMixin
+
 class ObtainTokenPairWithColorView(TokenObtainPairView):
     permission_classes = (AllowAny, )
     serializer_class = MyTokenObtainPairSerializer
@@ -51,7 +59,11 @@ class HelloWorldView(APIView):
     def get(self, request):
         return Response(data={"hello":"world"}, status=status.HTTP_200_OK)
 
-class UserViewSet(mixins.RetrieveModelMixin,
+class UserViewSet(KeysetPaginationMixin,
+                    SerializerTimingMixin,
+                    CompiledSerializerMixin,
+                    EagerLoadingMixin,
+                    mixins.RetrieveModelMixin,
                     mixins.ListModelMixin,
                     mixins.UpdateModelMixin,
                     viewsets.GenericViewSet):
@@ -59,6 +71,7 @@ class UserViewSet(mixins.RetrieveModelMixin,
     queryset = User.objects.filter(is_active=True)
     serializer_class = UserProfileSerializer
     lookup_field = 'username'
+    keyset_pagination_actions = ['tweets', 'mentions', 'seguidores', 'siguiendo']
 
     def get_permissions(self):
         permissions = []
@@ -80,25 +93,21 @@ class UserViewSet(mixins.RetrieveModelMixin,
         serializer = UserSignUpSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        return Response(UserProfileSerializer(user).data, status=status.HTTP_201_CREATED)
+        return Response(time_serializer(UserProfileSerializer(user)).data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'])
     def tweets(self,  request, *args, **kwargs):
         """List of tweets"""
         user = self.get_object()
-        queryset = Tweet.objects.filter(user=user)
-        page = self.paginate_queryset(queryset)
-        
-        context = self.get_serializer_context()
-        serializer = TweetSerializer(
-            page, 
-            many=True,
-            context=context
-        )
-        result = self.get_paginated_response(serializer.data)
-        data = result.data
+        queryset = Tweet.objects.filter(user=user).only('id', 'created', 'parent_id')
+        return self.paginated_response(queryset, TweetSerializer, hydrate=tweet_cache.hydrate)
 
-        return Response(data, status=status.HTTP_200_OK)
+    @action(detail=True, methods=['get'])
+    def mentions(self, request, *args, **kwargs):
+        """Tweets mentioning the user"""
+        user = self.get_object()
+        queryset = Tweet.objects.filter(mentions__user=user).only('id', 'created', 'parent_id')
+        return self.paginated_response(queryset, TweetSerializer, hydrate=tweet_cache.hydrate)
 
     @action(detail=True, methods=['post'])
     def follow_unfollow(self, request, *args, **kwargs):
@@ -120,10 +129,10 @@ class UserViewSet(mixins.RetrieveModelMixin,
     def information(self, request, *args, **kwargs):
         context = self.get_serializer_context()
         instance = self.get_object()
-        serializer = UserProfileInformationSerializer(
+        serializer = time_serializer(UserProfileInformationSerializer(
             instance,
             context=context
-        )
+        ))
         return Response(serializer.data, status=status.HTTP_200_OK )
 
     
@@ -131,31 +140,15 @@ class UserViewSet(mixins.RetrieveModelMixin,
     @action(detail=True, methods=['get'])
     def seguidores(self, request, *args, **kwargs):
         user = self.get_object()
-        context = self.get_serializer_context()
         queryset = user.followers.all()
-        page = self.paginate_queryset(queryset)
-        serializer = UserProfileInformationSerializer(
-            page,
-            many=True,
-            context=context
-        )
-        result = self.get_paginated_response(serializer.data)
-        return Response(result.data, status=status.HTTP_200_OK)
+        return self.paginated_response(queryset, UserProfileInformationSerializer)
     
 
     @action(detail=True, methods=['get'])
     def siguiendo(self, request, *args, **kwargs):
         user = self.get_object()
-        context = self.get_serializer_context()
         queryset = user.followings.all()
-        page = self.paginate_queryset(queryset)
-        serializer = UserProfileInformationSerializer(
-            page,
-            many=True,
-            context=context
-        )
-        result = self.get_paginated_response(serializer.data)
-        return Response(result.data, status=status.HTTP_200_OK)
+        return self.paginated_response(queryset, UserProfileInformationSerializer)
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
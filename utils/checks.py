@@ -0,0 +1,112 @@
+"""System checks
+
+Invalidations, deactivation markers and sticky flags are only seen by
+every worker process when they are written to a cache all of them share
+(memcached, redis, the database or file based cache). ``LocMemCache`` is
+private to each process, so the features relying on it are refused with
+a check error; silence the check (``SILENCED_SYSTEM_CHECKS``) only when
+running a single process.
+
+Version tokens and invalidation markers must also survive: file based,
+local memory and database caches evict random entries past
+``MAX_ENTRIES`` (300 by default), so the caches holding them need a
+large one.
+"""
+
+# Django
+from django.conf import settings
+from django.core.checks import Error, register
+
+PROCESS_LOCAL_CACHES = ['django.core.cache.backends.locmem.LocMemCache']
+CULLING_CACHES = [
+    'django.core.cache.backends.db.DatabaseCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+]
+MIN_INVALIDATION_ENTRIES = 100000
+
+
+def is_shared_cache(alias):
+    """Whether every process sees what one process writes to cache ``alias``"""
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    return backend not in PROCESS_LOCAL_CACHES
+
+
+def culls_early(alias):
+    """Whether cache ``alias`` evicts random entries before holding ``MIN_INVALIDATION_ENTRIES``"""
+    config = settings.CACHES.get(alias, {})
+    if config.get('BACKEND', '') not in CULLING_CACHES:
+        return False
+    max_entries = config.get('OPTIONS', {}).get('MAX_ENTRIES', 300)
+    return int(max_entries) < MIN_INVALIDATION_ENTRIES
+
+
+def invalidation_aliases():
+    """Aliases of the caches holding version tokens and invalidation markers"""
+    names = ['TWEET_VERSION_CACHE']
+    authentication = settings.REST_FRAMEWORK.get('DEFAULT_AUTHENTICATION_CLASSES', [])
+    if 'users.authentication.CachedJWTAuthentication' in authentication:
+        names.append('AUTH_MARKER_CACHE')
+    if getattr(settings, 'DATABASE_REPLICAS', []):
+        names.append('DATABASE_STICKY_CACHE')
+    return {getattr(settings, name, 'default') for name in names}
+
+
+def shared_cache_error(alias, feature, id):
+    return Error(
+        'The "{}" cache is private to each process, {}.'.format(alias, feature),
+        hint='Use a cache shared by every process, e.g. FileBasedCache, memcached or redis.',
+        id=id,
+    )
+
+
+@register('caches')
+def check_auth_cache(app_configs, **kwargs):
+    authentication = settings.REST_FRAMEWORK.get('DEFAULT_AUTHENTICATION_CLASSES', [])
+    if 'users.authentication.CachedJWTAuthentication' not in authentication:
+        return []
+    user_alias = getattr(settings, 'AUTH_USER_CACHE', 'default')
+    aliases = {user_alias, getattr(settings, 'AUTH_MARKER_CACHE', user_alias)}
+    return [
+        shared_cache_error(alias, 'deactivated users would keep read access on the other workers', 'users.E001')
+        for alias in sorted(aliases) if not is_shared_cache(alias)
+    ]
+
+
+@register('caches')
+def check_sticky_cache(app_configs, **kwargs):
+    if not getattr(settings, 'DATABASE_REPLICAS', []):
+        return []
+    alias = getattr(settings, 'DATABASE_STICKY_CACHE', 'default')
+    if is_shared_cache(alias):
+        return []
+    return [shared_cache_error(
+        alias, 'writers would read stale replicas on the other workers', 'utils.E001'
+    )]
+
+
+@register('caches')
+def check_tweet_caches(app_configs, **kwargs):
+    aliases = {
+        getattr(settings, name, 'default')
+        for name in ['TWEET_RESPONSE_CACHE', 'TWEET_VERSION_CACHE', 'TWEET_OBJECT_CACHE', 'AUTHOR_CACHE']
+    }
+    return [
+        shared_cache_error(alias, 'edited and deleted tweets would be served by the other workers', 'tweets.E001')
+        for alias in sorted(aliases) if not is_shared_cache(alias)
+    ]
+
+
+@register('caches')
+def check_invalidation_caches(app_configs, **kwargs):
+    return [
+        Error(
+            'The "{}" cache evicts random entries past MAX_ENTRIES, lost version tokens '
+            'and invalidation markers would serve stale data.'.format(alias),
+            hint='Set OPTIONS["MAX_ENTRIES"] to at least {} or use memcached or redis.'.format(
+                MIN_INVALIDATION_ENTRIES
+            ),
+            id='utils.E002',
+        )
+        for alias in sorted(invalidation_aliases()) if culls_early(alias)
+    ]
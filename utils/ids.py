@@ -0,0 +1,211 @@
+"""Time-ordered 64-bit ids
+
+Snowflake layout, most significant bit first::
+
+    0 | 41 bits: ms since ID_EPOCH | 10 bits: worker id | 12 bits: sequence
+
+Ids are generated in-process and sort by creation time. They are unique
+because every process leases a worker id no other live process holds:
+on PostgreSQL with a session advisory lock, elsewhere with a lock file in
+``SNOWFLAKE_LOCK_DIR`` (which only covers one host, fine for SQLite).
+Leases end with the process, forked children lease their own. Rows
+created before the switch keep their small ids, which sort before every
+generated id.
+
+Generated ids are above 2 ** 53, so JavaScript clients must read them as
+strings (``id_str``).
+"""
+
+# Python
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+# 2020-01-01T00:00:00Z in ms
+ID_EPOCH = 1577836800000
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+
+# Key space of the worker id advisory locks (an arbitrary constant)
+ADVISORY_LOCK_CLASS = 0x5f1d
+# How often a process checks it still holds its worker id
+LEASE_CHECK_SECONDS = 30
+
+
+class SnowflakeGenerator:
+    """Thread-safe id generator for one worker id"""
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError('worker_id must be between 0 and {}'.format(MAX_WORKER_ID))
+        self.worker_id = worker_id
+        self.last_ms = -1
+        self.sequence = 0
+        self._lock = threading.Lock()
+
+    def now_ms(self):
+        return int(time.time() * 1000) - ID_EPOCH
+
+    def next_id(self):
+        with self._lock:
+            now = self.now_ms()
+            # The clock went back (NTP step): keep counting from the last
+            # timestamp instead of reusing ids
+            if now < self.last_ms:
+                now = self.last_ms
+            if now == self.last_ms:
+                self.sequence = (self.sequence + 1) & MAX_SEQUENCE
+                if self.sequence == 0:
+                    # 4096 ids in this ms: borrow the next one
+                    now += 1
+            else:
+                self.sequence = 0
+            self.last_ms = now
+            return (now << TIMESTAMP_SHIFT) | (self.worker_id << SEQUENCE_BITS) | self.sequence
+
+
+class WorkerLease:
+    """A worker id held by this process until it exits or ``release``"""
+
+    def __init__(self, worker_id, holder, check=None):
+        self.worker_id = worker_id
+        self.holder = holder
+        self._check = check
+
+    def is_held(self):
+        return self._check is None or self._check()
+
+    def release(self):
+        self.holder.close()
+
+
+def _candidates():
+    """Every worker id, from a random one so processes rarely contend"""
+    start = random.randrange(MAX_WORKER_ID + 1)
+    return [(start + offset) & MAX_WORKER_ID for offset in range(MAX_WORKER_ID + 1)]
+
+
+def _lease_advisory_lock(settings_dict):
+    """PostgreSQL: a session advisory lock on a connection of its own.
+
+    The lock is released by the server when the process (and so the
+    connection) dies, and is not affected by the transactions of the
+    process.
+    """
+    from django.db.utils import load_backend
+    wrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias='snowflake')
+    wrapper.ensure_connection()
+    holder = wrapper.connection
+    holder.autocommit = True
+    lock = threading.Lock()
+
+    with holder.cursor() as cursor:
+        for worker_id in _candidates():
+            cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [ADVISORY_LOCK_CLASS, worker_id])
+            if cursor.fetchone()[0]:
+                break
+        else:
+            holder.close()
+            raise RuntimeError('Every snowflake worker id is taken')
+
+    def check():
+        try:
+            with lock, holder.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid() "
+                    'AND classid = %s AND objid = %s AND granted',
+                    [ADVISORY_LOCK_CLASS, worker_id]
+                )
+                return cursor.fetchone() is not None
+        except holder.Error:
+            return False
+
+    return WorkerLease(worker_id, holder, check)
+
+
+def _lease_lock_file(directory):
+    """Other databases: an exclusive lock on a file, unique on this host only"""
+    import fcntl
+    os.makedirs(directory, exist_ok=True)
+    for worker_id in _candidates():
+        holder = open(os.path.join(directory, '{}.lock'.format(worker_id)), 'a')
+        try:
+            fcntl.flock(holder, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            holder.close()
+            continue
+        return WorkerLease(worker_id, holder)
+    raise RuntimeError('Every snowflake worker id is taken')
+
+
+def lease_worker_id():
+    """Claim a worker id that no other live process holds"""
+    from django.conf import settings
+    from django.db import DEFAULT_DB_ALIAS, connections
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor == 'postgresql':
+        return _lease_advisory_lock(connection.settings_dict)
+    directory = getattr(settings, 'SNOWFLAKE_LOCK_DIR', None)
+    return _lease_lock_file(directory or os.path.join(tempfile.gettempdir(), 'snowflake-workers'))
+
+
+_generator = None
+_generator_pid = None
+_generator_lock = threading.Lock()
+_lease = None
+_lease_checked = 0
+# Leases inherited through fork: kept referenced, closing them would
+# release the parent's lock
+_inherited = []
+
+
+def get_generator():
+    """The generator of this process (a forked child leases its own id)"""
+    global _generator, _generator_pid, _lease, _lease_checked
+    pid = os.getpid()
+    now = time.monotonic()
+    if _generator_pid == pid and now - _lease_checked < LEASE_CHECK_SECONDS:
+        return _generator
+    with _generator_lock:
+        if _generator_pid != pid:
+            if _lease is not None:
+                _inherited.append(_lease)
+            _lease = None
+        elif now - _lease_checked >= LEASE_CHECK_SECONDS and not _lease.is_held():
+            # The lock connection was lost: another process may take our id
+            _inherited.append(_lease)
+            _lease = None
+        if _lease is None:
+            _lease = lease_worker_id()
+            _generator = SnowflakeGenerator(_lease.worker_id)
+            _generator_pid = pid
+        _lease_checked = now
+    return _generator
+
+
+def next_id():
+    """A new time-ordered id; used as the default of snowflake primary keys"""
+    return get_generator().next_id()
+
+
+def id_to_datetime(value):
+    """Creation time encoded in a generated id"""
+    ms = (value >> TIMESTAMP_SHIFT) + ID_EPOCH
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def datetime_to_id(value):
+    """Smallest id generated at or after ``value``, for id range queries"""
+    return max(int(value.timestamp() * 1000) - ID_EPOCH, 0) << TIMESTAMP_SHIFT
+
+
+def has_time_ordered_ids(model):
+    """Whether ``model``'s primary key is a generated id"""
+    return model._meta.pk.default is next_id
@@ -0,0 +1,152 @@
+"""Image pipeline
+
+Uploads are size checked and fully decoded in a process pool before they
+are accepted, so malformed files and decompression bombs are rejected
+without tying up the request thread. Once stored, the ``process_image``
+job re-encodes the original without metadata (EXIF, GPS, ICC) and writes
+one rendition per ``IMAGE_RENDITIONS`` size and ``IMAGE_FORMATS`` format
+next to it. Renditions are recorded as JSON in ``<field>_renditions``,
+each with the ``source`` file it was made from: a retried or repeated job
+finds the file already processed and leaves it alone instead of
+re-encoding (and degrading) it again.
+
+The Pillow work itself lives in ``utils.imaging``, which does not import
+Django so it can run in ``spawn`` workers.
+"""
+
+# Python
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Django
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+# Imaging
+from utils import imaging
+
+# Jobs
+from jobs.queue import job
+
+logger = logging.getLogger(__name__)
+
+IMAGE_RENDITIONS = getattr(settings, 'IMAGE_RENDITIONS', (('small', 320), ('medium', 640), ('large', 1280)))
+IMAGE_FORMATS = getattr(settings, 'IMAGE_FORMATS', ('webp', 'jpeg'))
+IMAGE_MAX_UPLOAD_SIZE = getattr(settings, 'IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+IMAGE_MAX_PIXELS = getattr(settings, 'IMAGE_MAX_PIXELS', 40 * 1000 * 1000)
+IMAGE_PROCESS_WORKERS = getattr(settings, 'IMAGE_PROCESS_WORKERS', 2)
+
+InvalidImage = imaging.InvalidImage
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared process pool, or ``None`` to decode inline"""
+    global _pool
+    if not IMAGE_PROCESS_WORKERS:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(IMAGE_PROCESS_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def run(func, *args):
+    """Run ``func(*args)`` in the process pool and wait for the result"""
+    pool = get_pool()
+    if pool is None:
+        return func(*args)
+    return pool.submit(func, *args).result()
+
+
+def validate_upload(upload):
+    """Check an uploaded file is a supported image; returns ``(format, width, height)``"""
+    if upload.size > IMAGE_MAX_UPLOAD_SIZE:
+        raise InvalidImage('La imagen no puede pesar más de {} MB'.format(IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)))
+    upload.seek(0)
+    data = upload.read()
+    upload.seek(0)
+    return run(imaging.inspect, data, IMAGE_MAX_PIXELS)
+
+
+def load_renditions(value):
+    return json.loads(value) if value else []
+
+
+def rendition_urls(value, storage, request=None):
+    """Public ``{name, format, width, height, url}`` of stored renditions"""
+    renditions = []
+    for rendition in load_renditions(value):
+        url = storage.url(rendition['path'])
+        renditions.append({
+            'name': rendition['name'],
+            'format': rendition['format'],
+            'width': rendition['width'],
+            'height': rendition['height'],
+            'url': request.build_absolute_uri(url) if request is not None else url,
+        })
+    return renditions
+
+
+def _path(name, suffix, fmt):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    if suffix:
+        return os.path.join(directory, 'renditions', '{}_{}.{}'.format(stem, suffix, fmt))
+    return os.path.join(directory, '{}.{}'.format(stem, fmt))
+
+
+@job()
+def process_image(model_label, pk, field_name):
+    """Strip metadata from an uploaded image and generate its renditions"""
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    file = getattr(instance, field_name)
+    if not file:
+        return
+    renditions_field = '{}_renditions'.format(field_name)
+    storage = file.storage
+    previous = load_renditions(getattr(instance, renditions_field))
+    if any(rendition.get('source') == file.name for rendition in previous):
+        return
+
+    with file.open('rb'):
+        data = file.read()
+    try:
+        original, renditions = run(imaging.render, data, IMAGE_RENDITIONS, IMAGE_FORMATS, IMAGE_MAX_PIXELS)
+    except InvalidImage:
+        logger.warning('%s %s: %s is not a valid image', model_label, pk, file.name)
+        return
+
+    stale = [rendition['path'] for rendition in previous]
+    source_format, content = original
+    name = storage.save(_path(file.name, None, source_format), ContentFile(content))
+    if name != file.name:
+        stale.append(file.name)
+
+    stored = [
+        {
+            'name': size_name,
+            'format': fmt,
+            'width': width,
+            'height': height,
+            'path': storage.save(_path(name, size_name, fmt), ContentFile(content)),
+            'source': name,
+        }
+        for size_name, fmt, width, height, content in renditions
+    ]
+
+    setattr(instance, field_name, name)
+    setattr(instance, renditions_field, json.dumps(stored))
+    instance.save(update_fields=[field_name, renditions_field, 'modified'])
+    for path in stale:
+        storage.delete(path)
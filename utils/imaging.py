@@ -0,0 +1,92 @@
+"""Image decoding and encoding
+
+Plain Pillow functions with no Django imports, so they can run in a
+``spawn`` process pool (see utils.images).
+"""
+
+# Python
+from io import BytesIO
+
+# Pillow
+from PIL import Image, ImageOps
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _open(data, max_pixels):
+    try:
+        image = Image.open(BytesIO(data))
+        if image.format not in ALLOWED_FORMATS:
+            raise InvalidImage('Formato de imagen no soportado')
+        # Only the header is read so far. Pillow's own limit just warns
+        # below twice MAX_IMAGE_PIXELS, so check before decoding
+        if image.width * image.height > max_pixels:
+            raise InvalidImage('La imagen no puede tener más de {} píxeles'.format(max_pixels))
+        image.load()
+    except InvalidImage:
+        raise
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise InvalidImage('El archivo no es una imagen válida')
+    return image
+
+
+def inspect(data, max_pixels):
+    """Decode ``data`` fully; returns ``(format, width, height)``"""
+    image = _open(data, max_pixels)
+    return image.format, image.width, image.height
+
+
+def _flatten(image, fmt):
+    """Convert to a mode the target format can store"""
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    return image
+
+
+def _encode(image, fmt):
+    # Saving a fresh image without ``exif``/``icc_profile`` drops all metadata
+    buffer = BytesIO()
+    image = _flatten(image, fmt)
+    clean = Image.new(image.mode, image.size)
+    clean.paste(image)
+    clean.save(buffer, **SAVE_OPTIONS[fmt])
+    return buffer.getvalue()
+
+
+def render(data, sizes, formats, max_pixels):
+    """Strip metadata and resize ``data``.
+
+    Returns ``(original, renditions)``: the full-size image re-encoded
+    without metadata as ``(format, bytes)``, and one
+    ``(name, format, width, height, bytes)`` per size and format. Sizes
+    bound the longest side; images are never upscaled.
+    """
+    image = _open(data, max_pixels)
+    source_format = 'jpeg' if image.format == 'JPEG' else 'webp'
+    # Apply the EXIF orientation before the metadata is dropped
+    image = ImageOps.exif_transpose(image)
+
+    renditions = []
+    produced = set()
+    for name, size in sizes:
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        if resized.size in produced:
+            continue
+        produced.add(resized.size)
+        for fmt in formats:
+            renditions.append((name, fmt, resized.width, resized.height, _encode(resized, fmt)))
+    return (source_format, _encode(image, source_format)), renditions
@@ -0,0 +1,366 @@
+"""Per-request performance instrumentation
+
+``InstrumentationMiddleware`` records, for every request:
+
+- the number of queries, the total database time and the slowest query,
+  through ``execute_wrapper`` on every database alias;
+- the time spent in ``serializer.data`` of views with
+  ``utils.views.SerializerTimingMixin`` (queries run while serializing
+  are counted in both);
+- the time spent rendering the response.
+
+They are sent back in a ``Server-Timing`` header (``SERVER_TIMING``,
+which defaults to ``DEBUG`` as it discloses query counts) and
+aggregated per view action (e.g. ``TweetViewSet.feed``) into histograms,
+served with other gauges by ``utils.metrics`` at ``/metrics``. Requests
+over ``PERFORMANCE_QUERY_BUDGET`` queries or ``PERFORMANCE_LATENCY_BUDGET``
+seconds are logged with their slowest query.
+
+Serializers built by a view itself (e.g. the response of ``create``) are
+timed by wrapping them with ``time_serializer``; those of
+``get_serializer`` and ``paginated_response`` are timed by the mixin.
+
+Histograms and counters are observed in the memory of each process. The
+scrape lands on any worker process, so with ``METRICS_DIR`` every
+process writes its totals there (at most every ``METRICS_FLUSH_SECONDS``
+while it serves requests, and on exit) and ``/metrics`` serves the sum
+of all the files. Files of exited processes are kept so totals never go
+back; empty the directory when the server is (re)started.
+"""
+
+# Python
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+
+# Django
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_state = threading.local()
+
+
+class RequestMetrics:
+    """Counters of one request; times are in seconds"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view = 'unmatched'
+        self.queries = 0
+        self.db_time = 0
+        self.slowest_time = 0
+        self.slowest_sql = None
+        self.serialize_time = 0
+        self.render_time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """``execute_wrapper`` timing every query"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            if duration >= self.slowest_time:
+                self.slowest_time = duration
+                self.slowest_sql = sql
+
+    def server_timing(self, total):
+        entries = [
+            ('db', self.db_time, '{} queries'.format(self.queries)),
+            ('db-slowest', self.slowest_time, None),
+            ('serialize', self.serialize_time, None),
+            ('render', self.render_time, None),
+            ('total', total, None),
+        ]
+        return ', '.join(
+            '{};dur={:.1f}'.format(name, duration * 1000) + (';desc="{}"'.format(desc) if desc else '')
+            for name, duration, desc in entries
+        )
+
+
+def current_metrics():
+    """Metrics of the request being handled by this thread, if any"""
+    return getattr(_state, 'metrics', None)
+
+
+def time_serializer(serializer):
+    """Add the time spent in ``serializer.to_representation`` to the request's"""
+    to_representation = serializer.to_representation
+
+    def timed(instance):
+        start = time.perf_counter()
+        try:
+            return to_representation(instance)
+        finally:
+            metrics = current_metrics()
+            if metrics is not None:
+                metrics.serialize_time += time.perf_counter() - start
+
+    serializer.to_representation = timed
+    return serializer
+
+
+def view_name(view_func, method):
+    """``<ViewSet>.<action>`` for viewsets, the dotted path of other views"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return '{}.{}'.format(view_func.__module__, view_func.__name__)
+    actions = getattr(view_func, 'actions', None) or {}
+    return '{}.{}'.format(cls.__name__, actions.get(method.lower(), method.lower()))
+
+
+class Histogram:
+    """Prometheus histogram with a ``view`` label"""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, value):
+        with self._lock:
+            counts = self.series.setdefault(view, [0] * len(self.buckets) + [0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def snapshot(self):
+        """``{view: [bucket counts..., sum, count]}``"""
+        with self._lock:
+            return {view: list(counts) for view, counts in self.series.items()}
+
+    def samples(self, series=None):
+        """Lines of the Prometheus text format, of ``series`` or of this process"""
+        if series is None:
+            series = self.snapshot()
+        yield '# HELP {} {}'.format(self.name, self.documentation)
+        yield '# TYPE {} histogram'.format(self.name)
+        for view, counts in sorted(series.items()):
+            for bound, count in zip(self.buckets, counts):
+                yield '{}_bucket{{view="{}",le="{}"}} {}'.format(self.name, view, bound, count)
+            yield '{}_bucket{{view="{}",le="+Inf"}} {}'.format(self.name, view, counts[-1])
+            yield '{}_sum{{view="{}"}} {}'.format(self.name, view, round(counts[-2], 6))
+            yield '{}_count{{view="{}"}} {}'.format(self.name, view, counts[-1])
+
+    def reset(self):
+        with self._lock:
+            self.series.clear()
+
+
+request_duration = Histogram('http_request_duration_seconds', 'Request latency', DURATION_BUCKETS)
+request_queries = Histogram('http_request_db_queries', 'Queries per request', QUERY_BUCKETS)
+request_db_duration = Histogram('http_request_db_seconds', 'Database time per request', DURATION_BUCKETS)
+request_serialize_duration = Histogram(
+    'http_request_serialize_seconds', 'Serializer time per request', DURATION_BUCKETS
+)
+request_render_duration = Histogram('http_request_render_seconds', 'Render time per request', DURATION_BUCKETS)
+
+HISTOGRAMS = [
+    request_duration, request_queries, request_db_duration, request_serialize_duration, request_render_duration
+]
+
+
+class Counter:
+    """Prometheus counter with one label"""
+
+    def __init__(self, name, documentation, label):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.series = {}
+        # Label values reported even before their first increment
+        self.values = set()
+        self._lock = threading.Lock()
+
+    def declare(self, value):
+        self.values.add(value)
+
+    def inc(self, value, amount=1):
+        with self._lock:
+            self.series[value] = self.series.get(value, 0) + amount
+
+    def get(self, value):
+        with self._lock:
+            return self.series.get(value, 0)
+
+    def snapshot(self):
+        """``{label value: total}``"""
+        with self._lock:
+            return dict(self.series)
+
+    def samples(self, series=None):
+        """Lines of the Prometheus text format, of ``series`` or of this process"""
+        if series is None:
+            series = self.snapshot()
+        yield '# HELP {} {}'.format(self.name, self.documentation)
+        yield '# TYPE {} counter'.format(self.name)
+        series = dict({value: 0 for value in self.values}, **series)
+        for value, total in sorted(series.items()):
+            yield '{}{{{}="{}"}} {}'.format(self.name, self.label, value, total)
+
+    def reset(self):
+        with self._lock:
+            self.series.clear()
+
+
+object_cache_hits = Counter('object_cache_hits_total', 'Object cache hits', 'cache')
+object_cache_misses = Counter('object_cache_misses_total', 'Object cache misses', 'cache')
+
+COUNTERS = [object_cache_hits, object_cache_misses]
+METRICS = HISTOGRAMS + COUNTERS
+
+# File of this process in METRICS_DIR, named on the first flush
+_store = {'filename': None, 'flushed': 0}
+_store_lock = threading.Lock()
+
+
+def flush(directory):
+    """Write the totals of this process to its file in ``directory``"""
+    with _store_lock:
+        if _store['filename'] is None:
+            _store['filename'] = '{}-{}.json'.format(os.getpid(), uuid.uuid4().hex[:12])
+        _store['flushed'] = time.monotonic()
+        data = {metric.name: metric.snapshot() for metric in METRICS}
+        os.makedirs(directory, exist_ok=True)
+        # Readers only ever see complete files
+        fd, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as temporary:
+            json.dump(data, temporary)
+        os.replace(path, os.path.join(directory, _store['filename']))
+
+
+def flush_if_due():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    interval = getattr(settings, 'METRICS_FLUSH_SECONDS', 5)
+    if directory and time.monotonic() - _store['flushed'] >= interval:
+        flush(directory)
+
+
+def _merge(into, series):
+    for key, value in series.items():
+        if isinstance(value, list):
+            into[key] = [total + added for total, added in zip(into.get(key) or [0] * len(value), value)]
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+def collect():
+    """``{metric name: series}`` summed over every process writing to ``METRICS_DIR``"""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return {metric.name: metric.snapshot() for metric in METRICS}
+    flush(directory)
+    merged = {metric.name: {} for metric in METRICS}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, series in data.items():
+            if name in merged:
+                _merge(merged[name], series)
+    return merged
+
+
+def _forked():
+    # The parent's totals are in the parent's file
+    for metric in METRICS:
+        metric.reset()
+    _store.update(filename=None, flushed=0)
+
+
+def _exiting():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory and _store['filename'] is not None:
+        flush(directory)
+
+
+os.register_at_fork(after_in_child=_forked)
+atexit.register(_exiting)
+
+
+def observe(metrics, total):
+    request_duration.observe(metrics.view, total)
+    request_queries.observe(metrics.view, metrics.queries)
+    request_db_duration.observe(metrics.view, metrics.db_time)
+    request_serialize_duration.observe(metrics.view, metrics.serialize_time)
+    request_render_duration.observe(metrics.view, metrics.render_time)
+
+
+def check_budgets(request, metrics, total):
+    """Log ``request`` if it went over the query or latency budget"""
+    query_budget = getattr(settings, 'PERFORMANCE_QUERY_BUDGET', None)
+    latency_budget = getattr(settings, 'PERFORMANCE_LATENCY_BUDGET', None)
+    over_queries = query_budget is not None and metrics.queries > query_budget
+    over_latency = latency_budget is not None and total > latency_budget
+    if not (over_queries or over_latency):
+        return
+    logger.warning(
+        '%s %s (%s) over budget: %d queries, %.1f ms total, %.1f ms in the database; '
+        'slowest query (%.1f ms): %s',
+        request.method, request.path, metrics.view, metrics.queries, total * 1000,
+        metrics.db_time * 1000, metrics.slowest_time * 1000, (metrics.slowest_sql or '')[:500]
+    )
+
+
+class InstrumentationMiddleware:
+    """Measure requests, see the module docstring. Keep it first in ``MIDDLEWARE``"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        _state.metrics = metrics
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _state.metrics = None
+        total = time.perf_counter() - metrics.start
+
+        if getattr(settings, 'SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = metrics.server_timing(total)
+        observe(metrics, total)
+        check_budgets(request, metrics, total)
+        flush_if_due()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.view = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        # Called right before Django renders the response
+        metrics = current_metrics()
+        if metrics is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                metrics.render_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,102 @@
+"""Prometheus metrics endpoint
+
+Serves, in the Prometheus text format, the request histograms and the
+tweet and author cache counters of ``utils.instrumentation`` (summed
+over the worker processes sharing ``METRICS_DIR``), the job queue depth
+and lag and the health of the read replicas.
+Only the addresses or networks of ``METRICS_ALLOWED_IPS`` and the
+scrapers sending ``METRICS_TOKEN`` as a bearer token are served; with
+neither set the endpoint refuses every request.
+"""
+
+# Python
+import ipaddress
+
+# Django
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+# Utils
+from utils.instrumentation import collect, COUNTERS, HISTOGRAMS
+from utils.routers import replica_aliases, replica_health
+
+# Jobs
+from jobs.metrics import queue_metrics
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def gauge(name, documentation, samples, kind='gauge'):
+    """Lines of one metric; ``samples`` are ``(labels, value)`` pairs"""
+    yield '# HELP {} {}'.format(name, documentation)
+    yield '# TYPE {} {}'.format(name, kind)
+    for labels, value in samples:
+        label_text = ','.join('{}="{}"'.format(key, labels[key]) for key in sorted(labels))
+        yield '{}{{{}}} {}'.format(name, label_text, value) if label_text else '{} {}'.format(name, value)
+
+
+def job_samples():
+    metrics = queue_metrics()
+    queues = sorted(metrics['queues'].items())
+    yield from gauge('jobs_queue_jobs', 'Jobs per queue and status', [
+        ({'queue': queue, 'status': status}, total)
+        for queue, counts in queues
+        for status, total in sorted(counts.items())
+        if status not in ('ready', 'lag_seconds')
+    ])
+    yield from gauge('jobs_queue_ready', 'Jobs ready to run', [
+        ({'queue': queue}, counts['ready']) for queue, counts in queues
+    ])
+    yield from gauge('jobs_queue_lag_seconds', 'Age of the oldest ready job', [
+        ({'queue': queue}, counts['lag_seconds']) for queue, counts in queues
+    ])
+    latency = metrics['latency']
+    yield from gauge('jobs_wait_seconds', 'Mean wait of the jobs of the last five minutes', [
+        ({}, latency['wait_seconds'])
+    ])
+    yield from gauge('jobs_run_seconds', 'Mean run time of the jobs of the last five minutes', [
+        ({}, latency['run_seconds'])
+    ])
+
+
+def replica_samples():
+    yield from gauge('db_replica_healthy', 'Whether the replica passes its health check', [
+        ({'alias': alias}, int(replica_health.is_healthy(alias))) for alias in replica_aliases()
+    ])
+
+
+def render_metrics():
+    # Request histograms and cache counters of every worker process
+    series = collect()
+    lines = []
+    for metric in HISTOGRAMS + COUNTERS:
+        lines.extend(metric.samples(series[metric.name]))
+    lines.extend(job_samples())
+    lines.extend(replica_samples())
+    return '\n'.join(lines) + '\n'
+
+
+def is_allowed_address(address):
+    """Whether ``address`` is in one of the networks of ``METRICS_ALLOWED_IPS``"""
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in getattr(settings, 'METRICS_ALLOWED_IPS', [])
+    )
+
+
+def is_authorized(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token):
+        return True
+    return is_allowed_address(request.META.get('REMOTE_ADDR', ''))
+
+
+def metrics(request):
+    if not is_authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
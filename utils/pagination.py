@@ -0,0 +1,150 @@
+"""Pagination utils"""
+
+# Python
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
+
+# Django
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Django Rest Framework
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+# Utils
+from utils.ids import has_time_ordered_ids
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on ``(created, id)``, newest first.
+
+    Pages are fetched with an indexed range condition instead of
+    ``OFFSET``, and no ``COUNT(*)`` is run. Cursors are opaque. Models with
+    time-ordered ids (see utils.ids) are keyed on ``id`` alone.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido'
+    ranked_query_message = 'La búsqueda ({}) se ordena por relevancia y no admite cursor, usa page'
+    page_size = api_settings.PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.by_id = has_time_ordered_ids(queryset.model)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = ['id'] if self.by_id else ['created', 'id']
+        if self.reverse:
+            queryset = queryset.order_by(*ordering)
+        else:
+            queryset = queryset.order_by(*['-' + field for field in ordering])
+
+        if self.position is not None:
+            created, pk = self.position
+            if self.by_id:
+                queryset = queryset.filter(id__gt=pk) if self.reverse else queryset.filter(id__lt=pk)
+            elif self.reverse:
+                queryset = queryset.filter(Q(created__gt=created) | Q(created=created, id__gt=pk))
+            else:
+                queryset = queryset.filter(Q(created__lt=created) | Q(created=created, id__lt=pk))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return self.encode_cursor(self.position, reverse=False)
+        last = self.page[-1]
+        return self.encode_cursor((last.created, last.id), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.encode_cursor(self.position, reverse=True)
+        first = self.page[0]
+        return self.encode_cursor((first.created, first.id), reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            created = None if self.by_id else parse_datetime(tokens['c'][0])
+            pk = int(tokens['i'][0])
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if created is None and not self.by_id:
+            raise NotFound(self.invalid_cursor_message)
+        return (created, pk), reverse
+
+    def encode_cursor(self, position, reverse):
+        created, pk = position
+        tokens = {'i': pk} if self.by_id else {'c': created.isoformat(), 'i': pk}
+        if reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens, doseq=True).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class KeysetPaginationMixin:
+    """Opt-in keyset pagination for viewset actions.
+
+    Actions listed in ``keyset_pagination_actions`` switch to
+    ``KeysetPagination`` when the request carries a ``cursor`` query param
+    (send it empty for the first page); otherwise the default paginator
+    is used, so existing page-number clients keep working.
+
+    A cursor would replace the ordering of ``ranked_query_params`` (e.g.
+    search relevance), so requests combining both are rejected.
+    """
+    keyset_pagination_actions = []
+    ranked_query_params = []
+
+    def use_keyset_pagination(self):
+        query_params = self.request.query_params
+        if (
+            self.action not in self.keyset_pagination_actions
+            or KeysetPagination.cursor_query_param not in query_params
+        ):
+            return False
+        ranked = [param for param in self.ranked_query_params if query_params.get(param)]
+        if ranked:
+            raise ValidationError({
+                KeysetPagination.cursor_query_param: [KeysetPagination.ranked_query_message.format(', '.join(ranked))]
+            })
+        return True
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.use_keyset_pagination():
+            self._paginator = KeysetPagination()
+        return super(KeysetPaginationMixin, self).paginator
@@ -0,0 +1,43 @@
+"""Renderers utils"""
+
+# Django Rest Framework
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON renderer backed by ``orjson`` when it is installed.
+
+    For strings, integers, booleans, ``None``, lists and dicts the output
+    is byte for byte the one of ``JSONRenderer`` with the default
+    (compact, unicode) settings; dates, decimals and other non JSON types
+    still go through DRF's encoder. ``CompiledSerializerParityTestCase``
+    checks the tweet list, detail, batch, feed, trending and comment
+    endpoints and the user detail, tweets, followers and followings ones.
+
+    Floats differ: they are spelled the shortest way (``1e16``, not
+    ``1e+16``) and NaN and infinities are written as ``null`` where
+    ``JSONRenderer`` raises. Indented output and environments without
+    ``orjson`` fall back to ``JSONRenderer``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or not self.compact or self.ensure_ascii:
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data,
+            default=encoders.JSONEncoder().default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        )
+        # Same escaping as JSONRenderer, see its render()
+        return ret.replace('\u2028'.encode('utf-8'), b'\\u2028').replace('\u2029'.encode('utf-8'), b'\\u2029')
@@ -0,0 +1,180 @@
+"""Database routers
+
+``ReplicaRouter`` sends reads to the aliases in ``DATABASE_REPLICAS`` and
+writes to ``default``. Reads only go to a replica inside a request
+handled by ``ReplicaRoutingMiddleware`` with a safe method; they stay on
+the primary:
+
+- for unsafe requests (``POST``, ``PUT``, ...) and background code (job
+  workers, commands), which may read what they just wrote;
+- inside a transaction on the primary, or once the request has written;
+- for ``DATABASE_STICKY_SECONDS`` after the authenticated user's last
+  write (likes, follows, tweets), so they read their own changes. The
+  flag lives in ``DATABASE_STICKY_CACHE``, which must be shared by every
+  worker process (system check ``utils.E001``);
+- when no replica passes its health check.
+
+Replicas are checked at most every ``DATABASE_HEALTH_CHECK_INTERVAL``
+seconds: a ``SELECT 1`` and, on PostgreSQL standbys, the replay lag
+against ``DATABASE_REPLICA_MAX_LAG``.
+
+Locally, a second alias pointing to the same database works, e.g. with
+``TEST = {'MIRROR': 'default'}`` for tests.
+"""
+
+# Python
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Django
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.functional import SimpleLazyObject
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def sticky_key(user_id):
+    return 'db:sticky:{}'.format(user_id)
+
+
+def stick_to_primary(user_id):
+    """Send the reads of ``user_id`` to the primary for ``DATABASE_STICKY_SECONDS``"""
+    seconds = getattr(settings, 'DATABASE_STICKY_SECONDS', 5)
+    caches[getattr(settings, 'DATABASE_STICKY_CACHE', 'default')].set(sticky_key(user_id), True, seconds)
+
+
+def is_sticky(user_id):
+    return bool(caches[getattr(settings, 'DATABASE_STICKY_CACHE', 'default')].get(sticky_key(user_id)))
+
+
+class ReplicaHealth:
+    """Cached health of replica aliases"""
+
+    def __init__(self):
+        self.checked = {}
+        self._lock = threading.Lock()
+
+    def lag(self, connection):
+        """Replay lag in seconds of a PostgreSQL standby, ``0`` otherwise"""
+        if connection.vendor != 'postgresql':
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT CASE WHEN pg_is_in_recovery() '
+                'THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) '
+                'ELSE 0 END'
+            )
+            return cursor.fetchone()[0]
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            lag = self.lag(connection)
+        except DatabaseError as error:
+            logger.warning('Replica %s is down: %s', alias, error)
+            connection.close()
+            return False
+        if lag > getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5):
+            logger.warning('Replica %s is %.1f s behind', alias, lag)
+            return False
+        return True
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, 'DATABASE_HEALTH_CHECK_INTERVAL', 10)
+        now = time.monotonic()
+        with self._lock:
+            checked_at, healthy = self.checked.get(alias, (None, None))
+        if checked_at is None or now - checked_at > interval:
+            healthy = self.check(alias)
+            with self._lock:
+                self.checked[alias] = (now, healthy)
+        return healthy
+
+    def reset(self):
+        with self._lock:
+            self.checked.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+@contextmanager
+def routing(request):
+    """Route the reads of the current thread for ``request``"""
+    _state.request = request
+    _state.pinned = request.method not in SAFE_METHODS
+    _state.user_checked = False
+    try:
+        yield
+    finally:
+        _state.request = None
+        _state.pinned = False
+
+
+class ReplicaRouter:
+
+    def use_primary(self):
+        request = getattr(_state, 'request', None)
+        if request is None or _state.pinned:
+            return True
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return True
+        if _state.user_checked:
+            return False
+        # Set by DRF once the request is authenticated; the session user of
+        # AuthenticationMiddleware is lazy and would query to resolve
+        user = getattr(request, 'user', None)
+        if user is None or isinstance(user, SimpleLazyObject):
+            return False
+        _state.user_checked = True
+        _state.pinned = user.is_authenticated and is_sticky(user.id)
+        return _state.pinned
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or self.use_primary():
+            return DEFAULT_DB_ALIAS
+        healthy = [alias for alias in replicas if replica_health.is_healthy(alias)]
+        return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if getattr(_state, 'request', None) is not None:
+            _state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
+
+
+class ReplicaRoutingMiddleware:
+    """Track the request for ``ReplicaRouter`` and make writers sticky"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with routing(request):
+            response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and user is not None and user.is_authenticated:
+            if response.status_code < 400:
+                stick_to_primary(user.id)
+        return response
@@ -0,0 +1,163 @@
+"""Serializers utils"""
+
+# Python
+from functools import lru_cache
+
+# Django
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+
+# Django Rest Framework
+from rest_framework.fields import SkipField
+from rest_framework.serializers import (
+    BaseSerializer,
+    CharField,
+    Field,
+    FileField,
+    IntegerField,
+    ListSerializer,
+    ReadOnlyField,
+    Serializer,
+    SerializerMethodField,
+    ValidationError
+)
+
+# Images
+from utils.images import InvalidImage, rendition_urls, validate_upload
+
+
+@lru_cache(maxsize=None)
+def get_eager_loading(serializer_class, prefix=''):
+    """Return the ``(select_related, prefetch_related)`` lookups a serializer needs.
+
+    Serializers declare the relations they read directly in
+    ``Meta.select_related`` / ``Meta.prefetch_related``; the lookups of
+    nested serializers are collected recursively and prefixed with the
+    source of the field that nests them.
+    """
+    meta = getattr(serializer_class, 'Meta', None)
+    select_related = [prefix + name for name in getattr(meta, 'select_related', [])]
+    prefetch_related = [prefix + name for name in getattr(meta, 'prefetch_related', [])]
+
+    for field in serializer_class().fields.values():
+        nested = field.child if isinstance(field, ListSerializer) else field
+        if not isinstance(nested, BaseSerializer) or field.source == '*':
+            continue
+        nested_prefix = prefix + field.source.replace('.', '__') + '__'
+        nested_select, nested_prefetch = get_eager_loading(type(nested), nested_prefix)
+        if isinstance(field, ListSerializer):
+            prefetch_related += nested_select + nested_prefetch
+        else:
+            select_related += nested_select
+            prefetch_related += nested_prefetch
+    return tuple(select_related), tuple(prefetch_related)
+
+
+def eager_load(queryset, serializer_class):
+    """Apply the eager loading plan of ``serializer_class`` to ``queryset``"""
+    select_related, prefetch_related = get_eager_loading(serializer_class)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+_SIMPLE_CONVERTERS = {
+    IntegerField: int,
+    CharField: str,
+    ReadOnlyField: lambda value: value,
+}
+
+
+def _compile_getter(field):
+    if field.source == '*':
+        return lambda instance: instance
+    if len(field.source_attrs) != 1:
+        return field.get_attribute
+
+    attr = field.source_attrs[0]
+
+    def getter(instance):
+        try:
+            value = getattr(instance, attr)
+        except ObjectDoesNotExist:
+            return None
+        except AttributeError:
+            return field.get_attribute(instance)
+        if callable(value):
+            return field.get_attribute(instance)
+        return value
+    return getter
+
+
+def _compile_converter(field):
+    if isinstance(field, SerializerMethodField):
+        return getattr(field.parent, field.method_name)
+    if isinstance(field, ListSerializer):
+        child = compile_representation(field.child)
+
+        def convert_many(value):
+            iterable = value.all() if isinstance(value, models.Manager) else value
+            return [child(item) for item in iterable]
+        return convert_many
+    if isinstance(field, BaseSerializer):
+        return compile_representation(field)
+    return _SIMPLE_CONVERTERS.get(type(field), field.to_representation)
+
+
+def compile_representation(serializer):
+    """Compile ``serializer.to_representation`` into a flat function.
+
+    The field tree of the (bound) serializer is walked once and turned into
+    a list of getter/converter pairs, so rendering a row is a plain loop
+    building a dict, with the same keys and values as the serializer.
+    Serializers that override ``to_representation`` are used as they are.
+    """
+    if type(serializer).to_representation is not Serializer.to_representation:
+        return serializer.to_representation
+
+    steps = [
+        (field.field_name, _compile_getter(field), _compile_converter(field))
+        for field in serializer.fields.values()
+        if not field.write_only
+    ]
+
+    def to_representation(instance):
+        ret = {}
+        for name, getter, converter in steps:
+            try:
+                value = getter(instance)
+            except SkipField:
+                continue
+            ret[name] = None if value is None else converter(value)
+        return ret
+    return to_representation
+
+
+class ImageUploadField(FileField):
+    """Image upload decoded and validated in the image process pool"""
+
+    def to_internal_value(self, data):
+        upload = super(ImageUploadField, self).to_internal_value(data)
+        try:
+            validate_upload(upload)
+        except InvalidImage as error:
+            raise ValidationError(str(error))
+        return upload
+
+
+class RenditionsField(Field):
+    """Renditions of an image field, as ``{name, format, width, height, url}``
+
+    URLs are absolute when the context has a request.
+    """
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['read_only'] = True
+        super(RenditionsField, self).__init__(**kwargs)
+
+    def to_representation(self, value):
+        storage = self.parent.Meta.model._meta.get_field(self.image_field).storage
+        return rendition_urls(value, storage, self.context.get('request'))
@@ -0,0 +1,90 @@
+"""Views utils"""
+
+# Django
+from django.conf import settings
+
+# Django Rest Framework
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+
+# Utils
+from utils.instrumentation import time_serializer
+from utils.serializers import compile_representation, eager_load
+
+
+class EagerLoadingMixin:
+    """Apply the serializers' eager loading plans to viewset querysets"""
+
+    def eager_load(self, queryset, serializer_class=None):
+        if serializer_class is None:
+            serializer_class = self.get_serializer_class()
+        return eager_load(queryset, serializer_class)
+
+    def get_queryset(self):
+        queryset = super(EagerLoadingMixin, self).get_queryset()
+        return self.eager_load(queryset)
+
+    def get_list_serializer(self, serializer_class, page):
+        return serializer_class(
+            page,
+            many=True,
+            context=self.get_serializer_context()
+        )
+
+    def paginated_response(self, queryset, serializer_class, hydrate=None):
+        """Eager load, paginate and serialize ``queryset``.
+
+        With ``hydrate``, ``queryset`` only has to select the columns the
+        paginator and ``hydrate`` read; the page is then passed through
+        ``hydrate`` to get the full objects (e.g. from a cache).
+        """
+        if hydrate is None:
+            queryset = self.eager_load(queryset, serializer_class)
+        page = self.paginate_queryset(queryset)
+        if hydrate is not None:
+            page = hydrate(page)
+        serializer = self.get_list_serializer(serializer_class, page)
+        result = self.get_paginated_response(serializer.data)
+        return Response(result.data, status=status.HTTP_200_OK)
+
+
+class CompiledSerializerMixin:
+    """Render lists with compiled serializers when ``settings.FAST_SERIALIZATION`` is on.
+
+    Only serializers that opt in with ``Meta.compiled = True`` are compiled,
+    see ``utils.serializers.compile_representation``.
+    """
+
+    def compile(self, serializer):
+        if (
+            getattr(settings, 'FAST_SERIALIZATION', False)
+            and isinstance(serializer, ListSerializer)
+            and getattr(serializer.child.Meta, 'compiled', False)
+        ):
+            serializer.child.to_representation = compile_representation(serializer.child)
+        return serializer
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super(CompiledSerializerMixin, self).get_serializer(*args, **kwargs)
+        return self.compile(serializer)
+
+    def get_list_serializer(self, serializer_class, page):
+        serializer = super(CompiledSerializerMixin, self).get_list_serializer(serializer_class, page)
+        return self.compile(serializer)
+
+
+class SerializerTimingMixin:
+    """Report the time spent serializing, see ``utils.instrumentation``.
+
+    Serializers a view builds itself are not seen here: wrap them with
+    ``time_serializer``.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super(SerializerTimingMixin, self).get_serializer(*args, **kwargs)
+        return time_serializer(serializer)
+
+    def get_list_serializer(self, serializer_class, page):
+        serializer = super(SerializerTimingMixin, self).get_list_serializer(serializer_class, page)
+        return time_serializer(serializer)